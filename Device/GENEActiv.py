@@ -9,6 +9,54 @@
 import numpy as np
 import datetime
 
+HEADER_LINES = 59  # lines before the first data page
+PAGE_LINES = 10  # lines per data page, the 6th holds the temperature and the 10th the hexadecimal data
+BLOCK_PAGES = 1000  # pages decoded at a time
+
+
+# ======================================== FUNCTIONS ========================================
+def decode_page_block(data_lines, calibration_info):
+    """ Decodes the hexadecimal data lines of a block of pages in one vectorized pass
+
+    Each page holds 300 measurements of 12 hex characters (48 bits): 12 bit x, y and z, 10 bit light
+    (all twos complement), 1 bit button and 1 reserved bit.
+
+    Args:
+        data_lines: list of bytes
+            Hexadecimal data line of each page
+        calibration_info: dict
+            GENEActiv.calibration_info
+
+    Returns:
+        x, y, z, light: np.array of float64 (calibrated values)
+        button: np.array of int64
+    """
+
+    # split into measurements of 6 bytes and combine into a 48 bit integer
+    meas = np.frombuffer(bytes.fromhex(b"".join(data_lines).decode("ascii")), dtype=np.uint8)
+    meas = meas.reshape(-1, 6).astype(np.int64)
+    bits = np.zeros(len(meas), dtype=np.int64)
+    for byte in range(6):
+        bits = (bits << 8) | meas[:, byte]
+
+    def twos_comp(val, bits_count):
+        """ Twos complement of bits_count bit values """
+        return val - ((val >> (bits_count - 1)) & 1) * (1 << bits_count)
+
+    x = twos_comp((bits >> 36) & 0xFFF, 12)
+    y = twos_comp((bits >> 24) & 0xFFF, 12)
+    z = twos_comp((bits >> 12) & 0xFFF, 12)
+    light = twos_comp((bits >> 2) & 0x3FF, 10)
+    button = (bits >> 1) & 1
+
+    # run the modifiers as prescribed in the GENEActiv documentation
+    x = (x * 100 - calibration_info["x-offset"]) / calibration_info["x-gain"]
+    y = (y * 100 - calibration_info["y-offset"]) / calibration_info["y-gain"]
+    z = (z * 100 - calibration_info["z-offset"]) / calibration_info["z-gain"]
+    light = (light * calibration_info["lux"]) / calibration_info["volts"]
+
+    return x, y, z, light, button
+
 
 # ======================================== GENEACTIV CLASS ========================================
 class GENEActiv:
@@ -111,66 +159,6 @@ class GENEActiv:
 
         '''
 
-        def twos_comp(val, bits):
-            """ This method calculates the twos complement value of the current bit
-            Args:
-                val: bin
-                    Bits to be processed (Binary)
-                bits: int
-                    Total number of bits in the operation
-
-            Returns:
-                Integer value resulting from the twos compliment operation
-            """
-            if (val & (1 << (bits - 1))) != 0:  # if sign bit is set e.g., 8bit: 128-255
-                val = val - (1 << bits)  # compute negative value
-            return val
-
-        def process_curr(raw_hex, offsets, gains, volts, lux):
-            """ This method processes the current line of "page" of data as defined by GENEActiv
-
-            Args:
-                raw_hex: str
-                    String of Hexadecimal data to be parsed as per their descriptors
-                offsets: tuple
-                    Stores the offsets for the three channels in a tuple (x, y, z)
-                gains: tuple
-                    Stores the gains for the three channels in a tuple (x, y, z)
-
-            Returns:
-                list of tuples : Each tuple will contain (x, y, z) samples for that time
-
-            """
-            returned_array = []
-            x_offset, y_offset, z_offset = offsets
-            x_gain, y_gain, z_gain = gains
-
-            for i in range(300):
-                curr = bin(int(raw_hex[i * 12: (i + 1) * 12], 16))[2:]
-                curr = curr.zfill(48)
-                x_comp = curr[0:12]
-                y_comp = curr[12:24]
-                z_comp = curr[24:36]
-                light = curr[36:46]
-                button = int(curr[46], 2)
-                res = int(curr[47], 2)
-
-                # run the twos component value on each composition which starts in binary form
-                x_comp = twos_comp(int(x_comp, 2), 12)
-                y_comp = twos_comp(int(y_comp, 2), 12)
-                z_comp = twos_comp(int(z_comp, 2), 12)
-                light = twos_comp(int(light, 2), 10)
-
-                # run the modifiers as prescribed in the GENEActiv documentation
-                x_comp = (x_comp * 100 - x_offset) / x_gain
-                y_comp = (y_comp * 100 - y_offset) / y_gain
-                z_comp = (z_comp * 100 - z_offset) / z_gain
-                light = (light * lux) / volts
-
-                returned_array.append((x_comp, y_comp, z_comp, light, button))
-
-            return returned_array
-
         # Variable Declaration and Initialization
         self.file = path
         self.file_name = self.file.split("/")[-1],
@@ -184,14 +172,13 @@ class GENEActiv:
 
         # Getting input
         print("Opening %s" % self.file)
-        bin_file = open(self.file, "r", encoding="utf-8")
-        lines = np.array([line[:-1] for line in bin_file.readlines()])
-        bin_file.close()
+        with open(self.file, "rb") as bin_file:
+            lines = bin_file.read().splitlines()
         print("Done reading, parsing Header Information")
 
         # Parsing Input
-        header_packet = lines[:59]
-        data_packet = lines[59:]
+        header_packet = [line.decode("utf-8") for line in lines[:HEADER_LINES]]
+        data_packet = lines[HEADER_LINES:]
 
         # Getting Data from the header
         for line in header_packet:
@@ -206,10 +193,10 @@ class GENEActiv:
         self.metadata.update({
             "serial_num": header["Device Unique Serial Code"],
             "device_type": header["Device Type"],
-            "temperature_units": header["Temperature Sensors Units"],
+            "temperature_units": header["Temperature Sensor Units"],
             "measurement_frequency": int(header["Measurement Frequency"].split(" ")[0]),
             "measurement_period": int(header["Measurement Period"].split(" ")[0]),
-            "start_time": datetime.datetime.strptime(data_packet[3][10:], "%Y-%m-%d %H:%M:%S:%f"),
+            "start_time": datetime.datetime.strptime(data_packet[3][10:].decode("utf-8"), "%Y-%m-%d %H:%M:%S:%f"),
             "study_centre": header["Study Centre"],
             "study_code": header["Study Code"],
             "investigator_id": header["Investigator ID"],
@@ -222,7 +209,7 @@ class GENEActiv:
             "extract_notes": header["Extract Notes"],
             "time_shift": float(header["Extract Notes"].split(" ")[3][:-2].replace(",", "")),
             "device_location": header["Device Location Code"],
-            "subject_id": (int(header["Subject Code"]) if header["Subject Code"] is not "" else 0),
+            "subject_id": (int(header["Subject Code"]) if header["Subject Code"] != "" else 0),
             "date_of_birth": header["Date of Birth"],
             "sex": header["Sex"],
             "height": header["Height"],
@@ -251,38 +238,28 @@ class GENEActiv:
             if not quiet:
                 print("Reading and parsing hexadecimal")
 
-            # Appending relevant information from parsed hexadecimal data
-            temps = []
-            x = []
-            y = []
-            z = []
-            light = []
-            button = []
-            for i in range(self.metadata["number_of_pages"]):
-                if (i // 1000) * 1000 == i:
-                    if not quiet:
-                        print("Current Progress: %f %%" % (100 * i / self.metadata["number_of_pages"]))
-                curr_chunk = process_curr(data_packet[(i * 10) + 9], (self.calibration_info["x-offset"],
-                                                                      self.calibration_info["y-offset"],
-                                                                      self.calibration_info["z-offset"]),
-                                          (self.calibration_info["x-gain"],
-                                           self.calibration_info["y-gain"],
-                                           self.calibration_info["z-gain"]),
-                                          self.calibration_info["volts"],
-                                          self.calibration_info["lux"])
-                temps.append(float(data_packet[(i * 10) + 5].split(":")[-1]))
-                x.extend([curr_chunk[j][0] for j in range(300)])
-                y.extend([curr_chunk[j][1] for j in range(300)])
-                z.extend([curr_chunk[j][2] for j in range(300)])
-                light.extend([curr_chunk[j][3] for j in range(300)])
-                button.extend([curr_chunk[j][4] for j in range(300)])
-
-            self.x = np.array(x)
-            self.y = np.array(y)
-            self.z = np.array(z)
-            self.light = np.array(light)
-            self.button = np.array(button)
-            self.temperature = np.array(temps)
+            # only complete pages can be read
+            pages = min(self.metadata["number_of_pages"], len(data_packet) // PAGE_LINES)
+            data_lines = data_packet[PAGE_LINES - 1::PAGE_LINES][:pages]
+            temperature_lines = data_packet[5::PAGE_LINES][:pages]
+
+            self.x = np.empty(pages * 300)
+            self.y = np.empty(pages * 300)
+            self.z = np.empty(pages * 300)
+            self.light = np.empty(pages * 300)
+            self.button = np.empty(pages * 300, dtype=np.int64)
+
+            # decode pages in blocks
+            for first in range(0, pages, BLOCK_PAGES):
+                if not quiet:
+                    print("Current Progress: %f %%" % (100 * first / self.metadata["number_of_pages"]))
+
+                samples = slice(first * 300, (first + BLOCK_PAGES) * 300)
+                (self.x[samples], self.y[samples], self.z[samples],
+                 self.light[samples], self.button[samples]) = decode_page_block(data_lines[first:first + BLOCK_PAGES],
+                                                                                self.calibration_info)
+
+            self.temperature = np.array([float(line.split(b":")[-1]) for line in temperature_lines])
 
     def calculate_time_shift(self, force=False):
         '''
@@ -297,50 +274,30 @@ class GENEActiv:
 
         '''
         if (self.time_shifted and force) or (not self.time_shifted):
-            self.remove_counter = abs(self.samples / (self.metadata["time_shift"] * self.metadata["measurement_frequency"]))
-            if self.metadata["time_shift"] > 0:
-                # We need to remove every nth value (n = remove_counter)
-                self.x = np.delete(self.x,
-                                   [int(self.remove_counter * i) for i in
-                                    range(int(len(self.x) / self.remove_counter))])
+            if self.metadata["time_shift"] == 0:
+                self.time_shifted = True
+                return
 
-                self.y = np.delete(self.y,
-                                   [int(self.remove_counter * i) for i in
-                                    range(int(len(self.y) / self.remove_counter))])
+            self.remove_counter = abs(self.samples / (self.metadata["time_shift"] * self.metadata["measurement_frequency"]))
 
-                self.z = np.delete(self.z,
-                                   [int(self.remove_counter * i) for i in
-                                    range(int(len(self.z) / self.remove_counter))])
+            # every remove_counter-th sample (starting with the first) is removed or has a 0 inserted before it
+            length = len(self.x)
+            positions = (self.remove_counter * np.arange(int(length / self.remove_counter))).astype(np.int64)
 
-                self.light = np.delete(self.light,
-                                       [int(self.remove_counter * i) for i in
-                                        range(int(len(self.light) / self.remove_counter))])
+            # one index array is built and gathered from by every signal
+            if self.metadata["time_shift"] > 0:
+                # We need to remove every nth value (n = remove_counter)
+                keep = np.ones(length, dtype=bool)
+                keep[positions] = False
+                index = np.flatnonzero(keep)
+            else:
+                # We need to add a 0 value every remove_counter indices (index length points to the 0)
+                index = np.insert(np.arange(length), positions, length)
 
-                self.button = np.delete(self.button,
-                                        [int(self.remove_counter * i) for i in
-                                         range(int(len(self.button) / self.remove_counter))])
+            for key in ["x", "y", "z", "light", "button"]:
+                signal = getattr(self, key)
+                setattr(self, key, np.append(signal, np.zeros(1, dtype=signal.dtype))[index])
 
-            else:
-                # We need to add a 0 value every remove_counter indices
-                self.x = np.insert(self.x,
-                                   [int(self.remove_counter * i) for i in
-                                    range(int(len(self.x) / self.remove_counter))], 0)
-
-                self.y = np.insert(self.y,
-                                   [int(self.remove_counter * i) for i in
-                                    range(int(len(self.y) / self.remove_counter))], 0)
-
-                self.z = np.insert(self.z,
-                                   [int(self.remove_counter * i) for i in
-                                    range(int(len(self.z) / self.remove_counter))], 0)
-
-                self.light = np.insert(self.light,
-                                       [int(self.remove_counter * i) for i in
-                                        range(int(len(self.light) / self.remove_counter))], 0)
-
-                self.button = np.insert(self.button,
-                                        [int(self.remove_counter * i) for i in
-                                         range(int(len(self.button) / self.remove_counter))], 0)
             self.time_shifted = True
         else:
             print("Times have already been shifted. To shift again, run with param force=True")
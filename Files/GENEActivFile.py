@@ -10,21 +10,903 @@ import shutil
 import fpdf
 import matplotlib.pyplot as plt
 import matplotlib.style as mstyle
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import time
+import mmap
+import json
+import hashlib
+import io
+import struct
+from fractions import Fraction
+from numpy.lib.stride_tricks import sliding_window_view
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, as_completed
+try:
+    from .instrumentation import StageTimer, print_progress
+except ImportError:
+    from instrumentation import StageTimer, print_progress
 
 mstyle.use('fast')
 
+# layout of a data page: 10 lines, the 4th holds the page time, the 6th the temperature
+# and the 10th the hexadecimal data (300 measurements of 12 hex characters)
+PAGE_LINES = 10
+PAGE_TIME_LINE = 3
+TEMPERATURE_LINE = 5
+DATA_LINE = 9
+DATA_LINE_LENGTH = 3600
+
+# columns of GENEActivFile.page_index
+PAGE_TIME_COLUMN = 0
+TEMPERATURE_COLUMN = 1
+DATA_COLUMN = 2
+
+HEADER_READ_SIZE = 65536  # bytes read to find the header and first page
+SCAN_CHUNK_SIZE = 16 * 1024 * 1024  # bytes scanned at a time when building the page index
+TAIL_READ_SIZE = 16384  # bytes read from the end of the file to find the last page
+TEMPERATURE_WIDTH = 8  # characters parsed after 'Temperature:'
+
+CHANNELS = ("x", "y", "z", "light", "button", "temperature")
+DATA_CHANNELS = ("x", "y", "z", "light", "button")  # decoded from the hexadecimal data line
+PAGE_CHANNELS = ("temperature", "page_times")  # one value per page
+BLOCK_PAGES = 1000  # pages read and decoded at a time
+
+PARSER_VERSION = 2  # increase when decoded output changes to invalidate cached data
+CACHE_SIZE = 20 * 1024 ** 3  # default maximum size of a cache directory in bytes
+CACHE_CHANNELS = ("x", "y", "z", "light", "button", "temperature", "page_times")
+
+RESAMPLE_HALF_LENGTH = 10  # half length of the resampling filter in multiples of max(up, down)
+RESAMPLE_KAISER_BETA = 5.0  # shape of the Kaiser window applied to the resampling filter
+RESAMPLE_CHUNK_SIZE = 2 ** 22  # input values gathered at a time when filtering
+
+# dtypes of raw counts returned by decode_hex_pages
+COUNT_DTYPES = {"x": np.int16, "y": np.int16, "z": np.int16, "light": np.uint16, "button": np.uint8}
+
+
+# ======================================== DECODING FUNCTIONS ========================================
+def parse_page_time(line):
+    """ Parses a 'Page Time:' line (str or bytes) into a datetime """
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    colon = line.index(':')
+    return datetime.datetime.strptime(line[colon + 1:].rstrip(), '%Y-%m-%d %H:%M:%S:%f')
+
+
+def parse_page_times(buffer, offsets):
+    """ Parses the 'Page Time:' lines starting at offsets in one vectorized pass
+
+    Args:
+        buffer: np.array of uint8
+            File contents (e.g. np.memmap of the .bin file)
+        offsets: np.array
+            Byte offsets of the page time lines in buffer
+
+    Returns:
+        np.array of datetime64[us]
+    """
+
+    # fixed width 'YYYY-MM-DD HH:MM:SS:fff' after the prefix is converted to ISO format
+    prefix = len("Page Time:")
+    chars = buffer[np.asarray(offsets)[:, None] + np.arange(prefix, prefix + 23)]
+    chars[:, 10] = ord("T")
+    chars[:, 19] = ord(".")
+
+    return chars.view("S23").ravel().astype("datetime64[us]")
+
+
+def decode_hex_pages(data_lines, downsample=1, channels=DATA_CHANNELS):
+    """ Decodes the hexadecimal data lines of a block of pages in one vectorized pass
+
+    Each page holds 300 measurements of 12 hex characters (48 bits): 12 bit x, y and z
+    (two's complement), 10 bit light, 1 bit button and 1 reserved bit.
+
+    Args:
+        data_lines: list of str or bytes
+            Hexadecimal data line of each page
+        downsample: int
+            Keep every nth measurement within each page
+        channels: tuple of str
+            Channels to decode, any of "x", "y", "z", "light" and "button"
+
+    Returns:
+        dict of np.array: raw (uncalibrated) "x", "y", "z" (int16), "light" (uint16) and "button" (uint8) values
+    """
+
+    # convert hex to bytes and split into measurements (6 bytes each)
+    if data_lines and not isinstance(data_lines[0], str):
+        data_lines = [b"".join(data_lines).decode("ascii")]
+    meas = np.frombuffer(bytes.fromhex("".join(data_lines)), dtype=np.uint8)
+    meas = meas.reshape(-1, 300, 6)[:, ::downsample].reshape(-1, 6)
+
+    b = {}
+
+    def byte(i):
+        if i not in b:
+            b[i] = meas[:, i].astype(np.uint16)
+        return b[i]
+
+    decoded = {}
+
+    # shift 12 bit accelerometer values into the top of a 16 bit word so that an arithmetic
+    # right shift of the signed view applies the twos complement
+    if "x" in channels:
+        decoded["x"] = ((byte(0) << 8) | (byte(1) & 0xF0)).view(np.int16) >> 4
+    if "y" in channels:
+        decoded["y"] = ((byte(1) << 12) | (byte(2) << 4)).view(np.int16) >> 4
+    if "z" in channels:
+        decoded["z"] = ((byte(3) << 8) | (byte(4) & 0xF0)).view(np.int16) >> 4
+    if "light" in channels:
+        decoded["light"] = ((byte(4) & 0x0F) << 6) | (byte(5) >> 2)
+    if "button" in channels:
+        decoded["button"] = ((byte(5) >> 1) & 0x01).astype(np.uint8)
+
+    return decoded
+
+
+def decode_button(buffer, offsets, downsample=1):
+    """ Decodes only the button channel from the last hex character of each measurement, without
+    converting the rest of the data lines
+
+    Args:
+        buffer: np.array of uint8
+            File contents (e.g. block of pages read by read_pages)
+        offsets: np.array
+            Byte offsets of the data lines in buffer
+        downsample: int
+            Keep every nth measurement within each page
+
+    Returns:
+        np.array of uint8
+    """
+
+    # the button is bit 1 of the last hex character, which is set in '2', '3', '6', '7', 'A', 'B', 'E' and 'F'
+    button_bit = np.zeros(256, dtype=np.uint8)
+    for char in b"2367ABEFabef":
+        button_bit[char] = 1
+
+    chars = buffer[(np.asarray(offsets)[:, None] + np.arange(11, DATA_LINE_LENGTH, 12 * downsample)).ravel()]
+
+    return button_bit[chars]
+
+
+def calibrate_counts(meas, file_info):
+    """ Converts raw counts returned by decode_hex_pages to calibrated units
+
+    Args:
+        meas: dict of np.array
+            Raw counts (any of "x", "y", "z", "light", other keys are returned unchanged)
+        file_info: dict
+            GENEActivFile.file_info holding the gain, offset, volts and lux values from the header
+
+    Returns:
+        dict of np.array: calibrated values (float64)
+    """
+
+    calibrated = dict(meas)
+
+    for axis in ["x", "y", "z"]:
+        if axis in meas:
+            calibrated[axis] = (meas[axis] * 100.0 - file_info[axis + "_offset"]) / file_info[axis + "_gain"]
+
+    if "light" in meas:
+        calibrated["light"] = (meas["light"] * float(file_info["lux"])) / file_info["volts"]
+
+    return calibrated
+
+
+def parse_temperatures(buffer, offsets):
+    """ Parses the 'Temperature:' lines starting at offsets in one vectorized pass
+
+    Args:
+        buffer: np.array of uint8
+            File contents (e.g. block of pages read by read_pages)
+        offsets: np.array
+            Byte offsets of the temperature lines in buffer
+
+    Returns:
+        np.array of float32
+    """
+
+    # fixed width field after the prefix, blanked from the line break onwards
+    prefix = len("Temperature:")
+    chars = buffer[np.asarray(offsets)[:, None] + np.arange(prefix, prefix + TEMPERATURE_WIDTH)]
+    line_end = np.logical_or.accumulate((chars == ord("\r")) | (chars == ord("\n")), axis=1)
+    chars[line_end] = ord(" ")
+
+    return chars.view("S%d" % TEMPERATURE_WIDTH).ravel().astype(np.float32)
+
+
+def read_pages(bin_file, index):
+    """ Reads a run of consecutive pages in a single read starting at the first page time line
+
+    Args:
+        bin_file: file object or mmap.mmap
+            .bin file opened in binary mode
+        index: np.array
+            Rows of GENEActivFile.page_index for the pages to read
+
+    Returns:
+        buffer: bytes
+            Contents of the file from the first page time line to the end of the last data line
+        offsets: np.array
+            index relative to the start of buffer
+    """
+
+    block_start = index[0, PAGE_TIME_COLUMN]
+
+    bin_file.seek(block_start)
+    buffer = bin_file.read(index[-1, DATA_COLUMN] + DATA_LINE_LENGTH - block_start)
+
+    return buffer, index - block_start
+
+
+def decode_pages(bin_file, index, file_info, channels=CHANNELS, calibrate=True, downsample=1):
+    """ Reads and decodes a run of consecutive pages
+
+    Args:
+        bin_file: file object or mmap.mmap
+            .bin file opened in binary mode
+        index: np.array
+            Rows of GENEActivFile.page_index for the pages to read
+        file_info: dict
+            GENEActivFile.file_info (used for calibration)
+        channels: tuple of str
+            Channels to return, any of "x", "y", "z", "light", "button" and "temperature"
+        calibrate: Bool
+            Whether to return calibrated values rather than raw counts
+        downsample: int
+            Keep every nth measurement within each page
+
+    Returns:
+        dict: requested channels (one temperature value per page), "page_times" (time of each page)
+        and "start_time" (time of first page)
+    """
+
+    data_channels = tuple(key for key in DATA_CHANNELS if key in channels)
+
+    if data_channels or not isinstance(bin_file, mmap.mmap):
+        buffer, offsets = read_pages(bin_file, index)
+        chars = np.frombuffer(buffer, dtype=np.uint8)
+    else:
+        # only the page time and temperature lines are needed, gather them from the mapped file
+        # without reading the data lines
+        chars = np.frombuffer(bin_file, dtype=np.uint8)
+        offsets = index
+
+    block = {}
+
+    if data_channels == ("button",):
+        block["button"] = decode_button(chars, offsets[:, DATA_COLUMN], downsample)
+
+    elif data_channels:
+        block_view = memoryview(buffer)
+        data_lines = [block_view[offset:offset + DATA_LINE_LENGTH] for offset in offsets[:, DATA_COLUMN].tolist()]
+        meas = decode_hex_pages(data_lines, downsample, data_channels)
+        if calibrate:
+            meas = calibrate_counts(meas, file_info)
+        block.update(meas)
+
+    # parse temperature from temperature lines (1 per page)
+    if "temperature" in channels:
+        block["temperature"] = parse_temperatures(chars, offsets[:, TEMPERATURE_COLUMN])
+
+    block["page_times"] = parse_page_times(chars, offsets[:, PAGE_TIME_COLUMN])
+    block["start_time"] = block["page_times"][0].item()
+
+    # release any view of a mapped file so that it can be closed
+    del chars
+
+    return block
+
+
+def drift_correction_index(length, drift_rate, adjust_start, mode="gather"):
+    """ Calculates where each sample of a clock drift corrected signal is taken from
+
+    One sample is removed (positive drift) or added (negative drift) every 1 / abs(drift_rate) samples,
+    and adjust_start samples are removed from (or added to) the start to account for the drift between
+    configuration and the first sample.
+
+    Args:
+        length: int
+            Number of samples in the signal
+        drift_rate: float
+            Clock drift in seconds per second (file_info["clock_drift_rate"])
+        adjust_start: int
+            Number of samples of drift accumulated before the first sample
+        mode: str
+            "gather" to return an integer index (added samples repeat the previous sample) or
+            "interpolate" to return fractional sample positions on the corrected clock
+
+    Returns:
+        np.array: index or positions to pass to apply_drift_correction
+    """
+
+    adjust_rate = abs(1 / drift_rate)
+    positions = np.round(adjust_rate * np.arange(1, int(length / adjust_rate) + 1)).astype(np.int64)
+
+    if mode == "interpolate":
+
+        if drift_rate > 0:
+            corrected_length = max(length - np.count_nonzero(positions < length) - adjust_start, 0)
+            first = adjust_start
+        else:
+            corrected_length = length + len(positions) + adjust_start
+            first = -adjust_start
+
+        return (np.arange(corrected_length) + first) / (1 - drift_rate)
+
+    if drift_rate > 0:  # if drift is positive then remove extra samples (and samples before start)
+        keep = np.ones(length, dtype=bool)
+        keep[positions[positions < length]] = False
+        index = np.flatnonzero(keep)[adjust_start:]
+
+    else:  # else repeat samples (and the first sample before start)
+        index = np.insert(np.arange(length), positions, np.maximum(positions - 1, 0))
+        index = np.concatenate([np.zeros(adjust_start, dtype=index.dtype), index])
+
+    return index
+
+
+def apply_drift_correction(signal, index, mode="gather", nearest=False):
+    """ Applies an index returned by drift_correction_index to a signal in a single pass
+
+    Args:
+        signal: np.array
+            Signal to correct
+        index: np.array
+            Index ("gather") or sample positions ("interpolate") from drift_correction_index
+        mode: str
+            "gather" or "interpolate" (linear interpolation between neighbouring samples)
+        nearest: Bool
+            Use the nearest sample rather than interpolating (for discrete signals such as button)
+
+    Returns:
+        np.array: corrected signal (same dtype as signal)
+    """
+
+    if mode == "gather":
+        return signal[index]
+
+    if nearest or not len(signal):
+        return signal[np.clip(np.rint(index).astype(np.int64), 0, max(len(signal) - 1, 0))]
+
+    corrected = np.interp(index, np.arange(len(signal)), signal)
+
+    if signal.dtype.kind in "iu":
+        corrected = np.rint(corrected).astype(signal.dtype)
+
+    return corrected
+
+
+def store_block(outputs, block, page, meas_per_page):
+    """ Copies a decoded block into output arrays
+
+    Args:
+        outputs: dict of np.array
+            Output arrays for each channel in the block
+        block: dict
+            Decoded block returned by decode_pages
+        page: int
+            Position of the block's first page in the output (0-based)
+        meas_per_page: int
+            Number of measurements per page after downsampling
+    """
+
+    for key in outputs:
+        if key in PAGE_CHANNELS:
+            outputs[key][page:page + len(block[key])] = block[key]
+        elif key in block:
+            samples = page * meas_per_page
+            outputs[key][samples:samples + len(block[key])] = block[key]
+
+
+def _parse_data_worker(file_path, index, file_info, channels, calibrate, downsample, outputs_info, page):
+    """ Decodes a range of pages in a worker process of GENEActivFile.parse_data and writes them into the
+    shared memory output arrays (outputs_info: channel -> (shared memory name, shape, dtype)) starting at page
+
+    Returns:
+        start_time: datetime of first page in range
+    """
+
+    meas_per_page = len(range(0, 300, downsample))
+    shared = {key: shared_memory.SharedMemory(name=info[0]) for key, info in outputs_info.items()}
+
+    try:
+        outputs = {key: np.ndarray(info[1], dtype=info[2], buffer=shared[key].buf)
+                   for key, info in outputs_info.items()}
+
+        with open(file_path, "rb") as bin_file, \
+                mmap.mmap(bin_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+
+            for first in range(0, len(index), BLOCK_PAGES):
+                block = decode_pages(mapped_file, index[first:first + BLOCK_PAGES], file_info,
+                                     channels=channels, calibrate=calibrate, downsample=downsample)
+                store_block(outputs, block, page + first, meas_per_page)
+
+                if first == 0:
+                    start_time = block["start_time"]
+
+        del outputs
+
+    finally:
+        for shared_block in shared.values():
+            shared_block.close()
+
+    return start_time
+
+# ======================================== PDF PLOTTING FUNCTIONS ========================================
+# matplotlib settings of the summary plots (one plot per pdf page)
+PDF_PLOT_PARAMS = {"lines.linewidth": 0.25,
+                   "figure.figsize": (6, 7.5),
+                   "figure.subplot.top": 0.92,
+                   "figure.subplot.bottom": 0.06,
+                   "font.size": 8}
+
+_pdf_plot = None  # figure reused by _render_pdf_window, created once per process by _init_pdf_plot
+
+ENVELOPE_BINS_PER_PIXEL = 4  # min/max pairs per pixel column of the axes in plot_envelope
+
+
+def min_max_envelope(signal, bins, x=None):
+    """ Reduces a signal to the minimum and maximum of each of (at most) bins runs of consecutive samples,
+    in the order they occur, so that a line through them covers the same vertical range in each run as a
+    line through every sample
+
+    Args:
+        signal: np.array
+            Signal to reduce
+        bins: int
+            Number of runs of samples (e.g. pixel columns of the plot)
+        x: np.array
+            x values of the samples (e.g. timestamps), default = sample number
+
+    Returns:
+        x, y: np.array
+            x values and signal values of the envelope (2 per run, or the signal itself if it is not longer)
+    """
+
+    signal = np.asarray(signal)
+    if x is None:
+        x = np.arange(len(signal))
+
+    if len(signal) <= 2 * bins:
+        return np.asarray(x), signal
+
+    # runs of equal length, the last run may be shorter
+    run_length = -(-len(signal) // bins)
+    full_runs = len(signal) // run_length
+    runs = signal[:full_runs * run_length].reshape(full_runs, run_length)
+
+    min_index = runs.argmin(axis=1)
+    max_index = runs.argmax(axis=1)
+
+    if full_runs * run_length < len(signal):
+        last_run = signal[full_runs * run_length:]
+        min_index = np.append(min_index, last_run.argmin())
+        max_index = np.append(max_index, last_run.argmax())
+
+    run_start = np.arange(len(min_index)) * run_length
+    index = np.column_stack([np.minimum(min_index, max_index), np.maximum(min_index, max_index)])
+    index = (index + run_start[:, None]).ravel()
+
+    return np.asarray(x)[index], signal[index]
+
+
+def plot_envelope(ax, x, y=None, bins=None, **kwargs):
+    """ Plots a long signal as its min/max envelope (see min_max_envelope) with ax.plot, which looks the
+    same as plotting every sample but only draws a few points per pixel column
+
+    Args:
+        ax: matplotlib.axes.Axes
+            Axes to plot on
+        x, y: np.array
+            x and y values as for ax.plot (x is optional)
+        bins: int
+            Number of min/max pairs, default = ENVELOPE_BINS_PER_PIXEL per pixel of the axes width
+        kwargs:
+            Passed to ax.plot
+
+    Returns:
+        list of matplotlib.lines.Line2D
+    """
+
+    if y is None:
+        x, y = None, x
+
+    if bins is None:
+        bins = envelope_bins(ax)
+
+    return ax.plot(*min_max_envelope(y, bins, x), **kwargs)
+
+
+def envelope_bins(ax):
+    """ Returns the number of min/max pairs used to plot an envelope on ax (ENVELOPE_BINS_PER_PIXEL per pixel) """
+    return max(int(ax.get_window_extent().width * ENVELOPE_BINS_PER_PIXEL), 1)
+
+
+def _init_pdf_plot(plot_info):
+    """ Creates the summary plot figure (one subplot per signal with limits, ticks, labels and reference
+    lines from GENEActivFile.create_pdf) that is reused for every window rendered in this process """
+
+    global _pdf_plot
+
+    with plt.rc_context(PDF_PLOT_PARAMS):
+
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        ax = fig.subplots(len(plot_info["keys"]), 1)
+
+        # date range of each window is set as plot title
+        title = fig.suptitle("", fontsize=8, y=0.96)
+
+        lines = []
+
+        for subplot_index, key in enumerate(plot_info["keys"]):
+
+            # line whose data is replaced for each window
+            lines.append(ax[subplot_index].plot([], [], color=plot_info["line_color"][subplot_index])[0])
+
+            # remove box around plot
+            ax[subplot_index].spines["top"].set_visible(False)
+            ax[subplot_index].spines["bottom"].set_visible(False)
+            ax[subplot_index].spines["right"].set_visible(False)
+
+            ax[subplot_index].set_yticks(plot_info["yaxis_ticks"][subplot_index])
+            units = plot_info["yaxis_units"][subplot_index]
+            ax[subplot_index].set_ylabel(f'{key} ({units})')
+
+            # set horizontal lines on plot at zero and limits
+            if subplot_index < len(plot_info["yaxis_lines"]):
+                for yline in plot_info["yaxis_lines"][subplot_index]:
+                    ax[subplot_index].axhline(y=yline, color='grey', linestyle='-')
+
+            # set axis limits
+            ax[subplot_index].set_ylim(plot_info["yaxis_lim"][subplot_index])
+
+    _pdf_plot = {"figure": fig, "axes": ax, "lines": lines, "title": title, "keys": plot_info["keys"],
+                 "bins": [envelope_bins(subplot) for subplot in ax]}
+
+
+def _render_pdf_window(window):
+    """ Plots one window ({"title": str, "signals": dict of np.array}) on the figure created by _init_pdf_plot
+
+    Returns:
+        png: bytes
+            The plot as a PNG image (see _add_pdf_image)
+    """
+
+    fig = _pdf_plot["figure"]
+    _pdf_plot["title"].set_text(window["title"])
+
+    for ax, line, key, bins in zip(_pdf_plot["axes"], _pdf_plot["lines"], _pdf_plot["keys"], _pdf_plot["bins"]):
+
+        # only the min/max envelope of each pixel column is drawn
+        signal = window["signals"][key]
+        line.set_data(*min_max_envelope(signal, bins))
+
+        # same x margins as autoscaling
+        margin = 0.05 * max(len(signal) - 1, 1)
+        ax.set_xlim(-margin, len(signal) - 1 + margin)
+
+    png = io.BytesIO()
+    with plt.rc_context(PDF_PLOT_PARAMS):
+        fig.savefig(png, format="png")
+
+    return png.getvalue()
+
+
+def _add_pdf_image(pdf, png, x=None, y=None):
+    """ Places a plot rendered by _render_pdf_window on the current page of an fpdf.FPDF (fpdf2, read from memory),
+    one pixel per point as when the plot was saved to a file """
+
+    width, height = struct.unpack(">II", png[16:24])  # size in the IHDR chunk of the PNG
+    pdf.image(io.BytesIO(png), x=x, y=y, w=width / pdf.k, h=height / pdf.k)
+
+
+# ======================================== Resampler CLASS ========================================
+class Resampler:
+    """
+    Resamples a signal from source_rate to any integer or rational target_rate (ratio up / down) with a
+    polyphase FIR low-pass filter (Kaiser windowed sinc). The signal can be passed in blocks of any length:
+    the input samples still needed are carried over to the next call and only the output samples are
+    calculated. The signal is extended with its first and last values at the edges.
+
+    Example:
+        resampler = Resampler(75, 1)
+        for block in blocks:
+            outputs.append(resampler.process(block))
+        outputs.append(resampler.process([], final=True))
+    """
+
+    def __init__(self, source_rate, target_rate, discrete=False):
+
+        '''
+        Args:
+            source_rate: float
+                Sample rate of the input signal in Hz
+            target_rate: float
+                Sample rate of the output signal in Hz
+            discrete: Bool
+                Take the input sample nearest to each output sample instead of filtering
+                (for discrete signals such as button)
+        '''
+
+        ratio = Fraction(target_rate).limit_denominator(1000) / Fraction(source_rate).limit_denominator(1000)
+        self.up = ratio.numerator
+        self.down = ratio.denominator
+        self.discrete = discrete
+
+        # low-pass filter at the lower of the two Nyquist frequencies (at the upsampled rate), split into
+        # one reversed filter per phase of the upsampled signal
+        max_rate = max(self.up, self.down)
+        self.half_length = RESAMPLE_HALF_LENGTH * max_rate
+        taps = np.arange(-self.half_length, self.half_length + 1)
+        fir = np.sinc(taps / max_rate) / max_rate * np.kaiser(len(taps), RESAMPLE_KAISER_BETA) * self.up
+        fir = np.concatenate([fir, np.zeros(-len(fir) % self.up)])
+        self.width = len(fir) // self.up
+        self.filters = fir.reshape(self.width, self.up).T[:, ::-1].copy()
+
+        self.buffer = None  # input samples still needed, starting at input sample buffer_start
+        self.buffer_start = 0
+        self.received = 0
+        self.produced = 0
+
+    def output_length(self, input_length):
+        """ Returns the number of output samples for an input of input_length samples """
+        return -(-input_length * self.up // self.down)
+
+    def process(self, signal, final=False):
+
+        '''
+        process() resamples the next block of the signal
+        Args:
+            signal: np.array
+                Next block of input samples
+            final: Bool
+                Whether this is the last block (all remaining output samples are returned)
+
+        Returns:
+            np.array: next output samples (float64, or the input dtype if discrete)
+        '''
+
+        signal = np.asarray(signal)
+
+        if self.buffer is None:
+            if not len(signal):
+                return np.empty(0, dtype=np.float64)
+            dtype = signal.dtype if self.discrete else np.float64
+            self.buffer = np.full(self.width - 1, signal[0], dtype=dtype)
+            self.buffer_start = -(self.width - 1)
+
+        self.buffer = np.concatenate([self.buffer, signal.astype(self.buffer.dtype, copy=False)])
+        self.received += len(signal)
+
+        # output sample n is centred on input sample n * down / up and uses the width input samples
+        # ending at (n * down + half_length) // up
+        if final:
+            padding = np.full(self.half_length // self.up + self.width + 1, self.buffer[-1])
+            self.buffer = np.concatenate([self.buffer, padding])
+            end = self.output_length(self.received)
+        else:
+            available = self.buffer_start + len(self.buffer)
+            end = max((available * self.up - self.half_length - 1) // self.down + 1, self.produced)
+
+        n = np.arange(self.produced, end)
+
+        if self.discrete:
+            resampled = self.buffer[(n * self.down + self.up // 2) // self.up - self.buffer_start]
+        else:
+            centre = n * self.down + self.half_length
+            first = centre // self.up - (self.width - 1) - self.buffer_start
+            windows = sliding_window_view(self.buffer, self.width)
+
+            phases = centre % self.up
+            resampled = np.empty(len(n))
+
+            # gather input windows for a limited number of output samples at a time
+            chunk = max(RESAMPLE_CHUNK_SIZE // self.width, 1)
+            for chunk_start in range(0, len(n), chunk):
+                chunk_slice = slice(chunk_start, chunk_start + chunk)
+                for phase in range(self.up):
+                    in_phase = np.flatnonzero(phases[chunk_slice] == phase) + chunk_start
+                    resampled[in_phase] = windows[first[in_phase]] @ self.filters[phase]
+
+        # drop input samples that are no longer needed
+        self.produced = end
+        keep = (end * self.down + self.half_length) // self.up - (self.width - 1) - self.buffer_start
+        keep = min(max(keep, 0), len(self.buffer))
+        self.buffer = self.buffer[keep:]
+        self.buffer_start += keep
+
+        return resampled
+
+
+# ======================================== DriftCorrector CLASS ========================================
+class DriftCorrector:
+    """
+    Corrects clock drift ("gather" mode) of signals that are read in blocks, giving the same samples as
+    drift_correction_index and apply_drift_correction on the whole signals. The samples removed or repeated
+    within each block are calculated from the block's position in the signal and the last sample of each
+    signal is carried over to the next call (a sample repeated at the start of a block is the last one of
+    the previous block).
+
+    Example:
+        corrector = DriftCorrector(len(x), drift_rate, adjust_start)
+        for block in blocks:
+            outputs.append(corrector.process({"x": block["x"], "y": block["y"]}))
+    """
+
+    def __init__(self, length, drift_rate, adjust_start):
+
+        '''
+        Args:
+            length: int
+                Number of samples in each (uncorrected) signal
+            drift_rate: float
+                Clock drift in seconds per second (file_info["clock_drift_rate"])
+            adjust_start: int
+                Number of samples of drift accumulated before the first sample
+        '''
+
+        self.length = length
+        self.drift_rate = drift_rate
+        self.adjust_rate = abs(1 / drift_rate)
+        self.adjust_start = adjust_start
+
+        # last position of drift_correction_index (positions are only calculated up to the signal length)
+        self.last_position = int(length / self.adjust_rate)
+
+        self.received = 0
+        self.to_remove = adjust_start if drift_rate > 0 else 0
+        self.previous = {}
+
+    def index(self, block_length):
+
+        '''
+        index() calculates the gather index of the next block_length samples (relative to the block,
+        -1 is the last sample of the previous block)
+        Returns:
+            index: np.array
+        '''
+
+        first = self.received
+        last = first + block_length
+        self.received = last
+
+        # positions of drift_correction_index within the block (a position at the end of the signal is
+        # part of the last block)
+        j = np.arange(max(int(first / self.adjust_rate) - 1, 1), min(int(last / self.adjust_rate) + 2, self.last_position + 1))
+        positions = np.round(self.adjust_rate * j).astype(np.int64)
+        end = last + 1 if last >= self.length else last
+        positions = positions[(positions >= first) & (positions < end)] - first
+
+        if self.drift_rate > 0:  # remove samples (and samples before start)
+            keep = np.ones(block_length, dtype=bool)
+            keep[positions[positions < block_length]] = False
+            index = np.flatnonzero(keep)
+            removed = min(self.to_remove, len(index))
+            self.to_remove -= removed
+            return index[removed:]
+
+        # repeat the previous sample (and the first sample before start)
+        index = np.insert(np.arange(block_length), positions, positions - 1)
+        if first == 0:
+            index = np.concatenate([np.zeros(self.adjust_start, dtype=index.dtype), index])
+        return index
+
+    def process(self, signals):
+
+        '''
+        process() corrects the next block of each signal
+        Args:
+            signals: dict of np.array
+                Next block of each signal (all of the same length)
+
+        Returns:
+            corrected: dict of np.array
+        '''
+
+        block_length = len(next(iter(signals.values()))) if signals else 0
+        index = self.index(block_length) + 1
+
+        corrected = {}
+        for key, signal in signals.items():
+            previous = self.previous.get(key, signal[:1])
+            corrected[key] = np.concatenate([previous, signal])[index]
+            if len(signal):
+                self.previous[key] = signal[-1:]
+
+        return corrected
+
+
+# ======================================== CompactData CLASS ========================================
+class CompactData(dict):
+    """
+    GENEActivFile.data holding raw counts (int16 x, y and z, uint16 light and bit-packed button) instead of
+    float64/int64 signals. Signals are calibrated (or unpacked) when first accessed, e.g. data["x"], and
+    kept until drop_signals() is called.
+    """
+
+    def __init__(self, data, file_info, calibrate=True, dtype=np.float64):
+
+        super().__init__(data)
+
+        # raw counts of each signal (button packed to 1 bit per sample)
+        self.counts = {key: self.pop(key) for key in ["x", "y", "z", "light"] if key in self}
+        if "button" in self:
+            button = self.pop("button")
+            self.button_samples = len(button)
+            self.counts["button"] = np.packbits(button.astype(bool))
+
+        self.file_info = file_info
+        self.calibrate = calibrate
+        self.dtype = dtype
+
+    def __missing__(self, key):
+
+        if key not in self.counts:
+            raise KeyError(key)
+
+        if key == "button":
+            value = np.unpackbits(self.counts[key], count=self.button_samples)
+        elif self.calibrate:
+            value = calibrate_counts({key: self.counts[key]}, self.file_info)[key].astype(self.dtype, copy=False)
+        else:
+            value = self.counts[key]
+
+        self[key] = value
+
+        return value
+
+    def drop_signals(self):
+        """ Releases calibrated signals, they are recalculated from the counts when next accessed """
+        for key in self.counts:
+            self.pop(key, None)
+
+    def nbytes(self):
+        """ Returns the number of bytes used by raw counts and signals currently calibrated """
+        return (sum(counts.nbytes for counts in self.counts.values()) +
+                sum(value.nbytes for value in self.values() if isinstance(value, np.ndarray)))
+
 
 # ======================================== GENEActivFile CLASS ========================================
 class GENEActivFile:
 
-    def __init__(self, file_path):
+    def __init__(self, file_path, cache_dir=None, cache_size=CACHE_SIZE, timer=None):
+
+        '''
+        Args:
+            file_path: String
+                Path to the GENEActiv .bin file
+            cache_dir: String
+                Directory where decoded data is cached between reads (default = None, no cache)
+            cache_size: int
+                Maximum size of cache_dir in bytes, least recently used files are removed beyond it
+            timer: StageTimer
+                Records the time, bytes read and memory of each stage of reading the file and reports
+                parsing progress (default = a new StageTimer for this file, see instrumentation.StageTimer)
+        '''
 
         self.file_path = os.path.abspath(file_path)
         self.file_name = os.path.basename(self.file_path)
         self.file_dir = os.path.dirname(self.file_path)
         self.header = {}
-        self.data_packet = None
+
+        # decoded raw counts of all pages mapped from cache_dir (see load_cache)
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.cache = None
+
+        # stage timings and progress callback
+        self.timer = StageTimer(self.file_name) if timer is None else timer
+
+        # byte offset of first data page, number of lines after the header and byte offsets
+        # of the page time, temperature and data lines of each page (see build_page_index)
+        self.data_offset = None
+        self.line_count = None
+        self.page_index = None
+        self.page_times = None
 
         # metadata stored in file header or related to entire file
         self.file_info = {
@@ -92,6 +974,7 @@ class GENEActivFile:
             "temperature": [],
             "light": [],
             "button": [],
+            "page_times": [],
             "start_page": None,
             "end_page": None,
             "start_time": None,
@@ -99,185 +982,457 @@ class GENEActivFile:
             "temp_sample_rate": None}
 
     def read(self, parse_data=True, start=1, end=-1, downsample=1,
-             calibrate=True, correct_drift=False, update=True, quiet=False):
+             calibrate=True, correct_drift=False, update=True, quiet=False, workers=1, drift_mode="gather",
+             compact=False, sample_rate=None):
 
         '''
         read() reads a raw GENEActiv .bin file
         Args:
             parse_data: Bool
                 Whether or not to parse the hexadecimal (as opposed to only returning header information)
+                If False only the header is read and the page count is taken from the file size
             quiet: Bool
                 Whether or not to print additional information
                 TODO: Figure out how to change this into -v command
+            workers: int
+                Number of processes used to decode pages (see parse_data)
+            drift_mode: str
+                Clock drift correction mode (see parse_data)
+            compact: Bool
+                Whether to store raw counts and calibrate on access (see parse_data)
+            sample_rate: float
+                Sample rate to resample the signals to with an anti-aliasing filter (see parse_data)
 
         Returns:
 
         '''
-        read_start_time = time.time()
-        # if file does not exist then exit
-        if not os.path.exists(self.file_path):
-            print(f"****** WARNING: {self.file_path} does not exist.\n")
-            return
+        with self.timer.stage("read") as read_record:
+            # if file does not exist then exit
+            if not os.path.exists(self.file_path):
+                print(f"****** WARNING: {self.file_path} does not exist.\n")
+                return
+
+            # Read GENEActiv .bin file header (data pages are located through the page index)
+
+            if not quiet: print("Reading %s ..." % self.file_path)
+            with self.timer.stage("read_header") as header_record:
+                with open(self.file_path, "rb") as bin_file:
+                    head = bin_file.read(HEADER_READ_SIZE)
+                header_record["bytes_read"] = len(head)
+
+            # Calculate number of bytes in header
+            header_end = head.find(b"\nRecorded Data") + 1
+            if not header_end:
+                raise ValueError(f"'Recorded Data' not found in header of {self.file_path}")
+            self.data_offset = header_end
+
+            # Separate header and first data page
+            header_packet = head[:header_end].decode("utf-8").replace("\r\n", "\n").split("\n")[:-1]
+            first_page = head[header_end:].split(b"\n", PAGE_LINES)[:PAGE_LINES]
+
+            # Parse header into header dict
+            if not quiet: print("Parsing header information ...")
+            for line in header_packet:
+                try:
+                    colon = line.index(":")
+                    self.header[line[:colon]] = line[colon + 1:].rstrip('\x00').rstrip()
+                except ValueError:
+                    pass
+
+            # Extract and format relevant metadata from header
+            self.file_info.update({
+                "serial_num": self.header["Device Unique Serial Code"],
+                "device_type": self.header["Device Type"],
+                "accelerometer_units": self.header['Accelerometer Units'],
+                "accelerometer_physical_min": int(self.header['Accelerometer Range'][:2]),
+                "accelerometer_physical_max": int(self.header['Accelerometer Range'][6]),
+                "temperature_units": self.header["Temperature Sensor Units"],
+                "temperature_physical_max": int(self.header["Temperature Sensor Range"][0]),
+                "temperature_physical_min": int(self.header["Temperature Sensor Range"][5:7]),
+                "light_units": self.header["Light Meter Units"],
+                "light_physical_max": int(self.header["Light Meter Range"][0]),
+                "light_physical_min": int(self.header["Light Meter Range"][5:9]),
+                "measurement_frequency": int(self.header["Measurement Frequency"].split(" ")[0]),
+                "temperature_frequency": int(self.header["Measurement Frequency"].split(" ")[0]) / 300,
+                "measurement_period": int(self.header["Measurement Period"].split(" ")[0]),  # ???????
+                "start_time": parse_page_time(first_page[PAGE_TIME_LINE]),
+                # Using first 'Page Time' rather than "start time" because its half a millisecond ahead
+                "study_centre": self.header["Study Centre"],
+                "study_code": self.header["Study Code"],
+                "investigator_id": self.header["Investigator ID"],
+                "exercise_type": self.header["Exercise Type"],
+                "config_id": self.header["Config Operator ID"],
+                "config_time": datetime.datetime.strptime(self.header["Config Time"], "%Y-%m-%d %H:%M:%S:%f"),
+                "config_notes": self.header["Config Notes"],
+                "extract_id": self.header["Extract Operator ID"],
+                "extract_time": datetime.datetime.strptime(self.header["Extract Time"], "%Y-%m-%d %H:%M:%S:%f"),
+                "extract_notes": self.header["Extract Notes"],
+                "clock_drift": float(self.header["Extract Notes"].split(" ")[3][:-2].replace(",", "")),
+                "device_location": self.header["Device Location Code"].replace(" ", "_"),
+                "subject_id": self.header["Subject Code"],
+                "date_of_birth": self.header["Date of Birth"],
+                "sex": self.header["Sex"],
+                "height": self.header["Height"],
+                "weight": self.header['Weight'],
+                "handedness_code": self.header["Handedness Code"],
+                "subject_notes": self.header["Subject Notes"],  # If there is a line break in your notes, will only show first line
+                "number_of_pages": int(self.header["Number of Pages"]),
+                "x_gain": int(self.header["x gain"]),
+                "x_offset": int(self.header["x offset"]),
+                "y_gain": int(self.header["y gain"]),
+                "y_offset": int(self.header["y offset"]),
+                "z_gain": int(self.header["z gain"]),
+                "z_offset": int(self.header["z offset"]),
+                "volts": int(self.header["Volts"]),
+                "lux": int(self.header["Lux"]),
+                "x_min": (-204800 - int(self.header['x offset'])) / int(self.header['x gain']),
+                "y_min": (-204800 - int(self.header['y offset'])) / int(self.header['y gain']),
+                "z_min": (-204800 - int(self.header['z offset'])) / int(self.header['z gain']),
+                "x_max": (204700 - int(self.header['x offset'])) / int(self.header['x gain']),
+                "y_max": (204700 - int(self.header['y offset'])) / int(self.header['y gain']),
+                "z_max": (204700 - int(self.header['z offset'])) / int(self.header['z gain']),
+                "light_min": 0 * int(self.header['Lux']) / int(self.header['Volts']),
+                "light_max": 1023 * int(self.header['Lux']) / int(self.header['Volts'])})
+
+            # set match to true
+            self.file_info["pagecount_match"] = True
+
+            # get page counts - from the page index if data will be parsed, otherwise from the file
+            # size so that only the header is read (page index is then built when data is parsed)
+            if parse_data:
+                if self.cache_dir is not None:
+                    self.load_cache(quiet=quiet)
+                else:
+                    self.build_page_index(quiet=quiet)
+                pagecount = self.line_count / PAGE_LINES
+            else:
+                pagecount = self._count_pages(head)
+            header_pagecount = self.file_info['number_of_pages']
+
+            # check if pages read is an integer (lines read is multiple of 10)
+            if not pagecount.is_integer():
+                # set match to false and display warning
+                self.file_info["pagecount_match"] = False
+                print(f"****** WARNING: Pages read ({pagecount}) is not",
+                      f"an integer, data may be corrupt.\n")
+
+            # check if pages read matches header count
+            if pagecount != header_pagecount:
+                # set match to false and display warning
+                self.file_info["pagecount_match"] = False
+                print(f"****** WARNING: Pages read ({pagecount}) not equal to",
+                      f"'Number of Pages' in header ({header_pagecount}).\n")
+
+            # store pagecount as attribute
+            self.file_info["pagecount"] = pagecount
+
+            # cacluate number of samples
+            self.file_info["samples"] = self.file_info["pagecount"] * 300
+
+            # calculate clock drift rate
+            total_seconds = (self.file_info["extract_time"] - self.file_info["config_time"]).total_seconds()
+            self.file_info["clock_drift_rate"] = self.file_info["clock_drift"] / total_seconds
+
+            # parse data from hexadecimal
+            if parse_data:
+                self.parse_data(start=start, end=end, downsample=downsample, calibrate=calibrate,
+                                correct_drift=correct_drift, update=update, quiet=quiet, workers=workers,
+                                drift_mode=drift_mode, compact=compact, sample_rate=sample_rate)
+
+        if not quiet: print("Done reading file. Time to read file: ", read_record["wall_seconds"])
+
+    def _count_pages(self, head):
+
+        '''
+        _count_pages() calculates the number of pages (number of lines after the header / 10) without
+        reading the data section: from the file size if it is an exact multiple of the length of the
+        first page record (and a page record starts where the last one should), otherwise from the
+        sequence number and line count of the last page in the file
+        Args:
+            head: bytes
+                Leading block of the file read by read() (contains the header and first page)
+        '''
+
+        file_size = os.path.getsize(self.file_path)
+        data_size = file_size - self.data_offset
+
+        # length of first page record (distance to the start of the second page)
+        record_length = head.find(b"\nRecorded Data", self.data_offset) + 1 - self.data_offset
+
+        with open(self.file_path, "rb") as bin_file:
+
+            if record_length > 0 and data_size % record_length == 0:
+                bin_file.seek(file_size - record_length)
+                if bin_file.read(len(b"Recorded Data")) == b"Recorded Data":
+                    return data_size / record_length
+
+            # tail scan: find start of last page record
+            tail_offset = max(self.data_offset, file_size - TAIL_READ_SIZE)
+            bin_file.seek(tail_offset)
+            tail = bin_file.read()
+
+        # step back from the last page record until one has a complete sequence number line (a file truncated
+        # within a page header is counted from the previous page, the lines after it make up the partial page)
+        search_end = len(tail)
+        while search_end >= 0:
+            search_end = tail.rfind(b"\nRecorded Data", 0, search_end)
+            if search_end < 0 and tail_offset > self.data_offset:
+                break  # the tail starts within a page
+            lines = tail[search_end + 1:].split(b"\n")
+            if len(lines) > 3 and b":" in lines[2]:
+                colon = lines[2].index(b":")
+                if lines[2][colon + 1:].strip().isdigit():
+                    if not lines[-1]:
+                        lines = lines[:-1]
+                    return int(lines[2][colon + 1:]) + len(lines) / PAGE_LINES
+
+        # no complete page header in the tail, count all lines of the data section
+        with open(self.file_path, "rb") as bin_file:
+            bin_file.seek(self.data_offset)
+            lines = bin_file.read().split(b"\n")
+        if not lines[-1]:
+            lines = lines[:-1]
+        return len(lines) / PAGE_LINES
+
+    def build_page_index(self, quiet=False):
+
+        '''
+        build_page_index() scans the data section of the file once for line breaks and stores the
+        byte offsets of the page time, temperature and data lines of every complete page in
+        self.page_index (one row per page, see PAGE_TIME_COLUMN, TEMPERATURE_COLUMN, DATA_COLUMN)
+
+        Returns:
+            page_index: np.array
+        '''
+
+        if not quiet: print("Indexing data pages ...")
+
+        # find the start of every line in the data section (the first line starts at data_offset)
+        line_starts = [np.array([self.data_offset], dtype=np.int64)]
+        offset = self.data_offset
+
+        with self.timer.stage("index_pages") as index_record, open(self.file_path, "rb") as bin_file:
+            bin_file.seek(offset)
+            while True:
+                chunk = bin_file.read(SCAN_CHUNK_SIZE)
+                if not chunk:
+                    break
+                newlines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord("\n"))
+                line_starts.append(newlines.astype(np.int64) + (offset + 1))
+                offset += len(chunk)
+                index_record["bytes_read"] += len(chunk)
+
+        line_starts = np.concatenate(line_starts)
+
+        # a newline at the very end of the file does not start another line
+        if line_starts[-1] == offset:
+            line_starts = line_starts[:-1]
+
+        self.line_count = len(line_starts)
+
+        # keep offsets of the page time, temperature and data line of complete pages
+        full_pages = self.line_count // PAGE_LINES
+        page_lines = line_starts[:full_pages * PAGE_LINES].reshape(full_pages, PAGE_LINES)
+
+        # drop last page if its data line was cut short
+        if full_pages and page_lines[-1, DATA_LINE] + DATA_LINE_LENGTH > offset:
+            page_lines = page_lines[:-1]
+
+        self.page_index = page_lines[:, [PAGE_TIME_LINE, TEMPERATURE_LINE, DATA_LINE]].copy()
+
+        return self.page_index
+
+    def cache_key(self):
+
+        '''
+        cache_key() identifies the decoded data of the file in the cache by the hash of its whole content
+        (read in chunks), its size and PARSER_VERSION, so that a file changed without a change of size or
+        modification time is decoded again and a copy of a file is found in the cache
+        Returns:
+            key: str
+        '''
+
+        size = os.path.getsize(self.file_path)
+
+        content_hash = hashlib.sha1()
+        with self.timer.stage("hash_file", bytes_read=size), open(self.file_path, "rb") as bin_file:
+            for chunk in iter(lambda: bin_file.read(SCAN_CHUNK_SIZE), b""):
+                content_hash.update(chunk)
+
+        key = f"{size}-{content_hash.hexdigest()}-{PARSER_VERSION}"
+
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def load_cache(self, quiet=False):
+
+        '''
+        load_cache() maps the cached raw counts, temperature and page index of the file from cache_dir
+        into self.cache and self.page_index, decoding the file and adding it to the cache first if needed
+        Returns:
+            cache: dict of np.memmap
+        '''
+
+        entry_dir = os.path.join(self.cache_dir, self.cache_key())
+
+        if not os.path.exists(os.path.join(entry_dir, "cache_info.json")):
+            with self.timer.stage("write_cache"):
+                self._write_cache(entry_dir, quiet=quiet)
+        elif not quiet:
+            print("Loading cached data ...")
+
+        with open(os.path.join(entry_dir, "cache_info.json")) as info_file:
+            cache_info = json.load(info_file)
+
+        self.line_count = cache_info["line_count"]
+        self.page_index = np.load(os.path.join(entry_dir, "page_index.npy"))
+        self.cache = {key: np.load(os.path.join(entry_dir, key + ".npy"), mmap_mode="r") for key in CACHE_CHANNELS}
 
-        # Read GENEActiv .bin file
-
-        if not quiet: print("Reading %s ..." % self.file_path)
-        bin_file = open(self.file_path, "r", encoding="utf-8")
-        lines = [line[:-1] for line in bin_file.readlines()]
-        bin_file.close()
-        # Calculate number of lines in header
-        header_end = lines[:150].index("Recorded Data")
-
-        # Separate header and data packets
-        header_packet = lines[:header_end]
-        self.data_packet = lines[header_end:]
-
-        # Parse header into header dict
-        if not quiet: print("Parsing header information ...")
-        for line in header_packet:
-            try:
-                colon = line.index(":")
-                self.header[line[:colon]] = line[colon + 1:].rstrip('\x00').rstrip()
-            except ValueError:
-                pass
-
-        # Extract and format relevant metadata from header
-        self.file_info.update({
-            "serial_num": self.header["Device Unique Serial Code"],
-            "device_type": self.header["Device Type"],
-            "accelerometer_units": self.header['Accelerometer Units'],
-            "accelerometer_physical_min": int(self.header['Accelerometer Range'][:2]),
-            "accelerometer_physical_max": int(self.header['Accelerometer Range'][6]),
-            "temperature_units": self.header["Temperature Sensor Units"],
-            "temperature_physical_max": int(self.header["Temperature Sensor Range"][0]),
-            "temperature_physical_min": int(self.header["Temperature Sensor Range"][5:7]),
-            "light_units": self.header["Light Meter Units"],
-            "light_physical_max": int(self.header["Light Meter Range"][0]),
-            "light_physical_min": int(self.header["Light Meter Range"][5:9]),
-            "measurement_frequency": int(self.header["Measurement Frequency"].split(" ")[0]),
-            "temperature_frequency": int(self.header["Measurement Frequency"].split(" ")[0]) / 300,
-            "measurement_period": int(self.header["Measurement Period"].split(" ")[0]),  # ???????
-            "start_time": datetime.datetime.strptime(self.data_packet[3][10:], "%Y-%m-%d %H:%M:%S:%f"),
-            # Using first 'Page Time' rather than "start time" because its half a millisecond ahead
-            "study_centre": self.header["Study Centre"],
-            "study_code": self.header["Study Code"],
-            "investigator_id": self.header["Investigator ID"],
-            "exercise_type": self.header["Exercise Type"],
-            "config_id": self.header["Config Operator ID"],
-            "config_time": datetime.datetime.strptime(self.header["Config Time"], "%Y-%m-%d %H:%M:%S:%f"),
-            "config_notes": self.header["Config Notes"],
-            "extract_id": self.header["Extract Operator ID"],
-            "extract_time": datetime.datetime.strptime(self.header["Extract Time"], "%Y-%m-%d %H:%M:%S:%f"),
-            "extract_notes": self.header["Extract Notes"],
-            "clock_drift": float(self.header["Extract Notes"].split(" ")[3][:-2].replace(",", "")),
-            "device_location": self.header["Device Location Code"].replace(" ", "_"),
-            "subject_id": self.header["Subject Code"],
-            "date_of_birth": self.header["Date of Birth"],
-            "sex": self.header["Sex"],
-            "height": self.header["Height"],
-            "weight": self.header['Weight'],
-            "handedness_code": self.header["Handedness Code"],
-            "subject_notes": self.header["Subject Notes"],  # If there is a line break in your notes, will only show first line
-            "number_of_pages": int(self.header["Number of Pages"]),
-            "x_gain": int(self.header["x gain"]),
-            "x_offset": int(self.header["x offset"]),
-            "y_gain": int(self.header["y gain"]),
-            "y_offset": int(self.header["y offset"]),
-            "z_gain": int(self.header["z gain"]),
-            "z_offset": int(self.header["z offset"]),
-            "volts": int(self.header["Volts"]),
-            "lux": int(self.header["Lux"]),
-            "x_min": (-204800 - int(self.header['x offset'])) / int(self.header['x gain']),
-            "y_min": (-204800 - int(self.header['y offset'])) / int(self.header['y gain']),
-            "z_min": (-204800 - int(self.header['z offset'])) / int(self.header['z gain']),
-            "x_max": (204700 - int(self.header['x offset'])) / int(self.header['x gain']),
-            "y_max": (204700 - int(self.header['y offset'])) / int(self.header['y gain']),
-            "z_max": (204700 - int(self.header['z offset'])) / int(self.header['z gain']),
-            "light_min": 0 * int(self.header['Lux']) / int(self.header['Volts']),
-            "light_max": 1023 * int(self.header['Lux']) / int(self.header['Volts'])})
-
-        # calculate pagecount from data_packet
-
-        # set match to true
-        self.file_info["pagecount_match"] = True
-
-        # get page counts
-        pagecount = len(self.data_packet) / 10
-        header_pagecount = self.file_info['number_of_pages']
-
-        # check if pages read is an integer (lines read is multiple of 10)
-        if not pagecount.is_integer():
-            # set match to false and display warning
-            self.file_info["pagecount_match"] = False
-            print(f"****** WARNING: Pages read ({pagecount}) is not",
-                  f"an integer, data may be corrupt.\n")
-
-        # check if pages read matches header count
-        if pagecount != header_pagecount:
-            # set match to false and display warning
-            self.file_info["pagecount_match"] = False
-            print(f"****** WARNING: Pages read ({pagecount}) not equal to",
-                  f"'Number of Pages' in header ({header_pagecount}).\n")
-
-        # store pagecount as attribute
-        self.file_info["pagecount"] = pagecount
-
-        # cacluate number of samples
-        self.file_info["samples"] = self.file_info["pagecount"] * 300
-
-        # calculate clock drift rate
-        total_seconds = (self.file_info["extract_time"] - self.file_info["config_time"]).total_seconds()
-        self.file_info["clock_drift_rate"] = self.file_info["clock_drift"] / total_seconds
-
-        # parse data from hexadecimal
-        if parse_data:
-            self.parse_data(start=start, end=end, downsample=downsample, calibrate=calibrate,
-                            correct_drift=correct_drift, update=update, quiet=quiet)
-
-        if not quiet: print("Done reading file. Time to read file: ", time.time() - read_start_time)
+        # mark entry as recently used
+        os.utime(os.path.join(entry_dir, "cache_info.json"))
+
+        return self.cache
+
+    def _write_cache(self, entry_dir, quiet=False):
+
+        '''
+        _write_cache() decodes all pages of the file to raw counts, stores them in entry_dir and removes
+        least recently used entries if the cache directory exceeds cache_size
+        '''
+
+        if not quiet: print("Caching decoded data ...")
+
+        if self.page_index is None:
+            self.build_page_index(quiet=quiet)
+
+        pages = len(self.page_index)
+        temp_dir = entry_dir + ".tmp%d" % os.getpid()
+        os.makedirs(temp_dir, exist_ok=True)
+
+        dtypes = dict(COUNT_DTYPES, temperature=np.float32, page_times="datetime64[us]")
+        arrays = {key: np.lib.format.open_memmap(os.path.join(temp_dir, key + ".npy"), mode="w+", dtype=dtypes[key],
+                                                 shape=(pages,) if key in PAGE_CHANNELS else (pages, 300))
+                  for key in CACHE_CHANNELS}
+
+        with open(self.file_path, "rb") as bin_file:
+            for first in range(0, pages, BLOCK_PAGES):
+                block = decode_pages(bin_file, self.page_index[first:first + BLOCK_PAGES], self.file_info,
+                                     calibrate=False)
+                for key in CACHE_CHANNELS:
+                    if key in PAGE_CHANNELS:
+                        arrays[key][first:first + len(block[key])] = block[key]
+                    else:
+                        arrays[key][first:first + len(block[key]) // 300] = block[key].reshape(-1, 300)
+
+        for array in arrays.values():
+            array.flush()
+        del arrays
+
+        np.save(os.path.join(temp_dir, "page_index.npy"), self.page_index)
+
+        with open(os.path.join(temp_dir, "cache_info.json"), "w") as info_file:
+            json.dump({"file_path": self.file_path,
+                       "line_count": self.line_count,
+                       "parser_version": PARSER_VERSION}, info_file)
+
+        # move complete entry into place so that a partially written entry is never used
+        try:
+            os.replace(temp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(temp_dir, ignore_errors=True)  # entry written by another process
+
+        self._evict_cache(keep=entry_dir)
+
+    def _evict_cache(self, keep=None):
+
+        '''
+        _evict_cache() removes least recently used entries until cache_dir is no larger than cache_size
+        '''
+
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            info_path = os.path.join(entry_dir, "cache_info.json")
+            if not os.path.isfile(info_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+            entries.append((os.path.getmtime(info_path), size, entry_dir))
+
+        total_size = sum(entry[1] for entry in entries)
+
+        for last_used, size, entry_dir in sorted(entries):
+            if total_size <= self.cache_size:
+                break
+            if entry_dir == keep:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
 
     def parse_data(self, start=1, end=-1, downsample=1, calibrate=True,
-                   correct_drift=False, update=True, quiet=False):
-        def twos_comp(val, bits):
-            """ This method calculates the twos complement value of the current bit
-            Args:
-                val: bin
-                    Bits to be processed (Binary)
-                bits: int
-                    Total number of bits in the operation
-
-            Returns:
-                page_data: Integer value resulting from the twos compliment operation
-            """
-            if (val & (1 << (bits - 1))) != 0:  # if sign bit is set e.g., 8bit: 128-255
-                val = val - (1 << bits)  # compute negative value
-            return val
+                   correct_drift=False, update=True, quiet=False, workers=1, drift_mode="gather",
+                   compact=False, compact_dtype=np.float64, channels=CHANNELS, sample_rate=None):
+
+        '''
+        parse_data() decodes the hexadecimal data of a range of pages
+        Args:
+            start: int
+                First page to read (default = 1)
+            end: int
+                Last page to read (default = -1, last page in file)
+            downsample: int
+                Keep every nth measurement within each page (range: 1-6)
+            calibrate: Bool
+                Whether to convert raw counts to calibrated units
+            correct_drift: Bool
+                Whether to adjust the number of samples for clock drift
+            update: Bool
+                Whether to store the parsed data in self.data
+            quiet: Bool
+                Whether or not to print additional information
+            workers: int
+                Number of processes used to decode pages (default = 1, decode in this process)
+            drift_mode: str
+                How samples are added or removed when correcting clock drift: "gather" (drop samples or
+                repeat the previous sample) or "interpolate" (resample onto the corrected clock)
+            compact: Bool
+                Whether to store raw counts (int16 accelerometer, uint16 light, bit-packed button) and
+                calibrate each signal when it is first accessed (see CompactData)
+            compact_dtype: np.dtype
+                dtype of calibrated signals of compact data (float32 or float64)
+            channels: tuple of str
+                Channels to decode and store, any of "x", "y", "z", "light", "button" and "temperature"
+                (e.g. ("temperature",) only reads the temperature line of each page)
+            sample_rate: float
+                Sample rate to resample x, y, z, light and button to (any integer or rational rate up to the
+                measurement frequency, e.g. 1 or 12.5) with an anti-aliasing filter (see Resampler), instead of
+                keeping every nth measurement (default = None, use downsample)
+
+        Returns:
+            data: dict
+        '''
 
         pagecount = self.file_info["pagecount"]
 
         # check whether data has been read
-        if not self.header or self.data_packet is None or pagecount is None:
+        if not self.header or pagecount is None:
             print('****** WARNING: Cannot parse data because file has not',
                   'been read.\n')
             return
 
+        # load cached data or index data pages if only the header was read
+        if self.cache_dir is not None and self.cache is None:
+            self.load_cache(quiet=quiet)
+        elif self.page_index is None:
+            self.build_page_index(quiet=quiet)
+
         if not quiet: print("Parsing data from hexadecimal ...")
 
         # store passed arguments before checking and modifying
         old_start = start
         old_end = end
         old_downsample = downsample
+        old_sample_rate = sample_rate
 
-        # check start and end for acceptable values
-        if start < 1:
-            start = 1
-        elif start > pagecount:
-            start = round(pagecount)
-
-        if end == -1 or end > pagecount:
-            end = round(pagecount)
-        elif end < start:
-            end = start
+        start, end = self._check_page_range(start, end)
 
         # check downsample for valid values
         if downsample < 1:
@@ -285,151 +1440,151 @@ class GENEActivFile:
         elif downsample > 6:
             downsample = 6
 
-        # get calibration variables
-        if calibrate:
-            x_offset = self.file_info["x_offset"]
-            y_offset = self.file_info["y_offset"]
-            z_offset = self.file_info["z_offset"]
-            x_gain = self.file_info["x_gain"]
-            y_gain = self.file_info["y_gain"]
-            z_gain = self.file_info["z_gain"]
-            volts = self.file_info["volts"]
-            lux = self.file_info["lux"]
-
-        # initialize lists to temporarily hold read data
-        temperature = []
-        x = []
-        y = []
-        z = []
-        light = []
-        button = []
+        # keep requested channels in the usual order
+        channels = tuple(key for key in CHANNELS if key in channels)
+
+        measurement_frequency = self.file_info['measurement_frequency']
+
+        # check sample rate for valid values, resampled data is decoded at the full rate
+        if sample_rate is not None:
+            sample_rate = min(max(sample_rate, 0.01), measurement_frequency)
+            downsample = 1
+            if compact:
+                print('****** WARNING: Resampled data cannot be stored as compact data,',
+                      'storing full signals.\n')
+                compact = False
 
         total_pages = end - (start - 1)
-        sample_rate = self.file_info['measurement_frequency']
-        downsampled_rate = (sample_rate / downsample)
-        meas_per_page = int(300 / downsample)
-
-        # get start_time (time of first data point in view)
-        start_time_line = self.data_packet[(start - 1) * 10 + 3]
-        colon = start_time_line.index(':')
-        start_time = start_time_line[colon + 1:]
-        start_time = datetime.datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S:%f')
-
-        # grab chunk of data from packet
-        data_chunk = [self.data_packet[i]
-                      for i in range((start - 1) * 10 + 9, end * 10, 10)]
-
-        i = 0
-
-        # loop through pages
-        for data_line in data_chunk:
-
-            i += 1
-
-            # display progress
-            if (i // 1000) * 1000 == i:
-                if not quiet:
-                    print("Current Progress: %r %%" % (round((100 * i / total_pages), 2)))
-
-            # loop through measurements in page
-            for j in range(0, 300, downsample):
-
-                # parse measurement from line and convert from hex to bin
-                meas = data_line[j * 12: (j + 1) * 12]
-                meas = bin(int(meas, 16))[2:]
-                meas = meas.zfill(48)
-
-                # parse each signal from measurement and convert to int
-                meas_x = int(meas[0:12], 2)
-                meas_y = int(meas[12:24], 2)
-                meas_z = int(meas[24:36], 2)
-                meas_light = int(meas[36:46], 2)
-                meas_button = int(meas[46], 2)
-                # res = int(curr[47], 2) - NOT USED
-
-                # use twos complement to get signed integer for accelerometer data
-                meas_x = twos_comp(meas_x, 12)
-                meas_y = twos_comp(meas_y, 12)
-                meas_z = twos_comp(meas_z, 12)
-                # light = twos_comp(light, 10) # NOT NEEDED, not a signed integer? TEST TO SEE IF THIS FIXES HIGH VALUES??
-
-                # calibrate data if requrested
-                if calibrate:
-                    meas_x = (meas_x * 100 - x_offset) / x_gain
-                    meas_y = (meas_y * 100 - y_offset) / y_gain
-                    meas_z = (meas_z * 100 - z_offset) / z_gain
-                    meas_light = (meas_light * lux) / volts
-
-                # append measurement to data list
-                x.append(meas_x)
-                y.append(meas_y)
-                z.append(meas_z)
-                light.append(meas_light)
-                button.append(meas_button)
-
-        # get all temperature lines from data packet (1 per page)
-        temperature_chunk = [self.data_packet[i]
-                             for i in range((start - 1) * 10 + 5, end * 10, 10)]
-
-        # parse temperature from temperature lines and insert into dict
-        for temperature_line in temperature_chunk:
-            colon = temperature_line.index(':')
-            temperature.append(float(temperature_line[colon + 1:]))
+        downsampled_rate = sample_rate or (measurement_frequency / downsample)
+        meas_per_page = len(range(0, 300, downsample))
+
+        # one resampler per signal, state is carried from block to block
+        resamplers = {}
+        if sample_rate is not None:
+            resamplers = {key: Resampler(measurement_frequency, sample_rate, discrete=(key == "button"))
+                          for key in channels if key in DATA_CHANNELS}
+
+        # preallocate output arrays (in shared memory if pages are decoded by several processes)
+        sample_count = total_pages * meas_per_page
+        shapes = {key: (total_pages if key in PAGE_CHANNELS else sample_count,) for key in channels}
+        shapes.update({key: (resampler.output_length(sample_count),) for key, resampler in resamplers.items()})
+        shapes["page_times"] = (total_pages,)
+        if compact:
+            dtypes = {key: np.dtype(COUNT_DTYPES[key]) for key in DATA_CHANNELS}
+        else:
+            resampled = sample_rate is not None
+            dtypes = {key: np.dtype(np.float64 if calibrate or resampled else np.int64)
+                      for key in ["x", "y", "z", "light"]}
+            dtypes["button"] = np.dtype(np.int64)
+        dtypes.update({"temperature": np.dtype(np.float32), "page_times": np.dtype("datetime64[us]")})
+
+        # compact data is stored as raw counts and calibrated when accessed
+        decode_calibrated = calibrate and not compact
+
+        # resampling carries filter state from block to block so pages are decoded in order
+        parallel = workers > 1 and total_pages > BLOCK_PAGES and self.cache is None and not resamplers
+
+        if parallel:
+            shared = {key: shared_memory.SharedMemory(create=True, size=max(1, shapes[key][0] * dtypes[key].itemsize))
+                      for key in shapes}
+            outputs = {key: np.ndarray(shapes[key], dtype=dtypes[key], buffer=shared[key].buf) for key in shapes}
+        else:
+            outputs = {key: np.empty(shapes[key], dtype=dtypes[key]) for key in shapes}
+
+        # progress is reported to the callback of the timer, or printed
+        progress_callback = self.timer.progress_callback or (None if quiet else print_progress)
+
+        # bytes of the data pages read from the file (pages are read from cache_dir if it is used)
+        bytes_read = 0 if self.cache is not None else \
+            int(self.page_index[end - 1, 2] + DATA_LINE_LENGTH - self.page_index[start - 1, 0])
+
+        with self.timer.stage("decode_pages", bytes_read=bytes_read):
+            if parallel:
+
+                # split pages into ranges that are decoded by a pool of worker processes, each writing
+                # directly into the shared output arrays
+                range_pages = max(BLOCK_PAGES, -(-total_pages // (workers * 4)))
+                outputs_info = {key: (shared[key].name, shapes[key], dtypes[key].str) for key in shapes}
+
+                try:
+                    with ProcessPoolExecutor(max_workers=workers) as executor:
+                        futures = [executor.submit(_parse_data_worker, self.file_path,
+                                                   self.page_index[first:min(first + range_pages, end)],
+                                                   self.file_info, channels, decode_calibrated, downsample, outputs_info,
+                                                   first - (start - 1))
+                                   for first in range(start - 1, end, range_pages)]
+
+                        for done, future in enumerate(as_completed(futures), start=1):
+                            future.result()
+                            # report progress
+                            if progress_callback is not None:
+                                progress_callback("decode_pages", done, len(futures))
+
+                    start_time = futures[0].result()
+
+                    # copy out of shared memory before it is released
+                    outputs = {key: outputs[key].copy() for key in outputs}
+
+                finally:
+                    for shared_block in shared.values():
+                        shared_block.close()
+                        shared_block.unlink()
+
+            else:
+
+                # read and decode pages in blocks
+                for block in self.iter_blocks(pages_per_block=BLOCK_PAGES, start=start, end=end, channels=channels,
+                                              calibrate=decode_calibrated, downsample=downsample):
+
+                    page = block["start_page"] - start
+
+                    for key, resampler in resamplers.items():
+                        resampled = resampler.process(block.pop(key), final=(block["end_page"] == end))
+                        position = resampler.produced - len(resampled)
+                        outputs[key][position:resampler.produced] = resampled
+
+                    store_block(outputs, block, page, meas_per_page)
+
+                    if page == 0:
+                        start_time = block["start_time"]
+
+                    # report progress
+                    if progress_callback is not None and page + BLOCK_PAGES <= total_pages:
+                        progress_callback("decode_pages", page + BLOCK_PAGES, total_pages)
 
         if not quiet: print("Storing parsed data ...")
 
-        data = {"x": np.array(x),
-                "y": np.array(y),
-                "z": np.array(z),
-                "light": np.array(light),
-                "button": np.array(button),
-                "temperature": np.array(temperature),
-                "start_page": start,
-                "end_page": end,
-                "start_time": start_time,
-                "sample_rate": downsampled_rate,
-                "temperature_sample_rate": self.file_info["temperature_frequency"]}
+        data = {key: outputs[key] for key in channels}
+        data.update({"page_times": outputs["page_times"],
+                     "start_page": start,
+                     "end_page": end,
+                     "start_time": start_time,
+                     "sample_rate": downsampled_rate,
+                     "temperature_sample_rate": self.file_info["temperature_frequency"]})
 
         # correct clock drift
-        if correct_drift:
+        if correct_drift and self.file_info["clock_drift_rate"]:
 
             if not quiet: print("Correcting clock drift ...")
 
-            adjust_rate = abs(1 / self.file_info["clock_drift_rate"])
-            time_to_start = (data["start_time"] - self.file_info["config_time"]).total_seconds()
-            adjust_start = int(time_to_start * data["sample_rate"] * abs(self.file_info["clock_drift_rate"]))
-            adjust_start_temperature = int(time_to_start * data["temperature_sample_rate"] * abs(self.file_info["clock_drift_rate"]))
+            with self.timer.stage("correct_drift"):
+                drift_rate = self.file_info["clock_drift_rate"]
+                time_to_start = (data["start_time"] - self.file_info["config_time"]).total_seconds()
+                adjust_start = int(time_to_start * data["sample_rate"] * abs(drift_rate))
+                adjust_start_temperature = int(time_to_start * data["temperature_sample_rate"] * abs(drift_rate))
 
-            if self.file_info["clock_drift_rate"] > 0:  # if drift is positive then remove extra samples
+                # one index (or sample position) array for all signals sampled at the same rate
+                signal_length = max([shapes[key][0] for key in channels if key in DATA_CHANNELS], default=0)
+                sample_index = drift_correction_index(signal_length, drift_rate, adjust_start, drift_mode)
+                temperature_index = drift_correction_index(total_pages, drift_rate,
+                                                           adjust_start_temperature, drift_mode)
 
-                for key in ["x", "y", "z", "light", "button", "temperature"]:
-
-                    # delete data from each signal
-                    data[key] = np.delete(data[key],
-                                          [round(adjust_rate * (i + 1)) for i in
-                                           range(int(len(data[key]) / adjust_rate))])
-
-                    # delete data from start of each signal to account for time from config to start
-                    if key == "temperature":
-                        data[key] = np.delete(data[key], range(adjust_start_temperature))
-                    else:
-                        data[key] = np.delete(data[key], range(adjust_start))
+                for key in channels:
+                    index = temperature_index if key == "temperature" else sample_index
+                    data[key] = apply_drift_correction(data[key], index, drift_mode, nearest=(key == "button"))
 
-            else:  # else add samples
-
-                for key in ["x", "y", "z", "light", "button", "temperature"]:
-
-                    # insert data into each signal
-                    data[key] = np.insert(data[key],
-                                          [round(adjust_rate * (i + 1)) for i in
-                                           range(int(len(data[key]) / adjust_rate))],
-                                          0)  # Todo: decide on what value to assign to the clock drift values
-
-                    # insert data into start of each signal to account for time from config to start
-                    if key == "temperature":
-                        data[key] = np.insert(data[key], 0, [0] * adjust_start_temperature)
-                    else:
-                        data[key] = np.insert(data[key], 0, [0] * adjust_start)
+        if compact:
+            data = CompactData(data, self.file_info, calibrate=calibrate, dtype=compact_dtype)
 
         # update data attribute if requested
         if update: self.data = data
@@ -448,10 +1603,234 @@ class GENEActivFile:
                   f'       Old value: {old_downsample}\n',
                   f'       New value: {downsample}\n')
 
+        # display message if sample rate was changed
+        if old_sample_rate != sample_rate:
+            print('****** WARNING: Sample rate was modified to fit',
+                  'acceptable range.\n',
+                  f'       Old value: {old_sample_rate}\n',
+                  f'       New value: {sample_rate}\n')
+
+        return data
+
+    def read_page_times(self, quiet=False):
+
+        '''
+        read_page_times() returns the time of every indexed page (as stored in the file, without clock drift
+        correction), parsing them on first call
+        Returns:
+            page_times: np.array of datetime64[us]
+        '''
+
+        if self.page_times is None and self.cache is not None:
+            self.page_times = np.array(self.cache["page_times"])
+
+        if self.page_times is None:
+
+            if self.page_index is None:
+                self.build_page_index(quiet=quiet)
+
+            mapped_file = np.memmap(self.file_path, dtype=np.uint8, mode="r")
+            self.page_times = parse_page_times(mapped_file, self.page_index[:, PAGE_TIME_COLUMN])
+            del mapped_file
+
+        return self.page_times
+
+    def read_time_range(self, start_time, end_time, calibrate=True, correct_drift=False,
+                        update=True, quiet=False):
+
+        '''
+        read_time_range() decodes only the pages recorded between two times and trims the data to the
+        samples from start_time up to (not including) end_time
+        Args:
+            start_time: datetime
+                Time of first sample to return
+            end_time: datetime
+                Samples at or after end_time are not returned
+            calibrate: Bool
+                Whether to convert raw counts to calibrated units
+            correct_drift: Bool
+                Whether to correct page and sample times for clock drift (the drift accumulated since
+                configuration is subtracted from each page time) before selecting samples
+            update: Bool
+                Whether to store the data in self.data
+            quiet: Bool
+                Whether or not to print additional information
+
+        Returns:
+            data: dict
+                Same as parse_data, "start_time" is the (drift corrected) time of the first sample returned.
+                "temperature" and "page_times" are those of the pages whose (drift corrected) page time is in
+                the range, "start_page" and "end_page" those of all pages read
+        '''
+
+        # check whether data has been read
+        if not self.header or self.file_info["pagecount"] is None:
+            print('****** WARNING: Cannot read time range because file has not',
+                  'been read.\n')
+            return
+
+        page_times = self.read_page_times(quiet=quiet)
+        sample_period = 1000000 / self.file_info["measurement_frequency"]  # microseconds
+
+        if correct_drift:
+            drift_rate = self.file_info["clock_drift_rate"]
+            config_time = np.datetime64(self.file_info["config_time"], "us")
+            drift = ((page_times - config_time).astype(np.int64) * drift_rate).astype("timedelta64[us]")
+            page_times = page_times - drift
+            sample_period *= 1 - drift_rate
+
+        start_time = np.datetime64(start_time, "us")
+        end_time = np.datetime64(end_time, "us")
+
+        # find pages overlapping the time range (first page starting at or before start_time
+        # to last page starting before end_time)
+        first = max(int(np.searchsorted(page_times, start_time, side="right")) - 1, 0)
+        last = int(np.searchsorted(page_times, end_time, side="left"))
+
+        if last <= first:
+            print('****** WARNING: No data recorded between', start_time, 'and', end_time, '\n')
+            return
+
+        data = self.parse_data(start=first + 1, end=last, calibrate=calibrate, update=False, quiet=quiet)
+
+        # trim to first sample at or after start_time and last sample before end_time
+        first_sample = (start_time - page_times[first]).astype(np.int64) / sample_period
+        first_sample = max(int(np.ceil(first_sample)), 0)
+        last_sample = (end_time - page_times[last - 1]).astype(np.int64) / sample_period
+        last_sample = (last - 1 - first) * 300 + min(int(np.ceil(last_sample)), 300)
+
+        for key in ["x", "y", "z", "light", "button"]:
+            data[key] = data[key][first_sample:last_sample]
+
+        # one value per page for the pages that start in the time range (as read_columnar)
+        in_range = (page_times[first:last] >= start_time) & (page_times[first:last] < end_time)
+        for key in ["temperature", "page_times"]:
+            if key in data:
+                data[key] = data[key][in_range]
+
+        data["start_time"] = (page_times[first] + np.timedelta64(round(first_sample * sample_period), "us")).item()
+
+        # update data attribute if requested
+        if update: self.data = data
+
         return data
 
+    def iter_blocks(self, pages_per_block=BLOCK_PAGES, start=1, end=-1, channels=CHANNELS,
+                    calibrate=True, downsample=1, quiet=True):
+
+        '''
+        iter_blocks() reads and decodes the file one block of pages at a time so that the full
+        recording is never held in memory
+        Args:
+            pages_per_block: int
+                Number of pages decoded and returned at a time
+            start: int
+                First page to read (default = 1)
+            end: int
+                Last page to read (default = -1, last page in file)
+            channels: tuple of str
+                Channels to return, any of "x", "y", "z", "light", "button" and "temperature"
+            calibrate: Bool
+                Whether to return calibrated values (float64) rather than raw counts
+                (int16 accelerometer, uint16 light)
+            downsample: int
+                Keep every nth measurement within each page (range: 1-6)
+            quiet: Bool
+                Whether or not to print additional information
+
+        Yields:
+            block: dict
+                Requested channels for the pages in the block (one temperature value per page), the time of
+                each page ("page_times"), the "start_page" and "end_page" of the block and its "start_time"
+        '''
+
+        # check whether data has been read
+        if not self.header or self.file_info["pagecount"] is None:
+            print('****** WARNING: Cannot read blocks because file has not',
+                  'been read.\n')
+            return
+
+        # load cached data or index data pages if only the header was read
+        if self.cache_dir is not None and self.cache is None:
+            self.load_cache(quiet=quiet)
+        elif self.page_index is None:
+            self.build_page_index(quiet=quiet)
+
+        start, end = self._check_page_range(start, end)
+        downsample = min(max(downsample, 1), 6)
+
+        with open(self.file_path, "rb") as bin_file, \
+                mmap.mmap(bin_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            for first in range(start - 1, end, pages_per_block):
+
+                last = min(first + pages_per_block, end)
+
+                if self.cache is not None:
+                    block = self._cached_block(first, last, channels=channels,
+                                               calibrate=calibrate, downsample=downsample)
+                else:
+                    block = decode_pages(mapped_file, self.page_index[first:last], self.file_info,
+                                         channels=channels, calibrate=calibrate, downsample=downsample)
+                block.update({"start_page": first + 1,
+                              "end_page": last})
+
+                yield block
+
+                # release the mapped pages of the block so that they do not add up in memory
+                if self.cache is None and hasattr(mmap, "MADV_DONTNEED"):
+                    block_start = int(self.page_index[first, 0]) // mmap.PAGESIZE * mmap.PAGESIZE
+                    block_end = min(int(self.page_index[last - 1, 2]) + DATA_LINE_LENGTH, len(mapped_file))
+                    mapped_file.madvise(mmap.MADV_DONTNEED, block_start, block_end - block_start)
+
+    def _cached_block(self, first, last, channels=CHANNELS, calibrate=True, downsample=1):
+
+        '''
+        _cached_block() returns the pages first to last - 1 (0-based) from the cached raw counts in the
+        same form as decode_pages()
+        '''
+
+        block = {}
+
+        for key in channels:
+            if key == "temperature":
+                block[key] = np.array(self.cache[key][first:last])
+            else:
+                block[key] = self.cache[key][first:last, ::downsample].ravel()
+
+        if calibrate:
+            block = calibrate_counts(block, self.file_info)
+
+        block["page_times"] = np.array(self.cache["page_times"][first:last])
+        block["start_time"] = block["page_times"][0].item()
+
+        return block
+
+    def _check_page_range(self, start, end):
+
+        '''
+        _check_page_range() limits start and end page to the pages available in the file
+        '''
+
+        pagecount = self.file_info["pagecount"]
+
+        # check start and end for acceptable values
+        if start < 1:
+            start = 1
+        elif start > pagecount:
+            start = round(pagecount)
+
+        if end == -1 or end > pagecount:
+            end = round(pagecount)
+        elif end < start:
+            end = start
+
+        # only complete pages can be read
+        end = min(end, len(self.page_index))
+
+        return start, end
+
     def create_pdf(self, pdf_folder, window_hours=4, downsample=5,
-                   correct_drift=False, quiet=False):
+                   correct_drift=False, quiet=False, workers=1, data=None):
 
         '''creates a pdf summary of the file
         Parameters
@@ -466,7 +1845,12 @@ class GENEActivFile:
             factor by which to downsample (range: 1-6, default = 5)
         correct_drift: bool
             should sample rate be adjusted for clock drift? (default = False)
-        
+        workers : int
+            number of processes used to render pages (default = 1, render in this process)
+        data : dict
+            data of the whole file returned by parse_data() to plot instead of decoding
+            the file again (downsample and correct_drift are then ignored)
+
         Returns
         -------
         pdf_path : str
@@ -474,14 +1858,14 @@ class GENEActivFile:
         '''
 
         # check whether data has been read
-        if not self.header or self.data_packet is None or self.file_info["pagecount"] is None:
+        if not self.header or self.file_info["pagecount"] is None:
             print("****** WARNING: Cannot view data because file has not",
                   "been read.")
             return
 
         if not quiet: print("Creating PDF summary ...")
 
-        # get filenames and paths     
+        # get filenames and paths
         bin_name = os.path.basename(self.file_path)
 
         base_name = os.path.splitext(bin_name)[0]
@@ -489,24 +1873,25 @@ class GENEActivFile:
         pdf_name = base_name + ".pdf"
         pdf_path = os.path.join(pdf_folder, pdf_name)
 
-        png_folder = os.path.join(pdf_folder, "png", "")
+        # decode the whole file once, windows are sliced from it
+        if data is None:
+            data = self.parse_data(downsample=downsample,
+                                   update=False,
+                                   correct_drift=correct_drift,
+                                   quiet=quiet)
 
         # adjust sample rate for clock drift?
         sample_rate = self.file_info["measurement_frequency"]
 
         # calculate pages per plot
         window_pages = round((window_hours * 60 * 60 * sample_rate) / 300)
-        window_sequence = range(1, round(self.file_info["pagecount"]), window_pages)
-        # window_sequence = range(1, window_pages*6, window_pages)
+        samples_per_page = data["sample_rate"] * 300 / sample_rate
+        page_count = len(data["page_times"])
 
         # CREATE PLOTS ------
 
         if not quiet: print("Generating plots ...")
 
-        # define date locators and formatters
-        # hours = mdates.HourLocator()
-        # hours_fmt = mdates.DateFormatter('%H:%M')
-
         # set plot parameters
 
         # each accelerometer axis has a different min and max based on the digital range
@@ -527,118 +1912,68 @@ class GENEActivFile:
         light_range = light_max - light_min
         light_buffer = light_range * 0.1
 
-        yaxis_lim = [[accelerometer_min - accelerometer_buffer, accelerometer_max + accelerometer_buffer],
-                     [accelerometer_min - accelerometer_buffer, accelerometer_max + accelerometer_buffer],
-                     [accelerometer_min - accelerometer_buffer, accelerometer_max + accelerometer_buffer],
-                     [light_min - light_buffer, light_max + light_buffer],
-                     [-0.01, 1],
-                     [9.99, 40.01]]
-
-        yaxis_ticks = [[-8, 0, 8],
-                       [-8, 0, 8],
-                       [-8, 0, 8],
-                       [0, 10000, 20000, 30000],
-                       [0, 1],
-                       [10, 20, 30, 40]]
-
-        yaxis_units = [self.header["Accelerometer Units"],
-                       self.header["Accelerometer Units"],
-                       self.header["Accelerometer Units"],
-                       self.header["Light Meter Units"],
-                       "",
-                       self.header["Temperature Sensor Units"]]
-
-        yaxis_lines = [[self.file_info["x_min"], 0, self.file_info["x_max"]],
-                       [self.file_info["y_min"], 0, self.file_info["y_max"]],
-                       [self.file_info["z_min"], 0, self.file_info["z_max"]],
-                       [light_min, light_max]]
-
-        line_color = ["b", "g", "r", "c", "m", "y"]
-
-        plt.rcParams["lines.linewidth"] = 0.25
-        plt.rcParams["figure.figsize"] = (6, 7.5)
-        plt.rcParams["figure.subplot.top"] = 0.92
-        plt.rcParams["figure.subplot.bottom"] = 0.06
-        plt.rcParams["font.size"] = 8
-
-        # create temperature folder to store .png files
-        if not os.path.exists(png_folder): os.mkdir(png_folder)
-
-        # loop through time windows to create separate plot for each
-        for start_index in window_sequence:
-
-            # get data for current window
-            end_index = start_index + window_pages - 1
-            plot_data = self.parse_data(start=start_index,
-                                        end=end_index,
-                                        downsample=downsample,
-                                        update=False,
-                                        correct_drift=correct_drift,
-                                        quiet=quiet)
-
-            # format start and end date for current window
-            time_format = "%b %-d, %Y (%A) @ %H:%M:%S.%f"
-            window_start = plot_data["start_time"]
-            window_start_txt = window_start.strftime(time_format)[:-3]
-
-            window_end = window_start + datetime.timedelta(hours=window_hours)
-            window_end_txt = window_end.strftime(time_format)[:-3]
-
-            # initialize figure with subplots
-            fig, ax = plt.subplots(6, 1)
-
-            # insert date range as plot title
-            fig.suptitle(f'{window_start_txt} to {window_end_txt}',
-                         fontsize=8, y=0.96)
-
-            # initialize subplot index
-            subplot_index = 0
-
-            # loop through subplots and generate plot
-            for key in ["x", "y", "z", "light", "button", "temperature"]:
-
-                # plot signal
-                ax[subplot_index].plot(plot_data[key],
-                                       color=line_color[subplot_index])
-
-                # remove box around plot
-                ax[subplot_index].spines["top"].set_visible(False)
-                ax[subplot_index].spines["bottom"].set_visible(False)
-                ax[subplot_index].spines["right"].set_visible(False)
-
-                ##                # set axis ticks and labels
-                ##                ax[subplot_index].xaxis.set_major_locator(hours)
-                ##                ax[subplot_index].xaxis.set_major_formatter(hours_fmt)
-                ##                if subplot_index != 5:
-                ##                    ax[subplot_index].set_xticklabels([])
-
-                ax[subplot_index].set_yticks(yaxis_ticks[subplot_index])
-                units = yaxis_units[subplot_index]
-                ax[subplot_index].set_ylabel(f'{key} ({units})')
-
-                ##                # set vertical lines on plot at hours
-                ##                ax[subplot_index].grid(True, 'major', 'x',
-                ##                                       color = 'k', linestyle = '--')
-
-                # set horizontal lines on plot at zero and limits
-                if subplot_index < 4:
-                    for yline in yaxis_lines[subplot_index]:
-                        ax[subplot_index].axhline(y=yline, color='grey',
-                                                  linestyle='-')
-
-                # set axis limits
-                ax[subplot_index].set_ylim(yaxis_lim[subplot_index])
-                ##                ax[subplot_index].set_xlim(window_start,
-                ##                                           window_start +
-                ##                                           dt.timedelta(hours = 4))
-
-                # increment to next subplot
-                subplot_index += 1
-
-            # save figure as .png and close
-            png_file = 'plot_' + f'{start_index:09d}' + '.png'
-            fig.savefig(os.path.join(png_folder, png_file))
-            plt.close(fig)
+        plot_info = {
+            "keys": ["x", "y", "z", "light", "button", "temperature"],
+
+            "yaxis_lim": [[accelerometer_min - accelerometer_buffer, accelerometer_max + accelerometer_buffer],
+                          [accelerometer_min - accelerometer_buffer, accelerometer_max + accelerometer_buffer],
+                          [accelerometer_min - accelerometer_buffer, accelerometer_max + accelerometer_buffer],
+                          [light_min - light_buffer, light_max + light_buffer],
+                          [-0.01, 1],
+                          [9.99, 40.01]],
+
+            "yaxis_ticks": [[-8, 0, 8],
+                            [-8, 0, 8],
+                            [-8, 0, 8],
+                            [0, 10000, 20000, 30000],
+                            [0, 1],
+                            [10, 20, 30, 40]],
+
+            "yaxis_units": [self.header["Accelerometer Units"],
+                            self.header["Accelerometer Units"],
+                            self.header["Accelerometer Units"],
+                            self.header["Light Meter Units"],
+                            "",
+                            self.header["Temperature Sensor Units"]],
+
+            "yaxis_lines": [[self.file_info["x_min"], 0, self.file_info["x_max"]],
+                            [self.file_info["y_min"], 0, self.file_info["y_max"]],
+                            [self.file_info["z_min"], 0, self.file_info["z_max"]],
+                            [light_min, light_max]],
+
+            "line_color": ["b", "g", "r", "c", "m", "y"]}
+
+        def windows():
+
+            # slice each time window from the decoded data
+            for first_page in range(0, page_count, window_pages):
+
+                last_page = first_page + window_pages
+                first_sample = round(first_page * samples_per_page)
+                last_sample = round(last_page * samples_per_page)
+
+                signals = {key: data[key][first_sample:last_sample] for key in ["x", "y", "z", "light", "button"]}
+                signals["temperature"] = data["temperature"][first_page:last_page]
+
+                # format start and end date for current window
+                time_format = "%b %-d, %Y (%A) @ %H:%M:%S.%f"
+                window_start = data["page_times"][first_page].item()
+                window_start_txt = window_start.strftime(time_format)[:-3]
+
+                window_end = window_start + datetime.timedelta(hours=window_hours)
+                window_end_txt = window_end.strftime(time_format)[:-3]
+
+                yield {"title": f'{window_start_txt} to {window_end_txt}',
+                       "signals": signals}
+
+        # render windows on one reused figure per process
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_pdf_plot,
+                                     initargs=(plot_info,)) as executor:
+                plots = list(executor.map(_render_pdf_window, windows()))
+        else:
+            _init_pdf_plot(plot_info)
+            plots = [_render_pdf_window(window) for window in windows()]
 
         # CREATE PDF ------
 
@@ -652,7 +1987,7 @@ class GENEActivFile:
         # add first page and print file name at top
         pdf.add_page()
         pdf.set_font("Courier", size=16)
-        pdf.cell(200, 10, txt=bin_name, ln=1, align='C', border=0)
+        pdf.cell(200, 10, text=bin_name, new_x="LMARGIN", new_y="NEXT", align='C', border=0)
 
         # set font for header info
         pdf.set_font("Courier", size=12)
@@ -666,40 +2001,29 @@ class GENEActivFile:
             header_text = header_text + f"{key:{key_length}}:  {value}\n"
 
         # print header to pdf
-        pdf.multi_cell(200, 5, txt=header_text, align='L')
+        pdf.multi_cell(200, 5, text=header_text, align='L')
 
         # PLOT DATA PAGES -------------
 
-        # list all .png files in temperature folder
-        png_files = os.listdir(png_folder)
-        png_files.sort()
-
-        # loop through .png files to add to pdf
-        for png_file in png_files:
-            # create full .png file path
-            png_path = os.path.join(png_folder, png_file)
+        # loop through plots to add to pdf
+        for plot_index, plot in enumerate(plots):
 
             # add page and set font
             pdf.add_page()
             pdf.set_font("Courier", size=16)
 
             # print file_name as header
-            pdf.cell(0, txt=bin_name, align='C')
+            pdf.cell(0, text=bin_name, align='C')
             pdf.ln()
 
-            # insert .png plot into pdf
-            pdf.image(png_path, x=1, y=13, type='png')
-
-        # SAVE PDF AND DELETE PNGS --------------
+            # insert plot into pdf
+            _add_pdf_image(pdf, plot, x=1, y=13)
 
-        if not quiet: print("Cleaning up ...")
+        # SAVE PDF --------------
 
         # save pdf file
         pdf.output(pdf_path)
 
-        # delete temperature .png files
-        shutil.rmtree(png_folder)
-
         if not quiet: print("Done creating PDF summary ...")
 
         return pdf_path
@@ -0,0 +1,235 @@
+# ======================================== IMPORTS ========================================
+try:
+    from .generate_bin import generate_bin
+    from .ga_to_edf import *
+    from .instrumentation import peak_rss_mb, reset_peak_rss, rss_mb
+except ImportError:
+    from generate_bin import generate_bin
+    from ga_to_edf import *
+    from instrumentation import peak_rss_mb, reset_peak_rss, rss_mb
+import numpy as np
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_STAGES = ("header", "decode", "drift", "edf", "nonwear")
+BENCHMARK_FILE_NAME = "BENCH_SYN_0001_01_GA_LWrist.bin"
+
+
+# ======================================== FUNCTIONS =========================================
+def benchmark(days=1, sample_rate=75, nonwear=((10, 1.5),), stages=BENCHMARK_STAGES, workers=1,
+              work_dir=None, results_path=None, quiet=False):
+    """
+    The benchmark function times the conversion pipeline on a synthetic GENEActiv file (see generate_bin) so
+    that throughput can be measured and compared between commits without patient data
+
+    Stages:
+        header: GENEActivFile.read(parse_data=False)
+        decode: GENEActivFile.parse_data() of all pages
+        drift: clock drift correction of the decoded signals
+        edf: ga_to_edf() of the file (accelerometer, temperature, light and button EDF files)
+        nonwear: SensorScripts.zhou_nonwear() on the EDF files (needs the edf stage)
+
+    Args:
+        days: float
+            Length of the synthetic recording in days
+        sample_rate: int
+            Measurement frequency of the synthetic recording in Hz
+        nonwear: list of tuples
+            Non-wear segments as (start, duration) in hours
+        stages: tuple of str
+            Stages to run (in the order above)
+        workers: int
+            Number of processes used to decode pages (see GENEActivFile.parse_data)
+        work_dir: string
+            Directory to write the .bin and EDF files to (default = a temporary directory that is removed)
+        results_path: string
+            Path of a .json file to write the results to
+        quiet: Bool
+            Silence the print function?
+
+    Examples:
+        benchmark(days=7, results_path="benchmarks/%s.json" % datetime.date.today())
+
+    Returns:
+        results: dict
+            Run information ("commit", "date", "platform", "python", "numpy" and "parameters") and for each stage
+            "seconds", "pages_per_second", "samples_per_second" and "peak_rss_increase_mb" (largest resident memory
+            of the process during the stage minus that at its start, memory of worker processes not included, None
+            where not available)
+    """
+
+    remove_work_dir = work_dir is None
+    work_dir = tempfile.mkdtemp(prefix="geneactiv_benchmark_") if work_dir is None else work_dir
+    os.makedirs(work_dir, exist_ok=True)
+
+    results = {"commit": _git_commit(),
+               "date": datetime.datetime.now().isoformat(timespec="seconds"),
+               "platform": platform.platform(),
+               "python": platform.python_version(),
+               "numpy": np.__version__,
+               "parameters": {"days": days, "sample_rate": sample_rate, "nonwear": [list(segment) for segment in nonwear],
+                              "workers": workers},
+               "stages": {}}
+
+    try:
+        bin_path = os.path.join(work_dir, BENCHMARK_FILE_NAME)
+        start = time.time()
+        generate_bin(bin_path, days=days, sample_rate=sample_rate, nonwear=nonwear, quiet=True)
+        if not quiet: print("Generated %s in %.2f s" % (bin_path, time.time() - start))
+
+        pagecount = int(np.ceil(days * 24 * 60 * 60 * sample_rate / 300))
+        edf_dirs = {sensor: os.path.join(work_dir, sensor) for sensor in ["Accelerometer", "Temperature", "Light", "Button"]}
+
+        geneactivfile = GENEActivFile(bin_path)
+        decoded = {}
+
+        for stage in BENCHMARK_STAGES:
+
+            if stage not in stages:
+                continue
+
+            # the drift stage corrects the decoded signals, decode them first (untimed) if not already done
+            if stage == "drift" and "data" not in decoded:
+                decoded["data"] = geneactivfile.parse_data(update=False, quiet=True, workers=workers)
+
+            peak_reset = reset_peak_rss()
+            start_rss = rss_mb()[0]
+            start_peak = peak_rss_mb()
+            start = time.time()
+
+            try:
+                _run_stage(stage, geneactivfile, decoded, edf_dirs, workers)
+            except ImportError as error:
+                print("****** WARNING: Skipping %s stage:" % stage, error)
+                results["stages"][stage] = {"skipped": str(error)}
+                continue
+            except Exception as error:
+                print("****** WARNING: %s stage failed:" % stage, repr(error))
+                results["stages"][stage] = {"failed": repr(error)}
+                continue
+
+            seconds = time.time() - start
+            results["stages"][stage] = {"seconds": round(seconds, 4),
+                                        "pages_per_second": round(pagecount / seconds, 1) if seconds else None,
+                                        "samples_per_second": round(pagecount * 300 / seconds, 1) if seconds else None,
+                                        "peak_rss_increase_mb": _peak_rss_increase(start_rss, start_peak, peak_reset)}
+
+            if not quiet: print("%-8s %8.2f s %12.0f pages/s" % (stage, seconds, pagecount / max(seconds, 1e-9)))
+
+    finally:
+        if remove_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if results_path is not None:
+        if os.path.dirname(results_path):
+            os.makedirs(os.path.dirname(results_path), exist_ok=True)
+        with open(results_path, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+        if not quiet: print("Results written to %s" % results_path)
+
+    return results
+
+
+def compare_benchmarks(baseline_path, results_path, quiet=False):
+    """
+    Compares the stage times of two benchmark result files
+
+    Args:
+        baseline_path: string
+            Path of the results .json file to compare against (e.g. from an earlier commit)
+        results_path: string
+            Path of the new results .json file
+        quiet: Bool
+            Silence the print function?
+
+    Returns:
+        ratios: dict
+            New time / baseline time of each stage run in both (above 1 is slower)
+    """
+
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(results_path) as results_file:
+        results = json.load(results_file)
+
+    if baseline["parameters"] != results["parameters"] and not quiet:
+        print("****** WARNING: Benchmarks were run with different parameters.")
+
+    ratios = {}
+    for stage, stage_results in results["stages"].items():
+        baseline_seconds = baseline["stages"].get(stage, {}).get("seconds")
+        if baseline_seconds and stage_results.get("seconds") is not None:
+            ratios[stage] = stage_results["seconds"] / baseline_seconds
+            if not quiet:
+                print("%-8s %8.2f s -> %8.2f s  (x%.2f)" % (stage, baseline_seconds, stage_results["seconds"],
+                                                          ratios[stage]))
+
+    return ratios
+
+
+def _run_stage(stage, geneactivfile, decoded, edf_dirs, workers):
+    # Runs one benchmark stage (decoded holds the data of the decode stage for the drift stage)
+
+    if stage == "header":
+        geneactivfile.read(parse_data=False, quiet=True)
+
+    elif stage == "decode":
+        decoded["data"] = geneactivfile.parse_data(update=False, quiet=True, workers=workers)
+
+    elif stage == "drift":
+        data = decoded["data"]
+        index = drift_correction_index(len(data["x"]), geneactivfile.file_info["clock_drift_rate"], 0)
+        for key in DATA_CHANNELS:
+            apply_drift_correction(data[key], index)
+
+    elif stage == "edf":
+        for directory in edf_dirs.values():
+            os.makedirs(directory, exist_ok=True)
+        ga_to_edf(geneactivfile.file_path, edf_dirs["Accelerometer"], edf_dirs["Temperature"], edf_dirs["Light"],
+                  edf_dirs["Button"], correct_drift=True, quiet=True)
+
+    elif stage == "nonwear":
+        # SensorScripts is not a package, its folder is added to the path like in the SensorScripts scripts
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "SensorScripts"))
+        from SensorScripts import SensorScripts
+
+        file_names = [f for f in os.listdir(edf_dirs["Accelerometer"]) if f.endswith(".edf")] \
+            if os.path.isdir(edf_dirs["Accelerometer"]) else []
+        if not file_names:
+            raise FileNotFoundError("no accelerometer EDF file (the nonwear stage needs the edf stage)")
+
+        sensor_scripts = SensorScripts()
+        sensor_scripts.read_accelerometer(os.path.join(edf_dirs["Accelerometer"], file_names[0]))
+        sensor_scripts.read_temperature(os.path.join(edf_dirs["Temperature"],
+                                                     file_names[0].replace("_Accelerometer_", "_Temperature_")))
+        sensor_scripts.zhou_nonwear()
+
+
+def _peak_rss_increase(start_rss, start_peak, peak_reset):
+    # Largest resident memory during a stage minus that at its start in MB. Without a reset of the peak, the peak of
+    # the process (peak_rss_mb) is only that of the stage if the stage raised it, the increase is otherwise unknown.
+    if start_rss is None:
+        return None
+    if peak_reset:
+        stage_peak = rss_mb()[1]
+    else:
+        stage_peak = peak_rss_mb()
+        if stage_peak is None or start_peak is None or stage_peak <= start_peak:
+            return None
+    return round(max(stage_peak - start_rss, 0.0), 1)
+
+
+def _git_commit():
+    # Commit the benchmark is run on (None outside a git checkout)
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
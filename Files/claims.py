@@ -0,0 +1,242 @@
+# ======================================== IMPORTS ========================================
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+
+CLAIMS_DIR = "claims"  # directory of the claim files in the output directory
+CLAIM_TIMEOUT = 600  # seconds without a heartbeat after which a claim is stale
+CLAIM_HEARTBEAT = 60  # seconds between updates of the claims held
+LOCK_TIMEOUT = 60  # seconds after which a lock (see exclusive_lock) is stale
+
+
+# ======================================== FUNCTIONS =========================================
+def parse_shard(shard):
+    """
+    Returns shard i of N as (i, N) from "i/N" (i from 0 to N - 1) or a tuple, None for no sharding
+    """
+    if shard is None or shard == "":
+        return None
+    index, count = (int(value) for value in shard.split("/")) if isinstance(shard, str) else shard
+    if count < 1 or not 0 <= index < count:
+        raise ValueError("shard must be i/N with 0 <= i < N, not %s/%s" % (index, count))
+    return index, count
+
+
+def shard_files(file_names, shard):
+    """
+    Returns the file names in shard i of N. Files are assigned by a hash of their name, so that every host assigns
+    a file to the same shard whatever files it lists or in which order.
+
+    Args:
+        file_names: list of str
+        shard: (i, N), "i/N" or None (all files)
+    """
+    shard = parse_shard(shard)
+    if shard is None:
+        return list(file_names)
+    index, count = shard
+    return [file_name for file_name in file_names
+            if int(hashlib.sha1(os.path.basename(file_name).encode("utf-8")).hexdigest(), 16) % count == index]
+
+
+@contextlib.contextmanager
+def exclusive_lock(path, timeout=LOCK_TIMEOUT, wait=None):
+    """
+    Holds a lock file while the code within it runs, so that hosts sharing a filesystem take turns (e.g. to update
+    a file they all write). A lock older than timeout seconds is taken over.
+
+    Args:
+        path: string
+            Path of the lock file
+        timeout: float
+            Age in seconds after which a lock is stale
+        wait: float
+            Seconds to wait for the lock before raising TimeoutError (default = timeout)
+    """
+    deadline = time.time() + (timeout if wait is None else wait)
+    while not _create_claim(path):
+        if not _break_stale_claim(path, timeout):
+            if time.time() > deadline:
+                raise TimeoutError("could not lock %s" % path)
+            time.sleep(0.1)
+    try:
+        yield path
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+# ======================================== ClaimTable CLASS ========================================
+class ClaimTable:
+
+    def __init__(self, output_dir, timeout=CLAIM_TIMEOUT, heartbeat=CLAIM_HEARTBEAT):
+
+        '''
+        ClaimTable lets several processes or hosts that share the output directory convert one input directory at the
+        same time without converting a file twice. A file is claimed by creating its claim file in CLAIMS_DIR (created
+        atomically, it fails if the file is already claimed). The claims held are updated every heartbeat seconds, a
+        claim that has not been updated for timeout seconds, or whose process on this host has ended, is stale and
+        can be claimed again (e.g. after a host crashed).
+
+            claims = ClaimTable(output_dir)
+            if claims.claim("file.bin"):
+                ...
+                claims.release("file.bin")
+            claims.close()
+
+        Args:
+            output_dir: string
+                Head directory of the converted files (the claim files are kept in CLAIMS_DIR within it)
+            timeout: float
+                Seconds without a heartbeat after which a claim is stale
+            heartbeat: float
+                Seconds between updates of the claims held
+        '''
+
+        self.claims_dir = os.path.join(output_dir, CLAIMS_DIR)
+        os.makedirs(self.claims_dir, exist_ok=True)
+        self.timeout = timeout
+        self.heartbeat = heartbeat
+        self.held = set()
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def claim(self, name):
+
+        '''
+        claim() claims a file for this process
+        Args:
+            name: string
+                Name of the file
+
+        Returns:
+            claimed: Bool
+                False if the file is claimed by another process
+        '''
+
+        path = self._path(name)
+        if not _create_claim(path):
+            if not _break_stale_claim(path, self.timeout):
+                return False
+            print("****** WARNING: Recovered stale claim of %s." % name)
+            if not _create_claim(path):
+                return False
+
+        with self._lock:
+            self.held.add(name)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._update_claims, daemon=True)
+            self._thread.start()
+        return True
+
+    def owner(self, name):
+        ''' owner() returns the host, pid and time of the claim of a file (None if the file is not claimed) '''
+        return _read_claim(self._path(name))
+
+    def release(self, name):
+
+        '''
+        release() removes the claim of a file held by this process
+        Args:
+            name: string
+                Name of the file
+        '''
+
+        with self._lock:
+            if name not in self.held:
+                return
+            self.held.discard(name)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._path(name))
+
+    def close(self):
+        ''' close() stops updating the claims and releases all claims held '''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for name in list(self.held):
+            self.release(name)
+
+    def _update_claims(self):
+        # Heartbeat: updates the modification time of the claims held until close()
+        while not self._stop.wait(self.heartbeat):
+            with self._lock:
+                held = list(self.held)
+            for name in held:
+                with contextlib.suppress(FileNotFoundError):
+                    os.utime(self._path(name))
+
+    def _path(self, name):
+        return os.path.join(self.claims_dir, os.path.basename(name) + ".claim")
+
+
+def _create_claim(path):
+    # Creates a claim file with the host, pid and time of this process (False if it already exists)
+    try:
+        claim_file = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(claim_file, "w") as claim_file:
+        json.dump({"host": socket.gethostname(), "pid": os.getpid(),
+                   "time": datetime.datetime.now().isoformat(timespec="seconds")}, claim_file)
+    return True
+
+
+def _read_claim(path):
+    # Host, pid and time of a claim file (None if it does not exist, {} while it is being written)
+    try:
+        with open(path) as claim_file:
+            return json.load(claim_file)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        return {}
+
+
+def _is_stale(path, timeout):
+    # Whether a claim has not been updated for timeout seconds or was made by a process of this host that has ended
+    try:
+        age = time.time() - os.path.getmtime(path)
+    except FileNotFoundError:
+        return False
+    if age > timeout:
+        return True
+
+    claim = _read_claim(path) or {}
+    if claim.get("host") == socket.gethostname() and claim.get("pid") not in (None, os.getpid()):
+        try:
+            os.kill(claim["pid"], 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            pass
+    return False
+
+
+def _break_stale_claim(path, timeout):
+    # Removes a stale claim (True if it was removed). The claim is first renamed, which only one process can do, and
+    # put back if it was replaced by a new claim since it was found to be stale.
+    if not _is_stale(path, timeout):
+        return False
+
+    stale_path = "%s.stale-%s-%d" % (path, socket.gethostname(), os.getpid())
+    try:
+        os.rename(path, stale_path)
+    except FileNotFoundError:
+        return False
+
+    if not _is_stale(stale_path, timeout):
+        with contextlib.suppress(FileExistsError):
+            os.link(stale_path, path)
+        os.remove(stale_path)
+        return False
+
+    os.remove(stale_path)
+    return True
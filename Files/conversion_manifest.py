@@ -0,0 +1,218 @@
+# ======================================== IMPORTS ========================================
+try:
+    from .GENEActivFile import GENEActivFile, PARSER_VERSION
+    from .ga_to_edf import CONVERTER_VERSION
+    from .file_naming import file_naming
+    from .claims import exclusive_lock
+except ImportError:
+    from GENEActivFile import GENEActivFile, PARSER_VERSION
+    from ga_to_edf import CONVERTER_VERSION
+    from file_naming import file_naming
+    from claims import exclusive_lock
+import datetime
+import hashlib
+import json
+import os
+
+MANIFEST_FILE_NAME = "conversion_manifest.json"
+HASH_BLOCK_SIZE = 1024 ** 2  # bytes read at a time when hashing a file
+
+
+# ======================================== FUNCTIONS =========================================
+def file_checksum(path):
+    """ Returns the sha1 of the contents of a file """
+    checksum = hashlib.sha1()
+    with open(path, "rb") as checksum_file:
+        for block in iter(lambda: checksum_file.read(HASH_BLOCK_SIZE), b""):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+def edf_output_paths(bin_path, edf_dirs):
+    """
+    Returns the paths of the EDF files ga_to_edf writes for a .bin file
+
+    Args:
+        bin_path: string
+            Path of the .bin file
+        edf_dirs: tuple
+            accelerometer_dir, temperature_dir, light_dir, button_dir, device_dir and device_edf arguments of ga_to_edf
+    """
+    accelerometer_dir, temperature_dir, light_dir, button_dir, device_dir, device_edf = edf_dirs
+    dirs = [accelerometer_dir, temperature_dir, light_dir, button_dir, device_dir if device_edf else ""]
+
+    return [os.path.join(directory, name) for directory, name in zip(dirs, file_naming(GENEActivFile(bin_path)))
+            if directory != ""]
+
+
+def manifest_entry(bin_path, output_paths, settings):
+    """
+    Describes the conversion of a .bin file: size, modification time and checksum of the .bin file, parser and
+    converter version, settings of the conversion and size and checksum of each EDF file written
+
+    Args:
+        bin_path: string
+            Path of the .bin file
+        output_paths: list of strings
+            Paths of the EDF files written (see edf_output_paths)
+        settings: dict
+            Arguments of the conversion that change the EDF files (e.g. {"correct_drift": True})
+
+    Returns:
+        entry: dict
+    """
+    stat = os.stat(bin_path)
+
+    return {"size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "checksum": file_checksum(bin_path),
+            "parser_version": PARSER_VERSION,
+            "converter_version": CONVERTER_VERSION,
+            "settings": settings,
+            "converted": datetime.datetime.now().isoformat(timespec="seconds"),
+            "outputs": {output_path: {"size": os.path.getsize(output_path), "checksum": file_checksum(output_path)}
+                        for output_path in output_paths}}
+
+
+# ======================================== ConversionManifest CLASS ========================================
+class ConversionManifest:
+
+    def __init__(self, output_dir):
+
+        '''
+        ConversionManifest keeps track of the .bin files converted into an output directory in MANIFEST_FILE_NAME
+        (one entry per .bin file, see manifest_entry), so that a folder conversion only converts the files that are
+        new or changed, were converted by another parser or converter version or with other settings, or whose EDF
+        files are missing or were changed since.
+
+        The paths of the EDF files are stored relative to the output directory. Several processes or hosts may
+        update the same manifest: save() adds the entries changed by this process to the manifest on disk.
+
+        Args:
+            output_dir: string
+                Head directory of the converted files (the manifest is kept in it)
+        '''
+
+        self.output_dir = os.path.abspath(output_dir)
+        self.path = os.path.join(self.output_dir, MANIFEST_FILE_NAME)
+        self.entries = self._load()
+        self.updated = set()  # names of the entries changed by this process
+
+    def reload(self, name=None):
+        '''
+        reload() reads the entries saved by other processes (the entries changed by this process are kept)
+        Args:
+            name: string
+                Name of the .bin file whose entry is read (default = all entries)
+        '''
+        entries = self._load()
+        if name is not None:
+            if name not in self.updated:
+                if name in entries:
+                    self.entries[name] = entries[name]
+                else:
+                    self.entries.pop(name, None)
+            return
+        entries.update({name: self.entries[name] for name in self.updated})
+        self.entries = entries
+
+    def status(self, bin_path, output_paths, settings, verify=False):
+
+        '''
+        status() compares a .bin file and its EDF files to the manifest. The content of the .bin file is only hashed
+        when its size is the same but its modification time changed (e.g. copied again).
+        Args:
+            bin_path: string
+                Path of the .bin file
+            output_paths: list of strings
+                Paths of the EDF files the conversion writes (see edf_output_paths)
+            settings: dict
+                Arguments of the conversion that change the EDF files
+            verify: Bool
+                Check the checksums of the EDF files (default = only check that they exist with the same size)
+
+        Returns:
+            status: string
+                "unchanged", "new", "untracked" (not in the manifest but all EDF files exist, e.g. converted before
+                the manifest was kept), "changed", "outdated" (other parser or converter version), "settings changed"
+                or "outputs changed" (EDF files missing, added or changed)
+        '''
+
+        entry = self.entries.get(os.path.basename(bin_path))
+        if entry is None:
+            return "untracked" if all(os.path.exists(output_path) for output_path in output_paths) else "new"
+
+        stat = os.stat(bin_path)
+        if stat.st_size != entry["size"]:
+            return "changed"
+        if stat.st_mtime_ns != entry["mtime_ns"]:
+            if file_checksum(bin_path) != entry["checksum"]:
+                return "changed"
+            entry["mtime_ns"] = stat.st_mtime_ns
+            self.updated.add(os.path.basename(bin_path))
+
+        if entry["parser_version"] != PARSER_VERSION or entry["converter_version"] != CONVERTER_VERSION:
+            return "outdated"
+        if entry["settings"] != settings:
+            return "settings changed"
+
+        outputs = entry["outputs"]
+        if sorted(outputs) != sorted(self._relative(output_path) for output_path in output_paths):
+            return "outputs changed"
+        for output_path in output_paths:
+            output = outputs[self._relative(output_path)]
+            if not os.path.exists(output_path) or os.path.getsize(output_path) != output["size"]:
+                return "outputs changed"
+            if verify and file_checksum(output_path) != output["checksum"]:
+                return "outputs changed"
+
+        return "unchanged"
+
+    def record(self, bin_path, entry):
+
+        '''
+        record() adds the entry of a converted .bin file (see manifest_entry) to the manifest
+        Args:
+            bin_path: string
+                Path of the .bin file
+            entry: dict
+        '''
+
+        entry = dict(entry, outputs={self._relative(output_path): output for output_path, output in entry["outputs"].items()})
+        self.entries[os.path.basename(bin_path)] = entry
+        self.updated.add(os.path.basename(bin_path))
+
+    def save(self):
+
+        '''
+        save() writes the manifest (to a temporary file that then replaces the manifest, so that an interrupted
+        conversion never leaves a partly written manifest). The manifest is locked while the entries saved by other
+        processes are read and the entries changed by this process are added to them.
+        Returns:
+            path: string
+        '''
+
+        with exclusive_lock(self.path + ".lock"):
+            self.reload()
+            temporary_path = self.path + ".tmp"
+            with open(temporary_path, "w") as manifest_file:
+                json.dump({"parser_version": PARSER_VERSION, "converter_version": CONVERTER_VERSION, "files": self.entries},
+                          manifest_file, indent=2, sort_keys=True)
+            os.replace(temporary_path, self.path)
+
+        return self.path
+
+    def _load(self):
+        # Entries of the manifest on disk
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as manifest_file:
+                return json.load(manifest_file)["files"]
+        except (ValueError, KeyError) as error:
+            print("****** WARNING: Could not read %s (%r), all files will be checked again." % (self.path, error))
+            return {}
+
+    def _relative(self, output_path):
+        # Path of an EDF file relative to the output directory ("/" separated so that manifests can be shared)
+        return os.path.relpath(os.path.abspath(output_path), self.output_dir).replace(os.sep, "/")
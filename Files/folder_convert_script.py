@@ -4,15 +4,44 @@
 
 # ======================================== IMPORTS ========================================
 import pandas as pd
-from ga_to_edf import *
-from summary_metrics import *
+try:
+    from .ga_to_edf import *
+    from .summary_metrics import *
+except ImportError:
+    from ga_to_edf import *
+    from summary_metrics import *
 import os
 import pyedflib
 import datetime
 import numpy as np
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+try:
+    from .instrumentation import StageTimer, available_memory, peak_rss_mb
+    from .conversion_manifest import ConversionManifest, edf_output_paths, manifest_entry
+    from .claims import ClaimTable, CLAIM_TIMEOUT, exclusive_lock, parse_shard, shard_files
+except ImportError:
+    from instrumentation import StageTimer, available_memory, peak_rss_mb
+    from conversion_manifest import ConversionManifest, edf_output_paths, manifest_entry
+    from claims import ClaimTable, CLAIM_TIMEOUT, exclusive_lock, parse_shard, shard_files
+import socket
+
+# columns of the conversion results table (CONVERSION_RESULTS_FILE in the output directory), status is "converted",
+# "failed" or "skipped"
+CONVERSION_RESULT_FIELDS = ("file", "status", "error", "wall_seconds", "cpu_seconds", "peak_rss_mb", "size_mb")
+CONVERSION_RESULTS_FILE = "conversion_results.csv"
+
+# estimated peak memory of converting a file: decoding all pages uses about 7 times the size of the .bin file,
+# streaming (see ga_to_edf) a fixed amount
+DECODE_MEMORY_PER_BIN_BYTE = 7
+STREAM_MEMORY = 256 * 1024 ** 2
 
 # ======================================== FUNCTION =========================================
-def folder_convert(input_dir, output_dir, device_edf=False, correct_drift=True, overwrite=False, quiet=False):
+def folder_convert(input_dir, output_dir, device_edf=False, correct_drift=True, overwrite=False, quiet=False, timing_dir="",
+                   workers=1, memory_limit=None, stream=False, verify=False, resume=False, shard=None, claim=False,
+                   claim_timeout=CLAIM_TIMEOUT):
     """
     The folder_convert function takes a folder of GENEActiv files and converts them all to an edf file type following a predetermined folder structure
 
@@ -29,6 +58,35 @@ def folder_convert(input_dir, output_dir, device_edf=False, correct_drift=True,
             Do you want to redo the conversion on data that has previously been converted?
         quiet: Bool
             Silence the print function?
+        timing_dir: string
+            Directory to write the stage timings of each file to (one .json file per file and timing.csv with the
+            stages of all files). If empty string inputted, will not write timings.
+        workers: int
+            Number of files converted at the same time, each by its own process (default = 1, convert one after another)
+        memory_limit: int
+            Memory in bytes the files converted at the same time may use together (default = the memory available when
+            the conversion starts). Files are started while their estimated memory use fits (see conversion_memory).
+        stream: Bool
+            Convert the files with ga_to_edf(stream=True), so that the memory used by each file does not depend on the
+            length of the recording (more files can then be converted at the same time)
+        verify: Bool
+            Check the checksums of the EDF files of files already converted (default = only check that they exist with the
+            same size). Files whose EDF files are missing or changed are converted again.
+        resume: Bool
+            Convert the files with ga_to_edf(resume=True), so that a file whose conversion was interrupted (e.g. the job was
+            stopped) continues from its last checkpoint when the folder is converted again
+        shard: string
+            "i/N" to only convert the files in shard i (0 to N - 1) of N, e.g. one shard per host (see shard_files).
+            If None inputted, all files are converted.
+        claim: Bool
+            Claim each file before converting it (see ClaimTable), so that several processes or hosts can convert the
+            same input directory into the same output directory at the same time without converting a file twice
+        claim_timeout: float
+            Seconds after which the claim of a process that stopped updating it (e.g. a crashed host) is taken over
+
+    Files already converted are tracked in a manifest in the output directory (see ConversionManifest), only files
+    that are new or changed, were converted by another version or with other settings, or whose EDF files are missing
+    are converted.
 
     Examples: (change input and output paths)
         folder_convert("C:\\PATH\\TO\\INPUT\\FOLDER", "C:\\PATH\\TO\\OUTPUT\\FOLDER\\OND05_GENEActiv", correct_drift=True, overwrite = False, quiet = False)
@@ -36,96 +94,307 @@ def folder_convert(input_dir, output_dir, device_edf=False, correct_drift=True,
     Returns:
         - EDF Files for all
         - A csv file list for each of the 4 parameters (Accelerometer, Temperature, Light, Button)
+        - results_df: DataFrame
+            Status ("converted", "failed" or "skipped" when left to another process), error and timing of each converted
+            file (see CONVERSION_RESULT_FIELDS), also written to CONVERSION_RESULTS_FILE in the output directory (with the
+            host and process id in the name when converting with shard or claim)
 
     """
 
-    # Creating list of accelerometer files already converted
+    # Creating directories of the sensors
     accelerometer_dir = os.path.join(output_dir, "Accelerometer", "DATAFILES")
-    if os.path.exists(accelerometer_dir):
-        accelerometer_edf_files = [f for f in os.listdir(accelerometer_dir) if f.endswith('.edf')]
-        accelerometer_files_used = [f[:-4].replace("_GENEActiv_", "_GA_").replace("_Accelerometer_","_").replace("_A_","_01_").replace("_B_","_02_") for f in accelerometer_edf_files]
-    else:
-        if not quiet: print("Creating Proper Directories for Accelerometer Files...")
-        os.makedirs(accelerometer_dir)
-        accelerometer_files_used = []
-
-    # Creating list of Temperature files already converted
     temperature_dir = os.path.join(output_dir, "Temperature", "DATAFILES")
-    if os.path.exists(temperature_dir):
-        temperature_edf_files = [f for f in os.listdir(temperature_dir) if f.endswith('.edf')]
-        temperature_files_used = [f[:-4].replace("_GENEActiv_", "_GA_").replace("_Temperature_","_").replace("_A_","_01_").replace("_B_","_02_") for f in temperature_edf_files]
-    else:
-        if not quiet: print("Creating Proper Directories for Temperature Files...")
-        os.makedirs(temperature_dir)
-        temperature_files_used = []
-
-    # Creating list of Light files already converted
     light_dir = os.path.join(output_dir, "Light", "DATAFILES")
-    if os.path.exists(light_dir):
-        light_edf_files = [f for f in os.listdir(light_dir) if f.endswith('.edf')]
-        light_files_used = [f[:-4].replace("_GENEActiv_", "_GA_").replace("_Light_","_").replace("_A_","_01_").replace("_B_","_02_") for f in light_edf_files]
-    else:
-        if not quiet: print("Creating Proper Directories for Light Files...")
-        os.makedirs(light_dir)
-        light_files_used = []
-
-    # Creating list of Button files already converted
     button_dir = os.path.join(output_dir, "Button", "DATAFILES")
-    if os.path.exists(button_dir):
-        button_edf_files = [f for f in os.listdir(button_dir) if f.endswith('.edf')]
-        button_files_used = [f[:-4].replace("_GENEActiv_", "_GA_").replace("_Button_","_").replace("_A_","_01_").replace("_B_","_02_") for f in button_edf_files]
-    else:
-        if not quiet: print("Creating Proper Directories for Button Files...")
-        os.makedirs(button_dir)
-        button_files_used = []
+    device_dir = os.path.join(output_dir, "Device", "DATAFILES") if device_edf else ""
+
+    for sensor, sensor_dir in [("Accelerometer", accelerometer_dir), ("Temperature", temperature_dir), ("Light", light_dir),
+                               ("Button", button_dir), ("Device", device_dir)]:
+        if sensor_dir != "" and not os.path.exists(sensor_dir):
+            if not quiet: print("Creating Proper Directories for %s Files..." % sensor)
+            os.makedirs(sensor_dir)
+
     # Creating input files list
     input_dir = os.path.abspath(input_dir)
     if not quiet: print("input dir:",input_dir)
     input_files = [f[:-4] for f in (os.listdir(input_dir)) if f.endswith('.bin')]
+    if shard is not None:
+        input_files = shard_files(input_files, shard)
+        if not quiet: print("Shard %d/%d" % parse_shard(shard))
     if not quiet: print("input_files = ", input_files)
 
-    if device_edf:
-        device_dir = os.path.join(output_dir, "Device", "DATAFILES")
-        if not os.path.exists(device_dir):
-            if not quiet: print("Creating Proper Directories for Device Files...")
-            os.makedirs(device_dir)
-    else:
-        device_dir = ""
-
-    # Converting Files
-    if not overwrite:
-        new_accelerometer_files = [f for f in input_files if f not in accelerometer_files_used]
-        new_temperature_files = [f for f in input_files if f not in temperature_files_used]
-        new_light_files = [f for f in input_files if f not in light_files_used]
-        new_button_files = [f for f in input_files if f not in button_files_used]
-        new_files = np.unique(new_accelerometer_files + new_temperature_files + new_light_files + new_button_files)
-        if not quiet: print("new_files to be converted: ", new_files)
-
-        # Convert new input files to edf
-        for x in new_files:
-            if not quiet: print("--------------------------------------------------------------------------------------------------------------------")
-            if not quiet: print("Converting " + x + ".bin...")
-            ga_to_edf(os.path.join(input_dir, x + ".bin"), accelerometer_dir, temperature_dir, light_dir, button_dir, device_dir, device_edf,
-                      correct_drift=correct_drift, quiet=quiet)
-
-    if overwrite:
-        overwrite_accelerometer_files = [f for f in input_files if f in accelerometer_files_used]
-        overwrite_temperature_files = [f for f in input_files if f in temperature_files_used]
-        overwrite_light_files = [f for f in input_files if f in light_files_used]
-        overwrite_button_files = [f for f in input_files if f in button_files_used]
-        overwrite_files = np.unique(overwrite_accelerometer_files + overwrite_temperature_files + overwrite_light_files + overwrite_button_files)
-        if not quiet: print("Files that will be overwritten: ", overwrite_files)
-        for x in input_files:
-            if not quiet: print("--------------------------------------------------------------------------------------------------------------------")
-            if not quiet: print("Converting " + x + ".bin...")
-            ga_to_edf(os.path.join(input_dir, x + ".bin"), accelerometer_dir, temperature_dir, light_dir, button_dir, device_dir, device_edf,
-                      correct_drift=correct_drift, quiet=quiet)
+    if timing_dir != "":
+        os.makedirs(timing_dir, exist_ok=True)
+
+    # Checking the input files against the conversion manifest
+    edf_dirs = (accelerometer_dir, temperature_dir, light_dir, button_dir, device_dir, device_edf)
+    settings = {"correct_drift": correct_drift}
+    manifest = ConversionManifest(output_dir)
+
+    convert_files = []
+    failed_results = []
+    for x in input_files:
+        bin_path = os.path.join(input_dir, x + ".bin")
+        try:
+            output_paths = edf_output_paths(bin_path, edf_dirs)
+            status = manifest.status(bin_path, output_paths, settings, verify=verify)
+
+            if status == "untracked" and not overwrite:
+                # converted before the manifest was kept, the existing EDF files are added to the manifest
+                manifest.record(bin_path, manifest_entry(bin_path, output_paths, settings))
+                continue
+        except Exception as error:
+            # a file whose header or name cannot be read fails on its own (as in _convert_file)
+            if not quiet: traceback.print_exc()
+            failed_results.append(_failed_result(bin_path, "%s: %s" % (type(error).__name__, error), 0.0))
+            continue
+
+        if status != "unchanged" or overwrite:
+            if not quiet: print("%s: %s" % (x, "overwrite" if status in ("unchanged", "untracked") else status))
+            convert_files.append(x)
+    manifest.save()
+
+    if not quiet: print("Files to be converted: ", convert_files)
+
+    # Convert input files to edf (each file is converted on its own, a file that fails does not stop the others)
+    options = {"correct_drift": correct_drift, "quiet": quiet, "timing_dir": timing_dir, "stream": stream, "resume": resume}
+    claims = ClaimTable(output_dir, timeout=claim_timeout) if claim else None
+    try:
+        results = failed_results + convert_bin_files([os.path.join(input_dir, x + ".bin") for x in convert_files], edf_dirs, options,
+                                    workers=workers, memory_limit=memory_limit, manifest=manifest, settings=settings,
+                                    claims=claims, quiet=quiet)
+    finally:
+        if claims is not None:
+            claims.close()
+
+    # each process writes its own results when several convert the folder
+    results_file = CONVERSION_RESULTS_FILE
+    if claim or shard is not None:
+        results_file = results_file.replace(".csv", "_%s_%d.csv" % (socket.gethostname(), os.getpid()))
+    results_df = pd.DataFrame(results, columns=CONVERSION_RESULT_FIELDS)
+    results_df.to_csv(os.path.join(output_dir, results_file), mode="w", index=False)
+
+    failed = results_df[results_df["status"] == "failed"]
+    if len(failed) > 0:
+        print("****** WARNING: %d of %d files were not converted (see %s):" % (len(failed), len(results_df), results_file))
+        for file, error in zip(failed["file"], failed["error"]):
+            print("    ", file, error)
 
     if not quiet: print("Conversion Complete")
 
-    # Create Summary Metrics and File Lists
-    csv_file_list(output_dir, quiet=quiet)
-    summary_metrics_csv(output_dir, quiet=quiet)
+    # Create Summary Metrics and File Lists (one process at a time, the last one lists all files). EDF files only get
+    # their names once complete (see ga_to_edf), files that cannot be read are left out with a warning.
+    with exclusive_lock(os.path.join(output_dir, "file_lists.lock"), timeout=claim_timeout):
+        csv_file_list(output_dir, quiet=quiet)
+        summary_metrics_csv(output_dir, quiet=quiet)
+
+    return results_df
+
+
+def convert_bin_files(bin_paths, edf_dirs, options, workers=1, memory_limit=None, manifest=None, settings=None, claims=None,
+                      quiet=False):
+    """
+    Converts .bin files with ga_to_edf, one after another or several at a time in a process pool. Each file is
+    converted on its own: an error is recorded in the results of that file and the other files are still converted.
+
+    Args:
+        bin_paths: list of strings
+            Paths of the .bin files
+        edf_dirs: tuple
+            accelerometer_dir, temperature_dir, light_dir, button_dir, device_dir and device_edf arguments of ga_to_edf
+        options: dict
+            Keyword arguments of ga_to_edf (e.g. correct_drift, quiet, timing_dir, stream)
+        workers: int
+            Number of files converted at the same time (default = 1, convert in this process)
+        memory_limit: int
+            Memory in bytes the files converted at the same time may use together (default = available memory).
+            A file that is estimated to need more than the limit is converted on its own.
+        manifest: ConversionManifest
+            Manifest each converted file is recorded in (saved after each file), None to not keep a manifest
+        settings: dict
+            Arguments of the conversion that change the EDF files, recorded in the manifest
+        claims: ClaimTable
+            Claims each file before it is converted, files claimed by other processes or hosts (or converted by them
+            since the manifest was read) are skipped. None to convert all files.
+        quiet: Bool
+            Silence the print function?
+
+    Returns:
+        results: list of dict
+            One row per file (see CONVERSION_RESULT_FIELDS), in the order of bin_paths
+    """
+
+    timing_dir = options.get("timing_dir", "")
+    results = {}
+
+    def claim(bin_path):
+        # claims a file, returns the result of a skipped (or failed) file if it is not to be converted by this process
+        if claims is None:
+            return None
+        name = os.path.basename(bin_path)
+        if not claims.claim(name):
+            owner = claims.owner(name) or {}
+            return _skipped_result(bin_path, "claimed by %s (pid %s)" % (owner.get("host"), owner.get("pid")))
+        if manifest is not None:
+            entry = manifest.entries.get(name)
+            manifest.reload(name)
+            try:
+                converted = manifest.entries.get(name) != entry and \
+                    manifest.status(bin_path, edf_output_paths(bin_path, edf_dirs), settings) == "unchanged"
+            except Exception as error:
+                claims.release(name)
+                return _failed_result(bin_path, "%s: %s" % (type(error).__name__, error), 0.0)
+            if converted:
+                claims.release(name)
+                return _skipped_result(bin_path, "converted by another process")
+        return None
+
+    def record(result):
+        results[result["file"]] = result
+        if manifest is not None and result["status"] == "converted":
+            manifest.record(result["file"], result["manifest"])
+            manifest.save()
+        if claims is not None:
+            claims.release(os.path.basename(result["file"]))
+        if timing_dir != "" and result["timing"]:
+            timer = StageTimer(os.path.basename(result["file"]))
+            timer.records = result["timing"]
+            timer.to_csv(os.path.join(timing_dir, "timing.csv"), append=True)
+        if not quiet: print("%s %s in %.2f s" % (os.path.basename(result["file"]), result["status"], result["wall_seconds"]))
+
+    if workers <= 1 or len(bin_paths) <= 1:
+        for bin_path in bin_paths:
+            skipped = claim(bin_path)
+            if skipped is not None:
+                record(skipped)
+                continue
+            if not quiet: print("--------------------------------------------------------------------------------------------------------------------")
+            if not quiet: print("Converting " + os.path.basename(bin_path) + "...")
+            record(_convert_file(bin_path, edf_dirs, options, settings if manifest is not None else None))
+
+    else:
+        if memory_limit is None:
+            memory_limit = available_memory()
+
+        # largest files first, so that the smaller files fill up the memory left while they are converted
+        memory = {bin_path: conversion_memory(bin_path, options.get("stream", False) or options.get("resume", False)) for bin_path in bin_paths}
+        pending = sorted(bin_paths, key=lambda bin_path: memory[bin_path], reverse=True)
+        running = {}
+
+        if not quiet: print("Converting %d files with %d workers (memory limit %s MB)..." %
+                            (len(bin_paths), workers, "none" if memory_limit is None else round(memory_limit / 1024 ** 2)))
+
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            while pending or running:
+
+                # start the files that fit in the memory left (at least one file is always running)
+                while pending and len(running) < workers:
+                    memory_used = sum(memory[bin_path] for bin_path in running.values())
+                    fits = [bin_path for bin_path in pending
+                            if memory_limit is None or memory_used + memory[bin_path] <= memory_limit]
+                    if not fits and running:
+                        break
+                    bin_path = fits[0] if fits else pending[0]
+                    if not fits and not quiet:
+                        print("****** WARNING: %s is estimated to need %d MB, more than the memory limit." %
+                              (os.path.basename(bin_path), memory[bin_path] / 1024 ** 2))
+                    pending.remove(bin_path)
+                    skipped = claim(bin_path)
+                    if skipped is not None:
+                        record(skipped)
+                        continue
+                    running[executor.submit(_convert_file, bin_path, edf_dirs, options,
+                                                     settings if manifest is not None else None)] = bin_path
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    bin_path = running.pop(future)
+                    try:
+                        record(future.result())
+                    except BrokenProcessPool as error:
+                        # a worker process was killed (e.g. out of memory), the files it was converting fail
+                        broken = True
+                        record(_failed_result(bin_path, "BrokenProcessPool: %s" % error, 0.0))
+
+                if broken:
+                    for future, bin_path in running.items():
+                        record(_failed_result(bin_path, "BrokenProcessPool: worker process ended abruptly", 0.0))
+                    running = {}
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(max_workers=workers)
+        finally:
+            executor.shutdown()
+
+    return [results[bin_path] for bin_path in bin_paths]
+
+
+def conversion_memory(bin_path, stream=False):
+    """
+    Estimates the peak memory in bytes of converting a .bin file with ga_to_edf (DECODE_MEMORY_PER_BIN_BYTE times the
+    size of the file, or STREAM_MEMORY when streaming)
+    """
+    if stream:
+        return STREAM_MEMORY
+    try:
+        return DECODE_MEMORY_PER_BIN_BYTE * os.path.getsize(bin_path)
+    except OSError:
+        return 0
+
+
+def _convert_file(bin_path, edf_dirs, options, settings=None):
+    # Converts one .bin file (run in a worker process when converting several at a time), errors are returned
+    # in the result instead of raised. With settings the manifest entry of the file is made (the checksums are
+    # then calculated by the worker)
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        timer = ga_to_edf(bin_path, *edf_dirs, **options)
+    except Exception as error:
+        if not options.get("quiet", False): traceback.print_exc()
+        return _failed_result(bin_path, "%s: %s" % (type(error).__name__, error), time.perf_counter() - start)
+
+    if timer is None:
+        return _failed_result(bin_path, "file does not exist", time.perf_counter() - start)
+
+    entry = None
+    if settings is not None:
+        try:
+            entry = manifest_entry(bin_path, edf_output_paths(bin_path, edf_dirs), settings)
+        except OSError as error:
+            return _failed_result(bin_path, "EDF file not written: %s" % error, time.perf_counter() - start)
+        except Exception as error:
+            return _failed_result(bin_path, "%s: %s" % (type(error).__name__, error), time.perf_counter() - start)
+
+    return {"file": bin_path,
+            "status": "converted",
+            "error": "",
+            "wall_seconds": round(time.perf_counter() - start, 4),
+            "cpu_seconds": round(time.process_time() - cpu_start, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "size_mb": round(os.path.getsize(bin_path) / 1024 ** 2, 1),
+            "timing": timer.records,
+            "manifest": entry}
+
+
+def _skipped_result(bin_path, reason):
+    # Result row of a file left to another process
+    return dict(_failed_result(bin_path, reason, 0.0), status="skipped")
+
+
+def _failed_result(bin_path, error, wall_seconds):
+    # Result row of a file that could not be converted
+    return {"file": bin_path,
+            "status": "failed",
+            "error": error,
+            "wall_seconds": round(wall_seconds, 4),
+            "cpu_seconds": None,
+            "peak_rss_mb": None,
+            "size_mb": round(os.path.getsize(bin_path) / 1024 ** 2, 1) if os.path.exists(bin_path) else None,
+            "timing": []}
 
 
 
@@ -156,7 +425,14 @@ def summary_metrics_csv(path_to_head_dir, quiet = False):
         if file not in button_file_list:
             button_exists = False
             print("WARNING ", file, " NOT IN BUTTON FOLDER")
-        data_dicts_list.append(summary_metrics(path_to_head_dir, file, accelerometer_exists, temperature_exists, light_exists, button_exists, quiet=quiet))
+        try:
+            data_dicts_list.append(summary_metrics(path_to_head_dir, file, accelerometer_exists, temperature_exists, light_exists, button_exists, quiet=quiet))
+        except Exception as error:
+            # e.g. an EDF file another process is writing, it is listed by the next conversion of the folder
+            print("****** WARNING: Could not read %s, not included in the summary metrics (%r)." % (file, error))
+
+    if not data_dicts_list:
+        return
 
     data = {}
     for k in data_dicts_list[0].keys():
@@ -197,11 +473,19 @@ def csv_file_list(path_to_head_dir, quiet=False):
         dates = []
         device_locations = []
 
+        listed_files = []
+
         for file in file_list:
             #Read EDF
             path_to_file = os.path.join(dir_path, file)
             if not quiet: print(path_to_file)
-            geneactivfile = pyedflib.EdfReader(path_to_file)
+            try:
+                geneactivfile = pyedflib.EdfReader(path_to_file)
+            except OSError as error:
+                # e.g. an EDF file another process is writing, it is listed by the next conversion of the folder
+                print("****** WARNING: Could not read %s, not included in the file list (%s)." % (path_to_file, error))
+                continue
+            listed_files.append(file)
 
             # File Name
             file_split = file.split("_")
@@ -230,10 +514,36 @@ def csv_file_list(path_to_head_dir, quiet=False):
              'SITE': sites,
              'DATE': dates,
              'DEVICE_LOCATION': device_locations,
-             'FILENAME': file_list
+             'FILENAME': listed_files
              })
 
         file_name = "OND05_ALL_00_GENEActiv_"+ key +"_"+datetime.datetime.now().strftime("%Y%b%d").upper()+"_FILELIST.csv"
         full_path = os.path.join(dir_path, file_name)
         file_list_df.to_csv(full_path, mode="w", index = False)
 
+
+# ======================================== COMMAND LINE =========================================
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a folder of GENEActiv .bin files to EDF files (see folder_convert)")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--device-edf", action="store_true", help="also write the device EDF file of all sensors")
+    parser.add_argument("--no-drift-correction", action="store_true", help="do not correct the clock drift")
+    parser.add_argument("--overwrite", action="store_true", help="convert files that were already converted again")
+    parser.add_argument("--quiet", action="store_true")
+    parser.add_argument("--timing-dir", default="", help="directory to write the stage timings to")
+    parser.add_argument("--workers", type=int, default=1, help="number of files converted at the same time")
+    parser.add_argument("--stream", action="store_true", help="stream the conversions (memory use independent of file length)")
+    parser.add_argument("--resume", action="store_true", help="checkpoint the conversions and resume interrupted ones")
+    parser.add_argument("--verify", action="store_true", help="check the checksums of EDF files already converted")
+    parser.add_argument("--shard", default=None, help="i/N to only convert shard i (0 to N - 1) of N")
+    parser.add_argument("--claim", action="store_true", help="claim files so that several hosts can convert the folder at once")
+    parser.add_argument("--claim-timeout", type=float, default=CLAIM_TIMEOUT, help="seconds after which a stale claim is taken over")
+    args = parser.parse_args()
+
+    folder_convert(args.input_dir, args.output_dir, device_edf=args.device_edf, correct_drift=not args.no_drift_correction,
+                   overwrite=args.overwrite, quiet=args.quiet, timing_dir=args.timing_dir, workers=args.workers,
+                   stream=args.stream, verify=args.verify, resume=args.resume, shard=args.shard, claim=args.claim,
+                   claim_timeout=args.claim_timeout)
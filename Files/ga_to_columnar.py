@@ -0,0 +1,260 @@
+# ======================================== IMPORTS ========================================
+try:
+    from .GENEActivFile import *
+except ImportError:
+    from GENEActivFile import *
+import datetime
+import json
+import os
+import shutil
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None  # needed for format="parquet" (the default), "npz" stores are written and read without it
+
+COLUMNAR_FORMATS = ("npz", "parquet")
+COLUMNAR_METADATA_FILE = "metadata.json"
+COLUMNAR_VERSION = 1  # increase when the layout of the store changes
+SAMPLE_CHANNELS = ("x", "y", "z", "light", "button")  # one value per sample, raw counts
+PAGE_COLUMNS = ("page_times", "temperature")  # one value per page
+
+
+# ======================================== FUNCTIONS ========================================
+def ga_to_columnar(input_file_path, output_dir, format="parquet", quiet=False, timer=None):
+    """
+    The ga_to_columnar function writes the data of a GENEActiv .bin file to a columnar store partitioned by hour, so
+    that a time range and a subset of the channels can be read without reading the whole recording (see read_columnar).
+
+    The store is a directory named after the .bin file with:
+        metadata.json: the file_info of the file (calibration, sample rate, clock drift, ...) and the partitions
+        hour=YYYY-MM-DDTHH/: the pages whose page time is in the hour
+            samples.npz/.parquet: raw counts of x, y, z (int16), light (uint16) and button (uint8), compressed
+            pages.npz/.parquet: page time (datetime64[us]) and temperature of each page
+            samples-1.npz, pages-1.npz, ...: further parts of the hour, when pages fall in an hour again after pages of
+            a later hour (e.g. the device clock was set back)
+
+    The samples are stored as recorded: the counts are not calibrated (calibrate_counts with the file_info of the
+    metadata gives the calibrated values) and the clock drift is not corrected (the page times are those of the device).
+
+    Args:
+        input_file_path: String
+            Path to the binary GENEActiv file
+        output_dir: String
+            Directory the store is written to (an existing store of the file is replaced)
+        format: String
+            "parquet" (zstd compressed, needs pyarrow) or "npz" (numpy, deflate compressed, when pyarrow is not installed)
+        quiet: Bool
+            Silence the print function?
+        timer: StageTimer
+            Records the time, bytes read and memory of each stage of the export (default = a new StageTimer)
+
+    Examples:
+        store_path = ga_to_columnar("C:\\PATH\\TO\\FILE.bin", "C:\\PATH\\TO\\OUTPUT\\FOLDER")
+
+    Returns:
+        store_path: String
+            Directory of the store (None if the input file does not exist)
+    """
+
+    if format not in COLUMNAR_FORMATS:
+        raise ValueError("format must be one of %s" % (COLUMNAR_FORMATS,))
+    if format == "parquet" and pyarrow is None:
+        raise ImportError("pyarrow is needed to write parquet files")
+
+    if not os.path.exists(input_file_path):
+        print(f"****** WARNING: {input_file_path} does not exist.\n")
+        return
+
+    timer = StageTimer(os.path.basename(input_file_path)) if timer is None else timer
+    geneactivfile = GENEActivFile(input_file_path, timer=timer)
+    geneactivfile.read(parse_data=False, quiet=quiet)
+    file_info = geneactivfile.file_info
+
+    store_path = os.path.join(output_dir, os.path.splitext(os.path.basename(input_file_path))[0])
+    temporary_path = store_path + ".tmp"
+    shutil.rmtree(temporary_path, ignore_errors=True)
+    os.makedirs(temporary_path)
+
+    partitions = []
+    hour_blocks = []
+
+    if not quiet: print("Writing columnar store ...")
+    with timer.stage("columnar_write") as write_record:
+
+        for block in geneactivfile.iter_blocks(channels=SAMPLE_CHANNELS + ("temperature",), calibrate=False, quiet=quiet):
+
+            first, last = block["start_page"] - 1, block["end_page"]
+            write_record["bytes_read"] += int(geneactivfile.page_index[last - 1, 2] + DATA_LINE_LENGTH - geneactivfile.page_index[first, 0])
+
+            # split the block where the hour of the page time changes
+            hours = block["page_times"].astype("datetime64[h]")
+            splits = np.flatnonzero(hours[1:] != hours[:-1]) + 1
+            for start, end in zip(np.concatenate([[0], splits]), np.concatenate([splits, [len(hours)]])):
+                if hour_blocks and hour_blocks[-1]["hour"] != hours[start]:
+                    partitions.append(_write_partition(temporary_path, hour_blocks, file_info["measurement_frequency"], format, partitions))
+                    hour_blocks = []
+                hour_blocks.append({"hour": hours[start],
+                                    "start_page": block["start_page"] + int(start),
+                                    "page_times": block["page_times"][start:end],
+                                    "temperature": block["temperature"][start:end],
+                                    **{key: block[key][start * 300:end * 300] for key in SAMPLE_CHANNELS}})
+
+        if hour_blocks:
+            partitions.append(_write_partition(temporary_path, hour_blocks, file_info["measurement_frequency"], format, partitions))
+
+        metadata = {"columnar_version": COLUMNAR_VERSION,
+                    "parser_version": PARSER_VERSION,
+                    "source_file": os.path.basename(input_file_path),
+                    "format": format,
+                    "sample_rate": file_info["measurement_frequency"],
+                    "samples_per_page": 300,
+                    "channels": {key: np.dtype(COUNT_DTYPES[key]).str for key in SAMPLE_CHANNELS},
+                    "file_info": {key: _json_value(value) for key, value in file_info.items()},
+                    "partitions": partitions}
+        with open(os.path.join(temporary_path, COLUMNAR_METADATA_FILE), "w") as metadata_file:
+            json.dump(metadata, metadata_file, indent=2)
+
+        # replace an earlier store of the file with the complete new store
+        shutil.rmtree(store_path, ignore_errors=True)
+        os.replace(temporary_path, store_path)
+
+    if not quiet: print("Seconds to write columnar store:", write_record["wall_seconds"])
+
+    return store_path
+
+
+def read_columnar(store_path, start=None, end=None, channels=SAMPLE_CHANNELS, calibrate=True):
+    """
+    Reads a time range and a subset of the channels from a store written by ga_to_columnar. Only the partitions
+    (hours) overlapping the range and the requested channels are read.
+
+    Args:
+        store_path: String
+            Directory of the store
+        start: datetime
+            Time of the first sample to read (default = start of the recording)
+        end: datetime
+            Time after the last sample to read (default = end of the recording)
+        channels: tuple of str
+            Any of "x", "y", "z", "light", "button" and "temperature"
+        calibrate: Bool
+            Whether to return calibrated values (float64) rather than raw counts
+
+    Returns:
+        data: dict
+            "time" (datetime64[us]) and the requested channels of each sample in the range. With "temperature" the
+            "temperature" and "page_times" of the pages that start in the range are also returned.
+    """
+
+    with open(os.path.join(store_path, COLUMNAR_METADATA_FILE)) as metadata_file:
+        metadata = json.load(metadata_file)
+
+    if metadata["format"] == "parquet" and pyarrow is None:
+        raise ImportError("pyarrow is needed to read parquet files")
+
+    sample_channels = [key for key in channels if key in SAMPLE_CHANNELS]
+    start = np.datetime64(start, "us") if start is not None else None
+    end = np.datetime64(end, "us") if end is not None else None
+
+    # time of each sample of a page after the page time
+    sample_offsets = np.round(np.arange(metadata["samples_per_page"]) * 1000000 / metadata["sample_rate"]).astype("timedelta64[us]")
+
+    parts = {key: [] for key in ["time", "page_times", "temperature"] + sample_channels}
+
+    for partition in metadata["partitions"]:
+        if (end is not None and np.datetime64(partition["start_time"], "us") >= end) or \
+                (start is not None and np.datetime64(partition["end_time"], "us") <= start):
+            continue
+
+        partition_path = os.path.join(store_path, partition["path"])
+        part = partition.get("part", 0)
+        pages = _read_columns(partition_path, _part_name("pages", part), metadata["format"],
+                              PAGE_COLUMNS if "temperature" in channels else ["page_times"])
+        times = (pages["page_times"][:, None] + sample_offsets).ravel()
+
+        keep = np.ones(len(times), dtype=bool)
+        if start is not None:
+            keep &= times >= start
+        if end is not None:
+            keep &= times < end
+
+        parts["time"].append(times[keep])
+        samples = _read_columns(partition_path, _part_name("samples", part), metadata["format"], sample_channels) if sample_channels else {}
+        for key in sample_channels:
+            parts[key].append(samples[key][keep])
+
+        if "temperature" in channels:
+            page_keep = keep[::metadata["samples_per_page"]]
+            parts["page_times"].append(pages["page_times"][page_keep])
+            parts["temperature"].append(pages["temperature"][page_keep])
+
+    data = {"time": np.concatenate(parts["time"]) if parts["time"] else np.zeros(0, dtype="datetime64[us]")}
+    for key in sample_channels:
+        data[key] = np.concatenate(parts[key]) if parts[key] else np.zeros(0, dtype=metadata["channels"][key])
+    if "temperature" in channels:
+        data["page_times"] = np.concatenate(parts["page_times"]) if parts["page_times"] else np.zeros(0, dtype="datetime64[us]")
+        data["temperature"] = np.concatenate(parts["temperature"]) if parts["temperature"] else np.zeros(0)
+
+    if calibrate:
+        data = calibrate_counts(data, metadata["file_info"])
+
+    return data
+
+
+def _write_partition(store_path, hour_blocks, sample_rate, format, partitions):
+    # Writes the pages of one hour (parts of one or more blocks) and returns its entry of the metadata. Pages of an
+    # hour that already has a partition (see partitions, the entries written so far) are written as a further part.
+    hour = str(hour_blocks[0]["hour"])
+    part = sum(partition["hour"] == hour for partition in partitions)
+    partition_path = os.path.join(store_path, "hour=" + hour)
+    os.makedirs(partition_path, exist_ok=True)
+
+    columns = {key: np.concatenate([hour_block[key] for hour_block in hour_blocks]) for key in SAMPLE_CHANNELS + PAGE_COLUMNS}
+    _write_columns(partition_path, _part_name("samples", part), format, {key: columns[key] for key in SAMPLE_CHANNELS})
+    _write_columns(partition_path, _part_name("pages", part), format, {key: columns[key] for key in PAGE_COLUMNS})
+
+    page_times = columns["page_times"]
+    page_duration = np.timedelta64(int(round(300 * 1000000 / sample_rate)), "us")
+
+    return {"hour": hour,
+            "path": "hour=" + hour,
+            "part": part,
+            "start_page": hour_blocks[0]["start_page"],
+            "pages": len(page_times),
+            "start_time": str(page_times[0].astype("datetime64[us]")),
+            "end_time": str((page_times[-1] + page_duration).astype("datetime64[us]"))}
+
+
+def _part_name(name, part):
+    # Name of the samples or pages file of a part of a partition (the first part has no number)
+    return name if part == 0 else "%s-%d" % (name, part)
+
+
+def _write_columns(partition_path, name, format, columns):
+    # Writes columns of equal length to a compressed .npz or .parquet file
+    if format == "parquet":
+        table = pyarrow.table({key: pyarrow.array(column) for key, column in columns.items()})
+        pyarrow.parquet.write_table(table, os.path.join(partition_path, name + ".parquet"), compression="zstd")
+    else:
+        np.savez_compressed(os.path.join(partition_path, name + ".npz"), **columns)
+
+
+def _read_columns(partition_path, name, format, keys):
+    # Reads only the columns keys of a .npz or .parquet file
+    if format == "parquet":
+        table = pyarrow.parquet.read_table(os.path.join(partition_path, name + ".parquet"), columns=list(keys))
+        return {key: table.column(key).to_numpy() for key in keys}
+    with np.load(os.path.join(partition_path, name + ".npz")) as columns:
+        return {key: columns[key] for key in keys}
+
+
+def _json_value(value):
+    # file_info value that can be written to json (times as iso format strings)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
@@ -3,16 +3,28 @@
 
 
 # ======================================== IMPORTS ========================================
-from GENEActivFile import *
-from file_naming import file_naming
+try:
+    from .GENEActivFile import *
+    from .file_naming import file_naming
+except ImportError:
+    from GENEActivFile import *
+    from file_naming import file_naming
 import pyedflib
 import datetime
 import os, sys
 import numpy as np
 import time
+import pickle
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+CONVERTER_VERSION = 1  # increase when the EDF files written change so that converted files are converted again
+CHECKPOINT_SECONDS = 60  # time between checkpoints of a resumable streamed conversion (see stream_edf_files)
+SPOOL_READ_RECORDS = 4096  # data records read at a time from the temporary file of a resumable conversion
 
 # ======================================== FUNCTIONS ========================================
-def ga_to_edf(input_file_path, accelerometer_dir, temperature_dir, light_dir, button_dir, device_dir = "", device_edf = False, correct_drift=True, quiet=False):
+def ga_to_edf(input_file_path, accelerometer_dir, temperature_dir, light_dir, button_dir, device_dir = "", device_edf = False, correct_drift=True, quiet=False,
+              timer=None, timing_dir="", workers=1, stream=False, raw_counts=False, resume=False):
     """
     The ga_to_edf is a function that takes a binary file provided by the GENEActiv device and converts it into an EDF format.
 
@@ -31,6 +43,23 @@ def ga_to_edf(input_file_path, accelerometer_dir, temperature_dir, light_dir, bu
             Should the function correct the clock drift on the incoming data?
         quiet: Bool
             Silence the print function?
+        timer: StageTimer
+            Records the time, bytes read and memory of each stage of the conversion (default = a new StageTimer)
+        timing_dir: String
+            Directory the stage timings of the file are written to as a .json file. If empty string inputted, will not write timings.
+        workers: int
+            Number of processes writing the EDF files at the same time (default = 1, write one after another). The file is
+            decoded once and the signals are shared with the writers, so the time taken is that of the slowest file.
+        stream: Bool
+            Decode the file a block of pages at a time and write the EDF data records of all files as each block is
+            decoded, so that memory use does not depend on the length of the recording (see stream_edf_files).
+        raw_counts: Bool
+            Write the accelerometer and light samples as the raw 12 bit and 10 bit counts of the device (digital range -2048 to
+            2047 and 0 to 1023). The physical range of the counts (x_min to x_max, light_min to light_max) is the calibration
+            of the device, so the EDF values are exact and no calibrated values are calculated.
+        resume: Bool
+            Stream the EDF files through temporary files, saving a checkpoint every CHECKPOINT_SECONDS. If the conversion
+            of the file was interrupted it continues from its last checkpoint (see stream_edf_files).
 
 
     Example(s):
@@ -44,6 +73,8 @@ def ga_to_edf(input_file_path, accelerometer_dir, temperature_dir, light_dir, bu
 
     Returns:
         EDF Files corresponding to above specifications
+        timer: StageTimer
+            Stage timings of the conversion
     """
 
     # Initialize GENEActiveFile class
@@ -53,10 +84,13 @@ def ga_to_edf(input_file_path, accelerometer_dir, temperature_dir, light_dir, bu
         return
 
     # Create GENEActivFile
-    geneactivfile = GENEActivFile(input_file_path)
+    timer = StageTimer(os.path.basename(input_file_path)) if timer is None else timer
+    geneactivfile = GENEActivFile(input_file_path, timer=timer)
 
-    # Read Binary File
-    geneactivfile.read(correct_drift=correct_drift, quiet=quiet)
+    # Read Binary File (only the header when streaming, pages are then decoded as the files are written)
+    stream = stream or resume
+    geneactivfile.read(parse_data=not stream, calibrate=not raw_counts, correct_drift=correct_drift, quiet=quiet)
+    sample_rate = geneactivfile.file_info["measurement_frequency"] if stream else geneactivfile.data["sample_rate"]
 
     # Create File Names
     file_names = file_naming(geneactivfile)
@@ -66,7 +100,7 @@ def ga_to_edf(input_file_path, accelerometer_dir, temperature_dir, light_dir, bu
     button_file_name = file_names[3]
 
     #  Number of samples to remove to get as close as possible to the next second
-    remove_n_points = round(geneactivfile.data["sample_rate"]*(1000000 - geneactivfile.file_info["start_time"].microsecond) / 1000000)
+    remove_n_points = round(sample_rate*(1000000 - geneactivfile.file_info["start_time"].microsecond) / 1000000)
 
     # Create header values
     clock_drift = geneactivfile.file_info["clock_drift"]
@@ -89,134 +123,118 @@ def ga_to_edf(input_file_path, accelerometer_dir, temperature_dir, light_dir, bu
         start_time = geneactivfile.file_info["start_time"] + datetime.timedelta(microseconds=1000000-geneactivfile.file_info["start_time"].microsecond)
     birthdate = datetime.datetime.strptime(geneactivfile.file_info["date_of_birth"], "%Y-%m-%d")
 
-    # Outputting Accelerometer Information
-    if not quiet: print("Starting EDF Conversion.")
+    def header(patientname):
+        return {"technician": "",
+                "recording_additional": str(device_location),
+                "patientname": patientname,
+                "patient_additional": visit,
+                "patientcode": study_location_id,
+                "equipment": serial_num,
+                "admincode": "",
+                "gender": sex,
+                "startdate": start_time,
+                "birthdate": birthdate}
+
+    # Digital range of accelerometer and light (the physical range of the raw counts is the calibrated range)
+    if raw_counts:
+        accelerometer_digital_max, accelerometer_digital_min = 2047, -2048
+        light_digital_max, light_digital_min = 1023, 0
+    else:
+        accelerometer_digital_max, accelerometer_digital_min = 32767, -32768
+        light_digital_max, light_digital_min = 32767, -32768
+
+    # Describe each EDF file (written below from the one decoded dataset)
+    edf_files = []
+
     if accelerometer_dir != "":
-        edf_start_time = time.time()
-        if not quiet: print("Building Accelerometer EDF...")
-        accelerometer_full_path = os.path.join(accelerometer_dir, accelerometer_file_name)
-        accelerometer_file = pyedflib.EdfWriter(accelerometer_full_path, 3)
-        accelerometer_file.setHeader({"technician": "",
-                                      "recording_additional": str(device_location),
-                                      "patientname": "X",
-                                      "patient_additional": visit,
-                                      "patientcode": study_location_id,
-                                      "equipment": serial_num,
-                                      "admincode": "",
-                                      "gender": sex,
-                                      "startdate": start_time,
-                                      "birthdate": birthdate})
-
-        accelerometer_file.setSignalHeader(0, {"label": "Accelerometer x", "dimension": geneactivfile.file_info['accelerometer_units'],
-                                               "sample_rate": geneactivfile.data['sample_rate'],
-                                               "physical_max":geneactivfile.file_info["x_max"],
-                                               "physical_min": geneactivfile.file_info["x_min"],
-                                               "digital_max": 32767, "digital_min": -32768,
-                                               "prefilter": "pre1", "transducer": "MEMS Accelerometer"})
-
-        accelerometer_file.setSignalHeader(1, {"label": "Accelerometer y", "dimension": geneactivfile.file_info['accelerometer_units'],
-                                               "sample_rate": geneactivfile.data['sample_rate'],
-                                               "physical_max": geneactivfile.file_info["y_max"],
-                                               "physical_min": geneactivfile.file_info["y_min"],
-                                               "digital_max": 32767, "digital_min": -32768,
-                                               "prefilter": "pre1", "transducer": "MEMS Accelerometer"})
-
-        accelerometer_file.setSignalHeader(2, {"label": "Accelerometer z", "dimension": geneactivfile.file_info['accelerometer_units'],
-                                               "sample_rate": geneactivfile.data['sample_rate'],
-                                               "physical_max": geneactivfile.file_info["z_max"],
-                                               "physical_min": geneactivfile.file_info["z_min"],
-                                               "digital_max": 32767, "digital_min": -32768,
-                                               "prefilter": "pre1", "transducer": "MEMS Accelerometer"})
-
-        accelerometer_file.writeSamples([geneactivfile.data['x'][remove_n_points:], geneactivfile.data['y'][remove_n_points:], geneactivfile.data['z'][remove_n_points:]])
-        accelerometer_file.close()
-        if not quiet: print("Seconds to make Accelerometer EDF:", time.time() - edf_start_time)
+        edf_files.append({"name": "Accelerometer",
+                          "path": os.path.join(accelerometer_dir, accelerometer_file_name),
+                          "header": header("X"),
+                          "signal_headers": [{"label": "Accelerometer " + axis, "dimension": geneactivfile.file_info['accelerometer_units'],
+                                              "sample_rate": sample_rate,
+                                              "physical_max": geneactivfile.file_info[axis + "_max"],
+                                              "physical_min": geneactivfile.file_info[axis + "_min"],
+                                              "digital_max": accelerometer_digital_max, "digital_min": accelerometer_digital_min,
+                                              "prefilter": "pre1", "transducer": "MEMS Accelerometer"} for axis in ["x", "y", "z"]],
+                          "signals": [("x", remove_n_points), ("y", remove_n_points), ("z", remove_n_points)],
+                          "counts": ["x", "y", "z"] if raw_counts else [],
+                          "record_duration": None})
 
     if temperature_dir != "":
-        edf_start_time = time.time()
-        if not quiet: print("Building Temperature EDF...")
-        temperature_full_path = os.path.join(temperature_dir, temperature_file_name)
-        temperature_file = pyedflib.EdfWriter(temperature_full_path, 1)
-        temperature_file.setHeader({"technician": "",
-                                      "recording_additional": str(device_location),
-                                      "patientname": "",
-                                      "patient_additional": visit,
-                                      "patientcode": study_location_id,
-                                      "equipment": serial_num,
-                                      "admincode": "",
-                                      "gender": sex,
-                                      "startdate": start_time,
-                                      "birthdate": birthdate})
-
-        temperature_file.setSignalHeader(0, {"label": "Temperature", "dimension": geneactivfile.file_info['temperature_units'], "sample_rate": 1, #Actual sample rate = 0.25
-                                             "physical_max": geneactivfile.file_info["temperature_physical_max"],
-                                             "physical_min": geneactivfile.file_info["temperature_physical_min"],
-                                             "digital_max": 32767, "digital_min": -32768,
-                                             "prefilter": "pre1", "transducer": "Linear active thermistor"})
-
-        temperature_file.setDatarecordDuration(400000) # This makes the time per data record from 1 second to 4 making the sample rate 0.25
-        temperature_file.writeSamples([np.array(geneactivfile.data['temperature'])])
-        temperature_file.close()
-        if not quiet: print("Seconds to make Temperature EDF:", time.time() - edf_start_time)
+        edf_files.append({"name": "Temperature",
+                          "path": os.path.join(temperature_dir, temperature_file_name),
+                          "header": header(""),
+                          "signal_headers": [{"label": "Temperature", "dimension": geneactivfile.file_info['temperature_units'], "sample_rate": 1, #Actual sample rate = 0.25
+                                              "physical_max": geneactivfile.file_info["temperature_physical_max"],
+                                              "physical_min": geneactivfile.file_info["temperature_physical_min"],
+                                              "digital_max": 32767, "digital_min": -32768,
+                                              "prefilter": "pre1", "transducer": "Linear active thermistor"}],
+                          "signals": [("temperature", 0)],
+                          "counts": [],
+                          "record_duration": 400000})  # This makes the time per data record from 1 second to 4 making the sample rate 0.25
 
     if light_dir != "":
-        edf_start_time = time.time()
-        if not quiet: print("Building Light EDF...")
-        light_full_path = os.path.join(light_dir, light_file_name)
-        light_file = pyedflib.EdfWriter(light_full_path, 1)
-        light_file.setHeader({"technician": "",
-                                      "recording_additional": str(device_location),
-                                      "patientname": "",
-                                      "patient_additional": visit,
-                                      "patientcode": study_location_id,
-                                      "equipment": serial_num,
-                                      "admincode": "",
-                                      "gender": sex,
-                                      "startdate": start_time,
-                                      "birthdate": birthdate})
-
-        light_file.setSignalHeader(0, {"label": "Light", "dimension": geneactivfile.file_info['light_units'],
-                                       "sample_rate": geneactivfile.data['sample_rate'],
-                                       "physical_max": geneactivfile.file_info["light_max"],
-                                       "physical_min": geneactivfile.file_info["light_min"],
-                                       "digital_max": 32767, "digital_min": -32768,
-                                       "prefilter": "pre1", "transducer": "Silicon photodiode"})
-
-        light_file.writeSamples([np.array(geneactivfile.data["light"][remove_n_points:])])
-        light_file.close()
-        if not quiet: print("Seconds to make Light EDF:", time.time() - edf_start_time)
+        edf_files.append({"name": "Light",
+                          "path": os.path.join(light_dir, light_file_name),
+                          "header": header(""),
+                          "signal_headers": [{"label": "Light", "dimension": geneactivfile.file_info['light_units'],
+                                              "sample_rate": sample_rate,
+                                              "physical_max": geneactivfile.file_info["light_max"],
+                                              "physical_min": geneactivfile.file_info["light_min"],
+                                              "digital_max": light_digital_max, "digital_min": light_digital_min,
+                                              "prefilter": "pre1", "transducer": "Silicon photodiode"}],
+                          "signals": [("light", remove_n_points)],
+                          "counts": ["light"] if raw_counts else [],
+                          "record_duration": None})
+
     if button_dir != "":
-        edf_start_time = time.time()
-        if not quiet: print("Building Button EDF...")
-        button_full_path = os.path.join(button_dir, button_file_name)
-        button_file = pyedflib.EdfWriter(button_full_path, 1)
-        button_file.setHeader({"technician": "",
-                                      "recording_additional": str(device_location),
-                                      "patientname": "",
-                                      "patient_additional": visit,
-                                      "patientcode": study_location_id,
-                                      "equipment": serial_num,
-                                      "admincode": "",
-                                      "gender": sex,
-                                      "startdate": start_time,
-                                      "birthdate": birthdate})
-
-        button_file.setSignalHeader(0, {"label": "Button ", "dimension": "", "sample_rate": geneactivfile.data['sample_rate'],
-                                        "physical_max": 1,  # Must state physical min and max explicitly in the event that no button is pressed
-                                        "physical_min": 0,
-                                        "digital_max": 32767, "digital_min": -32768,
-                                        "prefilter": "pre1", "transducer": "Mechanical membrane switch"})
-
-        button_file.writeSamples([np.array(geneactivfile.data["button"][remove_n_points:])])
-        button_file.close()
-        if not quiet: print("Seconds to make Button EDF:", time.time() - edf_start_time)
-    if device_edf: device_ga_to_edf(geneactivfile, device_dir, quiet)
+        edf_files.append({"name": "Button",
+                          "path": os.path.join(button_dir, button_file_name),
+                          "header": header(""),
+                          "signal_headers": [{"label": "Button ", "dimension": "", "sample_rate": sample_rate,
+                                              "physical_max": 1,  # Must state physical min and max explicitly in the event that no button is pressed
+                                              "physical_min": 0,
+                                              "digital_max": 32767, "digital_min": -32768,
+                                              "prefilter": "pre1", "transducer": "Mechanical membrane switch"}],
+                          "signals": [("button", remove_n_points)],
+                          "counts": [],
+                          "record_duration": None})
+
+    if device_edf: edf_files.append(device_edf_file(geneactivfile, device_dir, sample_rate, raw_counts))
+
+    # Outputting EDF files
+    if not quiet: print("Starting EDF Conversion.")
+    if stream:
+        if workers > 1:
+            print("****** WARNING: Streamed EDF files are written by one process, workers is ignored.\n")
+        stream_edf_files(geneactivfile, edf_files, correct_drift=correct_drift, calibrate=not raw_counts, resume=resume, quiet=quiet)
+    else:
+        write_edf_files(edf_files, geneactivfile.data, timer, workers=workers, quiet=quiet)
     del geneactivfile
     if not quiet: print("EDF Conversion Complete.")
 
+    if timing_dir != "":
+        timer.to_json(os.path.join(timing_dir, os.path.splitext(os.path.basename(input_file_path))[0] + "_timing.json"))
+
+    return timer
+
 #
 def device_ga_to_edf(geneactivfile, device_output_dir, quiet=False):
+    """
+    Writes the device EDF file (all 5 sensors in one EDF file) of a GENEActivFile that has been read
+    """
+
+    write_edf_files([device_edf_file(geneactivfile, device_output_dir)], geneactivfile.data, geneactivfile.timer, quiet=quiet)
+
 
+def device_edf_file(geneactivfile, device_output_dir, sample_rate=None, raw_counts=False):
+    """
+    Describes the device EDF file (all 5 sensors in one EDF file) of a GENEActivFile that has been read (see write_edf_files)
+    at sample_rate (default = sample rate of the parsed data), with accelerometer and light as raw counts if raw_counts
+    """
+
+    if sample_rate is None:
+        sample_rate = geneactivfile.data['sample_rate']
 
     # File Name
     file_names = file_naming(geneactivfile)
@@ -234,69 +252,507 @@ def device_ga_to_edf(geneactivfile, device_output_dir, quiet=False):
     start_time = geneactivfile.file_info["start_time"]
     birthdate = datetime.datetime.strptime(geneactivfile.file_info["date_of_birth"], "%Y-%m-%d")
 
-    if not quiet: print("Building Device EDF...")
-    edf_start_time = time.time()
-    device_full_path = os.path.join(device_output_dir, device_file_name)
-    device_file = pyedflib.EdfWriter(device_full_path, 6)
-    device_file.setDatarecordDuration(400000)  # This allows the proper sample rate for temperature (0.25hz) by having a datarecord be 4 seconds, so all frequencyies are multiplied by 4
-    device_file.setHeader({"technician": "",
-                                      "recording_additional": str(device_location),
-                                      "patientname": "",
-                                      "patient_additional": visit,
-                                      "patientcode": study_location_id,
-                                      "equipment": serial_num,
-                                      "admincode": "",
-                                      "gender": sex,
-                                      "startdate": start_time,
-                                      "birthdate": birthdate})
-
-
-    # Accelerometer Parameters
-    device_file.setSignalHeader(0, {"label": "Accelerometer x", "dimension": geneactivfile.file_info['accelerometer_units'],
-                                    "sample_rate": geneactivfile.data['sample_rate']*4,
-                                    "physical_max": geneactivfile.file_info["x_max"],
-                                    "physical_min": geneactivfile.file_info["x_min"],
-                                    "digital_max": 2047, "digital_min": -2048,
-                                    "prefilter": "pre1", "transducer": "MEMS Accelerometer"})
-
-    device_file.setSignalHeader(1, {"label": "Accelerometer y", "dimension": geneactivfile.file_info['accelerometer_units'],
-                                    "sample_rate": geneactivfile.data['sample_rate']*4,
-                                    "physical_max": geneactivfile.file_info["y_max"],
-                                    "physical_min": geneactivfile.file_info["y_min"],
-                                    "digital_max": 2047, "digital_min": -2048,
-                                    "prefilter": "pre1", "transducer": "MEMS Accelerometer"})
-
-    device_file.setSignalHeader(2, {"label": "Accelerometer z", "dimension": geneactivfile.file_info['accelerometer_units'],
-                                    "sample_rate": geneactivfile.data['sample_rate']*4,
-                                    "physical_max": geneactivfile.file_info["z_max"],
-                                    "physical_min": geneactivfile.file_info["z_min"],
-                                    "digital_max": 2047, "digital_min": -2048,
-                                    "prefilter": "pre1", "transducer": "MEMS Accelerometer"})
-
-    # Temperature Parameter
-    device_file.setSignalHeader(3, {"label": "Temperature", "dimension": geneactivfile.file_info['temperature_units'], "sample_rate": 1,
-                                    "physical_max": geneactivfile.file_info["temperature_physical_max"],
-                                    "physical_min": geneactivfile.file_info["temperature_physical_min"],
-                                    "digital_max": 1023, "digital_min": 0,
-                                    "prefilter": "pre1", "transducer": "Linear active thermistor"})
-
-    # Light Parameter
-    device_file.setSignalHeader(4, {"label": "Light", "dimension": geneactivfile.file_info['light_units'],
-                                    "sample_rate": geneactivfile.data['sample_rate']*4,
-                                    "physical_max": geneactivfile.file_info["light_max"],
-                                    "physical_min": geneactivfile.file_info["light_min"],
-                                    "digital_max": 1023, "digital_min": 0,
-                                    "prefilter": "pre1", "transducer": "Silicon photodiode"})
-
-    # Button Parameter
-    device_file.setSignalHeader(5, {"label": "Button ", "dimension": "", "sample_rate": geneactivfile.data['sample_rate']*4,
-                                    "physical_max": 1,  # Must state physical min and max explicitly in the event that no button is pressed
-                                    "physical_min": 0,
-                                    "digital_max": 32767, "digital_min": -32768,
-                                    "prefilter": "pre1", "transducer": "Mechanical membrane switch"})
-
-    device_file.writeSamples(
-        [geneactivfile.data['x'], geneactivfile.data['y'], geneactivfile.data['z'], geneactivfile.data['temperature'], geneactivfile.data["light"], geneactivfile.data["button"]])
-    device_file.close()
-    del geneactivfile
-    if not quiet: print("Seconds to make Device EDF:", time.time() - edf_start_time)
\ No newline at end of file
+    return {"name": "Device",
+            "path": os.path.join(device_output_dir, device_file_name),
+            "header": {"technician": "",
+                       "recording_additional": str(device_location),
+                       "patientname": "",
+                       "patient_additional": visit,
+                       "patientcode": study_location_id,
+                       "equipment": serial_num,
+                       "admincode": "",
+                       "gender": sex,
+                       "startdate": start_time,
+                       "birthdate": birthdate},
+            "signal_headers": [
+                # Accelerometer Parameters
+                {"label": "Accelerometer x", "dimension": geneactivfile.file_info['accelerometer_units'],
+                 "sample_rate": sample_rate*4,
+                 "physical_max": geneactivfile.file_info["x_max"],
+                 "physical_min": geneactivfile.file_info["x_min"],
+                 "digital_max": 2047, "digital_min": -2048,
+                 "prefilter": "pre1", "transducer": "MEMS Accelerometer"},
+                {"label": "Accelerometer y", "dimension": geneactivfile.file_info['accelerometer_units'],
+                 "sample_rate": sample_rate*4,
+                 "physical_max": geneactivfile.file_info["y_max"],
+                 "physical_min": geneactivfile.file_info["y_min"],
+                 "digital_max": 2047, "digital_min": -2048,
+                 "prefilter": "pre1", "transducer": "MEMS Accelerometer"},
+                {"label": "Accelerometer z", "dimension": geneactivfile.file_info['accelerometer_units'],
+                 "sample_rate": sample_rate*4,
+                 "physical_max": geneactivfile.file_info["z_max"],
+                 "physical_min": geneactivfile.file_info["z_min"],
+                 "digital_max": 2047, "digital_min": -2048,
+                 "prefilter": "pre1", "transducer": "MEMS Accelerometer"},
+                # Temperature Parameter
+                {"label": "Temperature", "dimension": geneactivfile.file_info['temperature_units'], "sample_rate": 1,
+                 "physical_max": geneactivfile.file_info["temperature_physical_max"],
+                 "physical_min": geneactivfile.file_info["temperature_physical_min"],
+                 "digital_max": 1023, "digital_min": 0,
+                 "prefilter": "pre1", "transducer": "Linear active thermistor"},
+                # Light Parameter
+                {"label": "Light", "dimension": geneactivfile.file_info['light_units'],
+                 "sample_rate": sample_rate*4,
+                 "physical_max": geneactivfile.file_info["light_max"],
+                 "physical_min": geneactivfile.file_info["light_min"],
+                 "digital_max": 1023, "digital_min": 0,
+                 "prefilter": "pre1", "transducer": "Silicon photodiode"},
+                # Button Parameter
+                {"label": "Button ", "dimension": "", "sample_rate": sample_rate*4,
+                 "physical_max": 1,  # Must state physical min and max explicitly in the event that no button is pressed
+                 "physical_min": 0,
+                 "digital_max": 32767, "digital_min": -32768,
+                 "prefilter": "pre1", "transducer": "Mechanical membrane switch"}],
+            "signals": [("x", 0), ("y", 0), ("z", 0), ("temperature", 0), ("light", 0), ("button", 0)],
+            "counts": ["x", "y", "z", "light"] if raw_counts else [],
+            "record_duration": 400000}  # This allows the proper sample rate for temperature (0.25hz) by having a datarecord be 4 seconds, so all frequencyies are multiplied by 4
+
+
+def write_edf_files(edf_files, data, timer, workers=1, quiet=False):
+    """
+    Writes EDF files from one decoded dataset, one after another or each by its own process
+
+    Args:
+        edf_files: list of dict
+            Description of each EDF file: "name", "path", "header", "signal_headers", "signals" (data key and
+            number of leading samples to skip of each signal), "counts" (keys of signals that are raw counts, written
+            as digital values) and "record_duration" (None for 1 second records)
+        data: dict
+            Decoded data (GENEActivFile.data)
+        timer: StageTimer
+            Records the time of writing each file (stage "edf_" + lower case name)
+        workers: int
+            Number of processes writing files at the same time (default = 1, write in this process)
+        quiet: Bool
+            Silence the print function?
+    """
+
+    if workers > 1 and len(edf_files) > 1:
+
+        # copy the signals into shared memory once, each process writes one file from it
+        keys = sorted({key for edf_file in edf_files for key, skip in edf_file["signals"]})
+        signals = {key: np.asarray(data[key]) for key in keys}
+        shared = {key: shared_memory.SharedMemory(create=True, size=max(1, signals[key].nbytes)) for key in keys}
+
+        try:
+            signals_info = {}
+            for key in keys:
+                np.ndarray(signals[key].shape, dtype=signals[key].dtype, buffer=shared[key].buf)[:] = signals[key]
+                signals_info[key] = (shared[key].name, signals[key].shape, signals[key].dtype.str)
+
+            with timer.stage("edf_write"), ProcessPoolExecutor(max_workers=min(workers, len(edf_files))) as executor:
+                futures = {executor.submit(_write_edf_worker, edf_file, signals_info, timer.file): edf_file
+                           for edf_file in edf_files}
+
+                for future in as_completed(futures):
+                    edf_record = future.result()
+                    edf_record["parent"] = "edf_write"
+                    timer.records.append(edf_record)
+                    if not quiet: print("Seconds to make %s EDF:" % futures[future]["name"], edf_record["wall_seconds"])
+
+        finally:
+            for shared_block in shared.values():
+                shared_block.close()
+                shared_block.unlink()
+
+    else:
+        for edf_file in edf_files:
+            if not quiet: print("Building %s EDF..." % edf_file["name"])
+            with timer.stage("edf_" + edf_file["name"].lower()) as edf_record:
+                _write_edf(edf_file, {key: data[key] for key, skip in edf_file["signals"]})
+            if not quiet: print("Seconds to make %s EDF:" % edf_file["name"], edf_record["wall_seconds"])
+
+
+def stream_edf_files(geneactivfile, edf_files, correct_drift=True, calibrate=True, resume=False, quiet=False):
+    """
+    Writes EDF files while the pages of a GENEActivFile are decoded a block at a time (see GENEActivFile.iter_blocks):
+    the samples of each block are drift corrected (see DriftCorrector), converted to digital values and written as
+    whole EDF data records, so that only about one block of samples is held in memory however long the recording is.
+    The files are the same as those written by write_edf_files from the whole decoded dataset.
+
+    With resume the data records are first written to a temporary file next to each EDF file (".part") and the
+    state of the conversion (next page, drift correction, samples not yet written and number of data records
+    written) is saved every CHECKPOINT_SECONDS to a checkpoint file next to the first EDF file (".checkpoint").
+    Running the conversion again after an interruption continues from the last checkpoint. When all pages are
+    written, each EDF file is written from its temporary file (".tmp") and renamed, so that an EDF file is never
+    left partly written.
+
+    Args:
+        geneactivfile: GENEActivFile
+            File whose header has been read
+        edf_files: list of dict
+            Description of each EDF file (see write_edf_files)
+        correct_drift: Bool
+            Should the function correct the clock drift on the incoming data?
+        calibrate: Bool
+            Decode calibrated values (False when the files are written from raw counts, see "counts" of write_edf_files)
+        resume: Bool
+            Write through temporary files with checkpoints, and continue from the checkpoint of an earlier conversion
+        quiet: Bool
+            Silence the print function?
+    """
+
+    timer = geneactivfile.timer
+    file_info = geneactivfile.file_info
+
+    keys = [key for key in CHANNELS if any(key == signal_key for edf_file in edf_files for signal_key, skip in edf_file["signals"])]
+
+    if geneactivfile.page_index is None:
+        geneactivfile.build_page_index(quiet=quiet)
+    total_pages = min(round(file_info["pagecount"]), len(geneactivfile.page_index))
+
+    # drift correction of the samples and of the temperature (one value per page), as in GENEActivFile.parse_data
+    correctors = None
+    if correct_drift and file_info["clock_drift_rate"]:
+        drift_rate = file_info["clock_drift_rate"]
+        time_to_start = (file_info["start_time"] - file_info["config_time"]).total_seconds()
+        adjust_start = int(time_to_start * file_info["measurement_frequency"] * abs(drift_rate))
+        adjust_start_temperature = int(time_to_start * file_info["temperature_frequency"] * abs(drift_rate))
+        correctors = {"samples": DriftCorrector(total_pages * 300, drift_rate, adjust_start),
+                      "pages": DriftCorrector(total_pages, drift_rate, adjust_start_temperature)}
+
+    # continue from the checkpoint of an interrupted conversion
+    checkpoint = None
+    next_page = 1
+    if resume:
+        checkpoint_path = edf_files[0]["path"] + ".checkpoint"
+        source = _checkpoint_source(geneactivfile, edf_files, correct_drift, calibrate)
+        checkpoint = _load_checkpoint(checkpoint_path, source, edf_files)
+        if checkpoint is not None:
+            next_page = checkpoint["next_page"]
+            correctors = checkpoint["correctors"]
+            if not quiet: print("Resuming from page %d of %d ..." % (next_page, total_pages))
+
+    # progress is reported to the callback of the timer, or printed
+    progress_callback = timer.progress_callback or (None if quiet else print_progress)
+
+    with timer.stage("edf_stream") as stream_record:
+
+        streams = []
+        completed = False
+        try:
+            for channel, edf_file in enumerate(edf_files):
+                state = checkpoint["streams"][channel] if checkpoint is not None else None
+                if state is not None and state.get("done"):
+                    continue  # written before the interruption
+                if not quiet: print("Building %s EDF..." % edf_file["name"])
+                streams.append(_EdfStream(edf_file, spool=resume, state=state))
+
+            checkpoint_time = time.perf_counter()
+            blocks = geneactivfile.iter_blocks(start=next_page, channels=keys, calibrate=calibrate, quiet=quiet) \
+                if next_page <= total_pages else []
+
+            for block in blocks:
+
+                samples = {key: block[key] for key in keys if key in DATA_CHANNELS}
+                pages = {key: block[key] for key in keys if key in PAGE_CHANNELS}
+                if correctors is not None:
+                    samples = correctors["samples"].process(samples)
+                    pages = correctors["pages"].process(pages)
+                samples.update(pages)
+
+                for edf_stream in streams:
+                    edf_stream.write(samples)
+
+                first, last = block["start_page"] - 1, block["end_page"]
+                stream_record["bytes_read"] += int(geneactivfile.page_index[last - 1, 2] + DATA_LINE_LENGTH - geneactivfile.page_index[first, 0])
+
+                if resume and (time.perf_counter() - checkpoint_time > CHECKPOINT_SECONDS or last >= total_pages):
+                    _save_checkpoint(checkpoint_path, source, edf_files, last + 1, last >= total_pages, correctors, streams)
+                    checkpoint_time = time.perf_counter()
+
+                if progress_callback is not None:
+                    progress_callback("edf_stream", last, total_pages)
+
+            completed = True
+
+        finally:
+            for edf_stream in streams:
+                # an interrupted conversion that can be resumed leaves its temporary files
+                if completed:
+                    edf_stream.close()
+                else:
+                    edf_stream.abort()
+
+        if resume:
+            os.remove(checkpoint_path)
+
+    if not quiet: print("Seconds to stream EDF files:", stream_record["wall_seconds"])
+
+
+def physical_to_digital(signal, signal_header):
+    """
+    Converts physical values to the digital values of an EDF signal (with the physical and digital range of its signal header)
+    the same way as pyedflib does when physical samples are written (truncated towards zero, limited to the digital range)
+
+    Returns:
+        digital: np.array (int32)
+    """
+
+    physical_max, physical_min = signal_header["physical_max"], signal_header["physical_min"]
+    digital_max, digital_min = signal_header["digital_max"], signal_header["digital_min"]
+
+    bit_value = (physical_max - physical_min) / (digital_max - digital_min)
+    offset = physical_max / bit_value - digital_max
+
+    digital = np.trunc(np.asarray(signal, dtype=np.float64) / bit_value - offset)
+
+    return np.clip(digital, digital_min, digital_max).astype(np.int32)
+
+
+class _EdfStream:
+    """
+    Writes the samples of one EDF file (see write_edf_files) as they are decoded, in whole data records. With spool the
+    data records are written to a temporary file (see stream_edf_files) that the EDF file is written from by close().
+    """
+
+    def __init__(self, edf_file, spool=False, state=None):
+        self.edf_file = edf_file
+        self.signal_headers = edf_file["signal_headers"]
+        self.keys = [key for key, skip in edf_file["signals"]]
+        self.skip = [skip for key, skip in edf_file["signals"]]
+        self.counts = edf_file["counts"]
+        self.samples_per_record = [int(signal_header["sample_rate"]) for signal_header in self.signal_headers]
+        self.pending = [np.zeros(0, dtype=np.int32) for key in self.keys]
+        self.records = 0
+        self.writer = None
+        self.spool = None
+
+        if state is not None:
+            self.skip, self.pending, self.records = list(state["skip"]), list(state["pending"]), state["records"]
+
+        if spool:
+            # data records written after the checkpoint are dropped
+            spool_path = edf_file["path"] + ".part"
+            self.spool = open(spool_path, "r+b" if state is not None else "wb")
+            self.spool.truncate(self.records * sum(self.samples_per_record) * 2)
+            self.spool.seek(0, os.SEEK_END)
+        else:
+            self.writer = _open_edf(edf_file)
+
+    def write(self, signals):
+
+        # digital samples not yet written (after skipping the first samples of the recording)
+        for channel, key in enumerate(self.keys):
+            digital = _digital_signal(signals[key], self.signal_headers[channel], key in self.counts)
+            skipped = min(self.skip[channel], len(digital))
+            self.skip[channel] -= skipped
+            self.pending[channel] = np.concatenate([self.pending[channel], digital[skipped:]])
+
+        # write the data records that are complete for all signals
+        records = min(len(pending) // samples for pending, samples in zip(self.pending, self.samples_per_record))
+        if not records:
+            return
+
+        data_records = np.hstack([pending[:records * samples].reshape(records, samples)
+                                  for pending, samples in zip(self.pending, self.samples_per_record)])
+        if self.spool is not None:
+            data_records.astype("<i2").tofile(self.spool)
+        else:
+            _write_data_records(self.writer, data_records)
+        self.records += records
+
+        self.pending = [pending[records * samples:].copy()
+                        for pending, samples in zip(self.pending, self.samples_per_record)]
+
+    def state(self):
+
+        # state saved in a checkpoint, the data records written so far are first saved to disk
+        if self.spool is not None:
+            self.spool.flush()
+            os.fsync(self.spool.fileno())
+        return {"skip": list(self.skip), "pending": [pending.copy() for pending in self.pending], "records": self.records}
+
+    def abort(self):
+
+        # stops writing, leaving the temporary file to resume from (a partly written EDF file is removed)
+        if self.spool is not None:
+            self.spool.close()
+        if self.writer is not None:
+            _close_edf(self.writer, self.edf_file, complete=False)
+
+    def close(self):
+
+        if self.spool is not None:
+            # write the EDF file from the temporary file
+            self.spool.close()
+            spool_path = self.edf_file["path"] + ".part"
+            self.writer = _open_edf(self.edf_file)
+            completed = False
+            try:
+                if self.records:
+                    spooled = np.memmap(spool_path, dtype="<i2", mode="r", shape=(self.records, sum(self.samples_per_record)))
+                    for first in range(0, self.records, SPOOL_READ_RECORDS):
+                        _write_data_records(self.writer, np.array(spooled[first:first + SPOOL_READ_RECORDS], dtype=np.int32))
+                    del spooled
+                self._write_last_record()
+                completed = True
+            finally:
+                _close_edf(self.writer, self.edf_file, complete=completed)
+            os.remove(spool_path)
+            return
+
+        completed = False
+        try:
+            self._write_last_record()
+            completed = True
+        finally:
+            _close_edf(self.writer, self.edf_file, complete=completed)
+
+    def _write_last_record(self):
+        # last samples are written as a data record padded with the digital value of physical zero of each signal
+        _write_digital_signals(self.writer, self.pending, self.samples_per_record, _padding(self.edf_file))
+
+
+def _write_data_records(writer, data_records):
+    # Writes whole data records (one row per data record, the samples of each signal one after another)
+    for data_record in data_records:
+        writer.blockWriteDigitalSamples(data_record)
+
+
+def _write_digital_signals(writer, signals, samples_per_record, padding):
+    # Writes digital signals the way pyedflib.EdfWriter.writeSamples does: whole data records while all signals have
+    # one, then the last samples of each signal as a data record padded with the value of that signal in padding
+    records = min(len(signal) // samples for signal, samples in zip(signals, samples_per_record))
+    for first in range(0, records, SPOOL_READ_RECORDS):
+        last = min(first + SPOOL_READ_RECORDS, records)
+        _write_data_records(writer, np.hstack([np.asarray(signal[first * samples:last * samples], dtype=np.int32).reshape(-1, samples)
+                                               for signal, samples in zip(signals, samples_per_record)]))
+
+    for signal, samples, value in zip(signals, samples_per_record, padding):
+        last_samples = min(len(signal) - records * samples, samples)
+        if last_samples > 0:
+            data_record = np.full(samples, value, dtype=np.int32)
+            data_record[:last_samples] = signal[-last_samples:]
+            writer.writeDigitalSamples(data_record)
+
+
+def _padding(edf_file):
+    # Digital value of physical zero of each signal of an EDF file: the count nearest to zero for raw counts, as
+    # physical_to_digital (truncated) otherwise, which is how pyedflib pads physical samples
+    padding = []
+    for (key, skip), signal_header in zip(edf_file["signals"], edf_file["signal_headers"]):
+        if key in edf_file["counts"]:
+            digital_max, digital_min = signal_header["digital_max"], signal_header["digital_min"]
+            bit_value = (signal_header["physical_max"] - signal_header["physical_min"]) / (digital_max - digital_min)
+            padding.append(int(np.clip(round(digital_min - signal_header["physical_min"] / bit_value), digital_min, digital_max)))
+        else:
+            padding.append(int(physical_to_digital(np.zeros(1), signal_header)[0]))
+    return padding
+
+
+def _checkpoint_source(geneactivfile, edf_files, correct_drift, calibrate):
+    # What a checkpoint was made from: the .bin file, the versions and the settings of the conversion
+    stat = os.stat(geneactivfile.file_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "parser_version": PARSER_VERSION,
+            "converter_version": CONVERTER_VERSION, "correct_drift": correct_drift, "calibrate": calibrate}
+
+
+def _save_checkpoint(checkpoint_path, source, edf_files, next_page, complete, correctors, streams):
+    # Saves the state of a streamed conversion (see stream_edf_files), replacing the last checkpoint. A complete
+    # checkpoint is saved after the last page, before the EDF files are written from their temporary files.
+    checkpoint = {"source": source, "edf_files": edf_files, "next_page": next_page, "complete": complete,
+                  "correctors": correctors, "streams": [edf_stream.state() for edf_stream in streams]}
+    with open(checkpoint_path + ".tmp", "wb") as checkpoint_file:
+        pickle.dump(checkpoint, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+
+def _load_checkpoint(checkpoint_path, source, edf_files):
+    # Loads the checkpoint of an interrupted conversion (None if there is none or it is not of this conversion)
+    if not os.path.exists(checkpoint_path):
+        return None
+
+    try:
+        with open(checkpoint_path, "rb") as checkpoint_file:
+            checkpoint = pickle.load(checkpoint_file)
+    except (OSError, EOFError, pickle.UnpicklingError) as error:
+        print("****** WARNING: Could not read checkpoint %s (%r), starting again." % (checkpoint_path, error))
+        return None
+
+    if checkpoint["source"] != source or checkpoint["edf_files"] != edf_files:
+        print("****** WARNING: File or settings changed since checkpoint %s, starting again." % checkpoint_path)
+        return None
+
+    for edf_file, state in zip(edf_files, checkpoint["streams"]):
+        spool_path = edf_file["path"] + ".part"
+        if checkpoint["complete"] and not os.path.exists(spool_path) and os.path.exists(edf_file["path"]):
+            state["done"] = True  # EDF file written from its temporary file before the interruption
+        elif not os.path.exists(spool_path) or os.path.getsize(spool_path) < state["records"] * sum(
+                int(signal_header["sample_rate"]) for signal_header in edf_file["signal_headers"]) * 2:
+            print("****** WARNING: Temporary file %s is missing or incomplete, starting again." % spool_path)
+            return None
+
+    return checkpoint
+
+
+def _open_edf(edf_file):
+    # Creates the EDF file described by edf_file (see write_edf_files) under a temporary name (".tmp", see _close_edf)
+    # and writes its header
+    writer = pyedflib.EdfWriter(edf_file["path"] + ".tmp", len(edf_file["signal_headers"]))
+    try:
+        if edf_file["record_duration"] is not None:
+            writer.setDatarecordDuration(edf_file["record_duration"])
+        writer.setHeader(edf_file["header"])
+        for channel, signal_header in enumerate(edf_file["signal_headers"]):
+            writer.setSignalHeader(channel, signal_header)
+    except Exception:
+        _close_edf(writer, edf_file, complete=False)
+        raise
+    return writer
+
+
+def _close_edf(writer, edf_file, complete=True):
+    # Closes an EDF file opened by _open_edf and renames it to its name when it is complete, so that other processes
+    # (e.g. listing the EDF files of a folder) never see a partly written EDF file. An incomplete file is removed.
+    try:
+        writer.close()
+    finally:
+        if not complete and os.path.exists(edf_file["path"] + ".tmp"):
+            os.remove(edf_file["path"] + ".tmp")
+    if complete:
+        os.replace(edf_file["path"] + ".tmp", edf_file["path"])
+
+
+def _write_edf(edf_file, signals):
+    # Writes one EDF file described by edf_file (see write_edf_files) from the signals dict
+    writer = _open_edf(edf_file)
+    completed = False
+    try:
+        if edf_file["counts"]:
+            # written as digital values, padded with the digital value of physical zero of each signal
+            _write_digital_signals(writer, [_digital_signal(signals[key][skip:], signal_header, key in edf_file["counts"])
+                                            for (key, skip), signal_header in zip(edf_file["signals"], edf_file["signal_headers"])],
+                                   [int(signal_header["sample_rate"]) for signal_header in edf_file["signal_headers"]],
+                                   _padding(edf_file))
+        else:
+            writer.writeSamples([np.asarray(signals[key][skip:]) for key, skip in edf_file["signals"]])
+        completed = True
+    finally:
+        _close_edf(writer, edf_file, complete=completed)
+
+
+def _digital_signal(signal, signal_header, counts):
+    # Digital values of a signal: raw counts as they are, physical values converted with the range of the signal header
+    if counts:
+        return np.asarray(signal).astype(np.int32)
+    return physical_to_digital(signal, signal_header)
+
+
+def _write_edf_worker(edf_file, signals_info, file_name):
+    # Writes one EDF file in a worker process from signals in shared memory (see write_edf_files)
+    # and returns the record of its stage
+    shared = {key: shared_memory.SharedMemory(name=name) for key, (name, shape, dtype) in signals_info.items()}
+    try:
+        signals = {key: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shared[key].buf)
+                   for key, (name, shape, dtype) in signals_info.items()}
+        timer = StageTimer(file_name)
+        with timer.stage("edf_" + edf_file["name"].lower()):
+            _write_edf(edf_file, signals)
+        del signals
+    finally:
+        for shared_block in shared.values():
+            shared_block.close()
+    return timer.records[-1]
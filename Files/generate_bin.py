@@ -0,0 +1,232 @@
+# ======================================== IMPORTS ========================================
+import numpy as np
+import datetime
+
+# calibration values written to the header of generated files
+CALIBRATION = {"x gain": 25548, "x offset": -2051,
+               "y gain": 25613, "y offset": 1040,
+               "z gain": 25521, "z offset": -384,
+               "Volts": 300, "Lux": 800}
+
+GENERATE_BLOCK_PAGES = 1000  # pages generated and written at a time
+
+
+# ======================================== FUNCTIONS =========================================
+def generate_bin(file_path, days=1, sample_rate=75, clock_drift=2.5, nonwear=((10, 1.5),),
+                 start_time=datetime.datetime(2020, 1, 6, 9, 0, 0, 500000), seed=0, quiet=False):
+    """
+    The generate_bin function writes a synthetic GENEActiv .bin file (same header fields and page layout as a
+    device extract) so that the conversion pipeline can be tested and benchmarked without patient data
+
+    The wrist signals are made up: slowly changing orientation with activity that is higher during the day
+    and low at night, daylight shaped light, skin temperature while worn and occasional button presses.
+    During non-wear the device lies still and its temperature decays towards room temperature.
+
+    The device clock drifts: the page times are those of a device clock that runs clock_drift seconds ahead of
+    real time between configuration and extraction (linearly, as GENEActivFile corrects it), while the signals are
+    generated at the real time of each sample. A drift corrected decode of the file therefore matches the signals
+    of the same file generated with clock_drift=0.
+
+    Args:
+        file_path: string
+            Path of the .bin file to write (name it like a study file, e.g. BENCH_SYN_0001_01_GA_LWrist.bin,
+            to convert it with ga_to_edf)
+        days: float
+            Length of the recording in days
+        sample_rate: int
+            Measurement frequency in Hz
+        clock_drift: float
+            Clock drift in seconds at extraction (device clock ahead of real time if positive), written to the
+            extract notes
+        nonwear: list of tuples
+            Non-wear segments as (start, duration) in hours from the start of the recording
+        start_time: datetime
+            Time of the first page
+        seed: int
+            Seed of the random signals (the same arguments always write the same file)
+        quiet: Bool
+            Silence the print function?
+
+    Examples:
+        generate_bin("/tmp/BENCH_SYN_0001_01_GA_LWrist.bin", days=7, nonwear=[(30, 2), (100, 8)])
+
+    Returns:
+        file_path: string
+    """
+
+    rng = np.random.default_rng(seed)
+
+    pagecount = int(np.ceil(days * 24 * 60 * 60 * sample_rate / 300))
+    page_seconds = 300 / sample_rate
+    end_time = start_time + datetime.timedelta(seconds=pagecount * page_seconds)
+
+    # drift of the device clock in seconds per second (file_info["clock_drift_rate"]) and seconds from configuration
+    # to the first page
+    config_time, extract_time = _config_extract_times(start_time, end_time)
+    drift_rate = clock_drift / (extract_time - config_time).total_seconds()
+    seconds_to_start = (start_time - config_time).total_seconds()
+
+    # random phases of the slowly changing orientation
+    phases = rng.uniform(0, 2 * np.pi, 4)
+
+    if not quiet: print("Writing %s (%d pages) ..." % (file_path, pagecount))
+
+    with open(file_path, "w", newline="") as bin_file:
+
+        bin_file.write("\r\n".join(_header_lines(pagecount, sample_rate, clock_drift, start_time, end_time)) + "\r\n")
+
+        for first_page in range(0, pagecount, GENERATE_BLOCK_PAGES):
+
+            pages = np.arange(first_page, min(first_page + GENERATE_BLOCK_PAGES, pagecount))
+
+            # real time of each sample and page from the start (device clock time less the drift since configuration)
+            seconds = (pages[:, None] * 300 + np.arange(300)).ravel() / sample_rate
+            seconds -= drift_rate * (seconds + seconds_to_start)
+            page_seconds_array = pages * page_seconds
+            page_seconds_array = page_seconds_array - drift_rate * (page_seconds_array + seconds_to_start)
+
+            worn = ~_in_segments(seconds, nonwear)
+            hour_of_day = ((start_time.hour + start_time.minute / 60) + seconds / 3600) % 24
+            awake = (hour_of_day > 7) & (hour_of_day < 23)
+
+            # orientation of gravity while worn, device lying flat while not worn
+            pitch = 0.8 * np.sin(2 * np.pi * seconds / 5400 + phases[0]) + 0.3 * np.sin(2 * np.pi * seconds / 600 + phases[1])
+            roll = 1.2 * np.sin(2 * np.pi * seconds / 7200 + phases[2]) + 0.4 * np.sin(2 * np.pi * seconds / 900 + phases[3])
+            gravity = np.stack([np.sin(pitch), np.cos(pitch) * np.sin(roll), -np.cos(pitch) * np.cos(roll)])
+            gravity[:, ~worn] = [[0], [0], [-1]]
+
+            # activity (g) on top of gravity
+            activity = np.where(awake, 0.15 + 0.25 * np.abs(np.sin(2 * np.pi * seconds / 1800)), 0.01)
+            activity[~worn] = 0.004
+            accelerometer = gravity + rng.normal(size=gravity.shape) * activity
+
+            lux = np.clip(np.sin(np.pi * (hour_of_day - 6) / 14), 0, None) * 1500 + rng.uniform(0, 5, len(seconds))
+            button = (rng.random(len(seconds)) < 2e-6) & worn
+
+            temperature = _temperature(page_seconds_array, nonwear) + rng.normal(0, 0.05, len(pages))
+
+            hex_pages = _encode_pages(accelerometer, lux, button)
+
+            lines = []
+            for page, page_hex, page_temperature in zip(pages.tolist(), hex_pages, temperature.tolist()):
+                page_time = start_time + datetime.timedelta(seconds=page * page_seconds)
+                lines.extend(["Recorded Data",
+                              "Device Unique Serial Code:012345",
+                              "Sequence Number:%d" % page,
+                              "Page Time:%s:%03d" % (page_time.strftime("%Y-%m-%d %H:%M:%S"), page_time.microsecond // 1000),
+                              "Unassigned:",
+                              "Temperature:%.1f" % page_temperature,
+                              "Battery voltage:4.1",
+                              "Device Status:Recording",
+                              "Measurement Frequency:%.1f" % sample_rate,
+                              page_hex])
+
+            bin_file.write("\r\n".join(lines) + "\r\n")
+
+    if not quiet: print("Done writing %s" % file_path)
+
+    return file_path
+
+
+def _header_lines(pagecount, sample_rate, clock_drift, start_time, end_time):
+    # Header of a device extract (59 lines) with the fields parsed by GENEActivFile.read
+    time_format = "%Y-%m-%d %H:%M:%S:000"
+    config_time, extract_time = _config_extract_times(start_time, end_time)
+
+    return ["Device Identity",
+            "Device Unique Serial Code:012345",
+            "Device Type:GENEActiv",
+            "Device Model:1.1",
+            "Device Firmware:Ver06.17 15June15",
+            "Calibration Date:2019-06-25 10:12:58:000",
+            "",
+            "Capabilities",
+            "Accelerometer Range:-8 to 8",
+            "Accelerometer Resolution:0.0039",
+            "Accelerometer Units:g",
+            "Light Meter Range:0 to 3000",
+            "Light Meter Resolution:5",
+            "Light Meter Units:lux",
+            "Temperature Sensor Range:0 to 60",
+            "Temperature Sensor Resolution:0.25",
+            "Temperature Sensor Units:deg. C",
+            "",
+            "Configuration Info",
+            "Measurement Frequency:%d Hz" % sample_rate,
+            "Measurement Period:%d Hours" % int(np.ceil((end_time - start_time).total_seconds() / 3600)),
+            "Start Time:%s" % start_time.strftime(time_format),
+            "Study Centre:SYN",
+            "Study Code:BENCH",
+            "Investigator ID:X",
+            "Exercise Type:none",
+            "Config Operator ID:X",
+            "Config Time:%s" % config_time.strftime(time_format),
+            "Config Notes:",
+            "",
+            "Trial Info",
+            "Device Location Code:left wrist",
+            "Subject Code:0001",
+            "Date of Birth:1950-01-01",
+            "Sex:male",
+            "Height:170",
+            "Weight:70",
+            "Handedness Code:right",
+            "Subject Notes:",
+            "",
+            "Calibration Data"] + ["%s:%d" % (key, value) for key, value in CALIBRATION.items()] + [
+            "",
+            "Memory Status",
+            "Number of Pages:%d" % pagecount,
+            "",
+            "Extract Info",
+            "Extract Operator ID:X",
+            "Extract Time:%s" % extract_time.strftime(time_format),
+            "Extract Notes:Clock drift of %gs, corrected" % clock_drift,
+            "",
+            ""]
+
+
+def _config_extract_times(start_time, end_time):
+    # Configuration time (an hour before the first page) and extraction time (10 minutes after the last page)
+    return start_time - datetime.timedelta(hours=1), end_time + datetime.timedelta(minutes=10)
+
+
+def _in_segments(seconds, segments):
+    # Whether each time (seconds from start) is within one of the (start, duration) segments in hours
+    inside = np.zeros(len(seconds), dtype=bool)
+    for start, duration in segments:
+        inside |= (seconds >= start * 3600) & (seconds < (start + duration) * 3600)
+    return inside
+
+
+def _temperature(seconds, segments, skin=33.0, room=22.0, time_constant=600):
+    # Device temperature at each time: decays towards room temperature after the device is taken off and
+    # back towards skin temperature after it is put on again
+    temperature = np.full(len(seconds), skin)
+    for start, duration in segments:
+        off = start * 3600
+        on = off + duration * 3600
+        removed = (seconds >= off) & (seconds < on)
+        temperature[removed] = room + (skin - room) * np.exp(-(seconds[removed] - off) / time_constant)
+        cooled = room + (skin - room) * np.exp(-(on - off) / time_constant)
+        put_on = seconds >= on
+        temperature[put_on] = np.minimum(temperature[put_on],
+                                         skin - (skin - cooled) * np.exp(-(seconds[put_on] - on) / time_constant))
+    return temperature
+
+
+def _encode_pages(accelerometer, lux, button):
+    # Encodes calibrated signals into the hexadecimal data line of each page (inverse of the calibration
+    # in GENEActivFile: 12 bit twos complement x, y and z, 10 bit light, 1 bit button)
+    counts = []
+    for axis, signal in zip(["x", "y", "z"], accelerometer):
+        axis_counts = np.rint((signal * CALIBRATION[axis + " gain"] + CALIBRATION[axis + " offset"]) / 100)
+        counts.append(np.clip(axis_counts, -2048, 2047).astype(np.int64) & 0xFFF)
+    light = np.clip(np.rint(lux * CALIBRATION["Volts"] / CALIBRATION["Lux"]), 0, 1023).astype(np.int64)
+
+    measurements = (counts[0] << 36) | (counts[1] << 24) | (counts[2] << 12) | (light << 2) | (button.astype(np.int64) << 1)
+    measurement_bytes = (measurements[:, None] >> np.arange(40, -1, -8)) & 0xFF
+
+    hex_data = measurement_bytes.astype(np.uint8).tobytes().hex().upper()
+
+    return [hex_data[i:i + 3600] for i in range(0, len(hex_data), 3600)]
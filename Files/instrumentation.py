@@ -0,0 +1,216 @@
+# ======================================== IMPORTS ========================================
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+
+try:
+    import resource  # not available on Windows (peak memory is then not reported)
+except ImportError:
+    resource = None
+
+# columns of each stage record (order of the csv file written by StageTimer.to_csv)
+STAGE_FIELDS = ("file", "stage", "parent", "wall_seconds", "cpu_seconds", "bytes_read", "peak_rss_mb")
+
+
+# ======================================== FUNCTIONS =========================================
+def peak_rss_mb():
+    """ Returns the largest resident memory of this process so far in MB (None where not available) """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kB on Linux and in bytes on macOS
+    return round(peak / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+def rss_mb():
+    """
+    Returns the current and the largest resident memory of this process in MB as (rss, peak), read from /proc
+    (Linux, (None, None) elsewhere). Unlike peak_rss_mb() the peak can be reset (see reset_peak_rss).
+    """
+    memory = {}
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    memory[line.split(":")[0]] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return memory.get("VmRSS"), memory.get("VmHWM")
+
+
+def reset_peak_rss():
+    """ Resets the largest resident memory returned by rss_mb() to the current one, returns False where not possible """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def available_memory():
+    """ Returns the memory that can be used without swapping in bytes (None where not available) """
+    try:
+        # MemAvailable includes the page cache that can be freed (Linux)
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def print_progress(stage, done, total):
+    """ Default progress callback (see StageTimer), prints the percentage of a stage that is done """
+    print("Current Progress: %r %%" % (round((100 * done / total), 2)))
+
+
+# ======================================== StageTimer CLASS ========================================
+class StageTimer:
+
+    def __init__(self, file="", progress_callback=None):
+
+        '''
+        StageTimer records the wall time, CPU time, bytes read and peak memory of named stages of a
+        conversion (e.g. "read_header", "decode_pages", "edf_accelerometer") so that the time spent on each
+        file can be compared across a folder
+
+        Stages are timed with the stage() context manager, which can also be used as a decorator:
+
+            timer = StageTimer("file.bin")
+            with timer.stage("decode_pages") as record:
+                ...
+                record["bytes_read"] += n
+
+            @timer.stage("write")
+            def write(): ...
+
+        Stages may be nested, each record then has the name of the enclosing stage as "parent".
+        CPU time and peak memory are those of this process (work done in worker processes is not included).
+
+        Args:
+            file: String
+                Name of the file the stages belong to (written with every record)
+            progress_callback: function
+                Called as progress_callback(stage, done, total) while long stages run (see print_progress),
+                None to leave progress reporting to the caller
+        '''
+
+        self.file = file
+        self.progress_callback = progress_callback
+        self.records = []
+        self._stack = []
+
+    @contextlib.contextmanager
+    def stage(self, name, bytes_read=0):
+
+        '''
+        stage() times the code run within it and appends its record to self.records
+        Args:
+            name: String
+                Name of the stage
+            bytes_read: int
+                Number of bytes the stage reads (can also be added to record["bytes_read"] within the stage)
+
+        Returns:
+            record: dict (yielded, wall_seconds, cpu_seconds and peak_rss_mb are set when the stage ends)
+        '''
+
+        record = {"file": self.file,
+                  "stage": name,
+                  "parent": self._stack[-1]["stage"] if self._stack else "",
+                  "wall_seconds": None,
+                  "cpu_seconds": None,
+                  "bytes_read": bytes_read,
+                  "peak_rss_mb": None}
+
+        self._stack.append(record)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = time.perf_counter() - wall_start
+            record["cpu_seconds"] = time.process_time() - cpu_start
+            record["peak_rss_mb"] = peak_rss_mb()
+            self._stack.pop()
+            self.records.append(record)
+
+    def last(self, name):
+        ''' last() returns the most recent record of a stage (None if the stage has not been run) '''
+        for record in reversed(self.records):
+            if record["stage"] == name:
+                return record
+        return None
+
+    def totals(self):
+
+        '''
+        totals() sums the records of each stage (stages that are run more than once are added up)
+
+        Returns:
+            totals: dict
+                {stage: {"calls", "wall_seconds", "cpu_seconds", "bytes_read", "peak_rss_mb"}}
+        '''
+
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["stage"], {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                                        "bytes_read": 0, "peak_rss_mb": None})
+            total["calls"] += 1
+            total["wall_seconds"] += record["wall_seconds"]
+            total["cpu_seconds"] += record["cpu_seconds"]
+            total["bytes_read"] += record["bytes_read"]
+            if record["peak_rss_mb"] is not None:
+                total["peak_rss_mb"] = max(total["peak_rss_mb"] or 0, record["peak_rss_mb"])
+        return totals
+
+    def to_json(self, path):
+
+        '''
+        to_json() writes the records and totals of this file to a .json file
+        Args:
+            path: String
+                Path of the .json file
+
+        Returns:
+            path: String
+        '''
+
+        with open(path, "w") as json_file:
+            json.dump({"file": self.file, "stages": self.records, "totals": self.totals()}, json_file, indent=2)
+
+        return path
+
+    def to_csv(self, path, append=False):
+
+        '''
+        to_csv() writes the records to a .csv file (one row per stage, see STAGE_FIELDS)
+        Args:
+            path: String
+                Path of the .csv file
+            append: Bool
+                Whether to add the rows to an existing file (e.g. one file for all files of a folder),
+                the header row is only written to a new file
+
+        Returns:
+            path: String
+        '''
+
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path))
+
+        with open(path, "a" if append else "w", newline="") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=STAGE_FIELDS)
+            if write_header:
+                writer.writeheader()
+            writer.writerows(self.records)
+
+        return path
@@ -4,7 +4,10 @@
 
 # ======================================== IMPORTS ========================================
 import numpy as np
-from GENEActivFile import *
+try:
+    from .GENEActivFile import *
+except ImportError:
+    from GENEActivFile import *
 import pyedflib
 import os
 import datetime
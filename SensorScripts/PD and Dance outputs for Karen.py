@@ -1,9 +1,13 @@
 import pyedflib
 import pandas as pd
 import os
+import sys
 from SensorScripts import *
 import datetime as dt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Files"))
+from GENEActivFile import plot_envelope
+
 # s = SensorScripts()
 # s.read_accelerometer(r"D:\Adam PC\PycharmProjects\owcurate\Test0_Accelerometer.EDF")
 # s.read_temperature(r"D:\Adam PC\PycharmProjects\owcurate\Test0_Temperature.EDF")
@@ -44,7 +48,7 @@ def plot_nonwear(SensorScript_object, show = True, savepath = "no", id = "N/A"):
     # Subplot 1 (Accelerometer)
     epoch_accel = np.sqrt(SensorScript_object.x_values ** 2 + SensorScript_object.y_values ** 2 + SensorScript_object.z_values ** 2) - 1
     epoch_accel[epoch_accel < 0] = 0
-    ax1.plot(timestamps, epoch_accel, color='purple', label="epoched accel")
+    plot_envelope(ax1, timestamps, epoch_accel, color='purple', label="epoched accel")
     ax1.legend(loc='upper left')
     ax1.set_ylabel("G")
     ax1.xaxis.set_major_formatter(xfmt)
@@ -56,22 +60,25 @@ def plot_nonwear(SensorScript_object, show = True, savepath = "no", id = "N/A"):
         int(60 * SensorScript_object.temperature_frequency)).mean()
     timestamps_temperature = np.asarray(
         pd.date_range(SensorScript_object.temperature_start_datetime, end_time, periods=len(SensorScript_object.temperature_values)))
-    ax2.plot(timestamps_temperature, temperature_moving_average, color='black', label="Temperature")
+    plot_envelope(ax2, timestamps_temperature, temperature_moving_average.to_numpy(), color='black', label="Temperature")
     ax2.legend(loc="upper left")
     ax2.xaxis.set_major_formatter(xfmt)
     ax2.xaxis.set_major_locator(locator)
 
     print("Filling between")
     n=0
+    accel_min, accel_max = np.min(epoch_accel), np.max(epoch_accel)
+    temperature_min = np.min(SensorScript_object.temperature_values)
+    temperature_max = np.max(SensorScript_object.temperature_values)
     # fill non-wear times
     for start, end in zip(zhou_nw_starts, zhou_nw_ends):
         n+=1
         print(n)
         if end - start > dt.timedelta(seconds=30):
-            ax1.fill_between(x=[np.datetime64(start), end], y1=np.min(epoch_accel), y2=np.max(epoch_accel),
+            ax1.fill_between(x=[np.datetime64(start), end], y1=accel_min, y2=accel_max,
                             color='Red', alpha=0.60, linewidth=0.0)
-            ax2.fill_between(x=[np.datetime64(start), end], y1=np.min(SensorScript_object.temperature_values),
-                            y2=np.max(SensorScript_object.temperature_values), color='Red', alpha=0.60, linewidth=0.0)
+            ax2.fill_between(x=[np.datetime64(start), end], y1=temperature_min,
+                            y2=temperature_max, color='Red', alpha=0.60, linewidth=0.0)
 
     if show == True:
         plt.show()